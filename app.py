@@ -1,8 +1,13 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
-from google.cloud import bigquery
-from src.askdata.components.preprocess import preprocess_data, integrate_llm, load_config
+from src.askdata import configure_logging
+from src.askdata.components.preprocess import load_config, stream_answer
+from src.askdata.components.registry import get_registry
+from src.askdata.components.service import Overloaded, QuestionTimeout, get_service
+from src.askdata.components.tracing import get_tracer, span
+from src.askdata.components.chart_prep import ChartSpec, chart_settings, get_figure_cache, prepare_chart, result_fingerprint
+
+configure_logging()
 
 # Streamlit app configuration
 st.set_page_config(page_title="Superstore Query App", page_icon="📊", layout="wide")
@@ -25,6 +30,56 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+def build_figure(spec: ChartSpec):
+    """Plotly figure for a prepared chart, None if there is nothing to draw."""
+    # Imported on the first chart rather than on every rerun's cold start
+    import plotly.express as px
+    if spec.kind == "pie":
+        return px.pie(spec.data, names=spec.x, values=spec.y, title=spec.title)
+    if spec.kind == "scatter":
+        return px.scatter(spec.data, x=spec.x, y=spec.y, title=spec.title)
+    if spec.kind == "line":
+        return px.line(spec.data, x=spec.x, y=spec.y, title=spec.title)
+    if spec.kind in ("bar", "histogram"):
+        return px.bar(spec.data, x=spec.x, y=spec.y, title=spec.title)
+    return None
+
+def render_result(result_df: pd.DataFrame, sql_query: str = None):
+    """Visualization logic for a query result."""
+    with span("chart_build", rows=len(result_df)):
+        _render_result(result_df, sql_query)
+
+def _render_result(result_df: pd.DataFrame, sql_query: str = None):
+    if result_df.attrs.get("truncated"):
+        st.warning(
+            f"The result has more than {result_df.attrs['row_limit']:,} rows, only the first "
+            f"{len(result_df):,} are shown and used for the answer. Narrow the question for a complete result."
+        )
+    if result_df.empty:
+        st.write("No data to visualize.")
+        return
+    config = load_config()
+    figure_cache = get_figure_cache(config)
+    fingerprint = result_fingerprint(result_df) if sql_query else None
+    cached = figure_cache.get(sql_query, fingerprint) if sql_query else None
+    if cached is not None:
+        spec, fig = cached
+    else:
+        # Bounded data for the browser: top-N + Other, LTTB-downsampled series, histogram bins
+        spec = prepare_chart(result_df, **chart_settings(config))
+        fig = build_figure(spec)
+        if sql_query:
+            figure_cache.put(sql_query, fingerprint, (spec, fig))
+    if spec.kind == "value":
+        st.write("Single value queries don’t have a visualization, here’s the result:")
+        st.write(result_df.iloc[0, 0])
+    elif fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+        if spec.note:
+            st.caption(spec.note)
+    else:
+        st.write("No visualization available for this result.")
+
 # Create two columns for layout
 col1, col2 = st.columns([1, 1])
 
@@ -34,57 +89,65 @@ with col1:
         if query:
             with st.spinner("Processing your question..."):
                 try:
-                    data_info = preprocess_data()
-                    response, result_df, sql_query = integrate_llm(data_info, query, return_df=True)
-                    
-                    # Escape dollar signs
-                    response = response.replace("$", r"\$")
-                    
-                    # Display the text answer
-                    st.subheader("Answer")
-                    st.write(response)
-
-                    # Visualization logic
-                    if not result_df.empty:
-                        if len(result_df.columns) == 1 and len(result_df) == 1:
-                            st.write("Single value queries don’t have a visualization, here’s the result:")
-                            st.write(result_df.iloc[0, 0])
-                        elif len(result_df) > 1:
-                            if len(result_df.columns) == 2:
-                                x_col = result_df.columns[0]
-                                y_col = result_df.columns[1]
-                                if "profit" in y_col.lower() or "gmv" in y_col.lower() or "quantity" in y_col.lower():
-                                    fig = px.bar(result_df, x=x_col, y=y_col, title=f"{y_col.capitalize()} by {x_col.capitalize()}")
-                                else:
-                                    fig = px.pie(result_df, names=x_col, values=y_col, title=f"{y_col.capitalize()} Distribution")
-                                st.plotly_chart(fig, use_container_width=True)
-                            elif len(result_df.columns) > 2:
-                                fig = px.bar(result_df, x=result_df.columns[0], y=result_df.columns[1], 
-                                            title=f"{result_df.columns[1].capitalize()} by {result_df.columns[0].capitalize()}")
-                                st.plotly_chart(fig, use_container_width=True)
-                        else:
-                            st.write("No visualization available for this result.")
+                    if load_config().get("answer", {}).get("stream", False):
+                        # The SQL stages go through the shared service like any question, only the
+                        # answer is streamed here so it can be rendered as it arrives
+                        # Placeholders keep the layout fixed while pieces arrive out of display order
+                        st.subheader("Answer")
+                        answer_placeholder = st.empty()
+                        result_container = st.container()
+                        st.subheader("SQL Query")
+                        sql_placeholder = st.empty()
+                        # The SQL is shown as soon as it is generated, while the warehouse runs it
+                        prepared = get_service(load_config()).query_blocking(
+                            query, on_sql=lambda sql: sql_placeholder.code(sql, language="sql")
+                        )
+                        with result_container:
+                            render_result(prepared.result, prepared.sql)
+                        response = ""
+                        with get_tracer().trace():
+                            for event, payload in stream_answer(prepared.data_info, query, prepared.result):
+                                if event == "answer_chunk":
+                                    response += payload
+                                    # Escape dollar signs
+                                    answer_placeholder.write(response.replace("$", r"\$"))
                     else:
-                        st.write("No data to visualize.")
+                        # Shared by all sessions: identical questions asked at the same time run once
+                        answer = get_service(load_config()).ask_blocking(query)
+                        response, result_df, sql_query = answer.answer, answer.result, answer.sql
 
-                    # Display SQL Query
-                    st.subheader("SQL Query")
-                    st.code(sql_query, language="sql")
+                        # Escape dollar signs
+                        response = response.replace("$", r"\$")
 
+                        # Display the text answer
+                        st.subheader("Answer")
+                        st.write(response)
+
+                        render_result(result_df, sql_query)
+
+                        # Display SQL Query
+                        st.subheader("SQL Query")
+                        st.code(sql_query, language="sql")
+
+                except (Overloaded, QuestionTimeout) as e:
+                    st.warning(f"The service is busy: {str(e)}")
                 except Exception as e:
                     st.error(f"An error occurred: {str(e)}")
         else:
             st.warning("Please enter a question!")
 
-# Right column: Table Preview (moved inside query logic or keep static with error handling)
+@st.cache_data(ttl=600, show_spinner=False)
+def load_preview(table_ref: str) -> pd.DataFrame:
+    """First rows of the table, queried once per table and cached for every rerun and session."""
+    return get_registry().query_backend().execute(f"SELECT * FROM `{table_ref}` LIMIT 5")
+
+# Right column: Table Preview, only queried when asked for instead of on every rerun
 with col2:
     try:
         st.subheader("Table Preview")
-        config = load_config()
-        bq_client = bigquery.Client(credentials=config["gcp"].get("credentials")) if config["gcp"].get("credentials") else bigquery.Client()
-        preview_query = f"SELECT * FROM `{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}` LIMIT 5"
-        preview_df = bq_client.query(preview_query).to_dataframe()
-        st.dataframe(preview_df)
+        if st.checkbox("Show table preview"):
+            config = load_config()
+            st.dataframe(load_preview(f"{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}"))
     except Exception as e:
         st.error(f"Could not load table preview: {str(e)}")
 
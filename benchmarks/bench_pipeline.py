@@ -0,0 +1,151 @@
+"""
+Offline benchmark suite for the question pipeline.
+
+Runs the real pipeline code against the fake Gemini / BigQuery stand-ins from
+`src.askdata.components.fakes` (DuckDB over superstore_data.csv), so no cloud access is
+needed. Simulated latencies let the LLM and warehouse share be dialled in, and the
+per-stage span histograms show where the time goes.
+
+    python -m benchmarks.bench_pipeline --rounds 20 --llm-latency 0.5 --warehouse-latency 0.2
+    python -m benchmarks.bench_pipeline --save baseline.json
+    python -m benchmarks.bench_pipeline --compare baseline.json --max-regression 0.2
+"""
+import argparse
+import copy
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from src.askdata import configure_logging
+from src.askdata.components.answer import fast_answer
+from src.askdata.components.fakes import install_fakes, load_answers
+from src.askdata.components.preprocess import integrate_llm, preprocess_data
+from src.askdata.components.query_backend import translate_bigquery_sql
+from src.askdata.components.registry import get_registry, read_config, reset_registry
+from src.askdata.components.result_cache import canonicalize_sql
+from src.askdata.components.rollup import route_query
+from src.askdata.components.tracing import get_tracer
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+class Benchmark:
+    """Minimal pytest-benchmark-like runner: warmup rounds, timed rounds, summary stats."""
+
+    def __init__(self, rounds: int, warmup: int = 1):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.results: Dict[str, dict] = {}
+
+    def __call__(self, name: str, fn: Callable[[], object]) -> None:
+        for _ in range(self.warmup):
+            fn()
+        timings = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        self.results[name] = {
+            "rounds": self.rounds,
+            "min": min(timings),
+            "mean": statistics.fmean(timings),
+            "median": statistics.median(timings),
+            "p95": float(np.percentile(timings, 95)),
+            "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        }
+
+    def report(self) -> str:
+        lines = [f"{'benchmark':<28}{'min ms':>10}{'median ms':>11}{'mean ms':>10}{'p95 ms':>10}"]
+        for name, stats in self.results.items():
+            lines.append(
+                f"{name:<28}{stats['min'] * 1000:>10.3f}{stats['median'] * 1000:>11.3f}"
+                f"{stats['mean'] * 1000:>10.3f}{stats['p95'] * 1000:>10.3f}"
+            )
+        return "\n".join(lines)
+
+
+def setup_pipeline(args) -> List[str]:
+    """Fresh registry with caches and rollups off (unless asked for) and the fakes installed."""
+    reset_registry()
+    registry = get_registry()
+    config = copy.deepcopy(read_config())
+    config["query_backend"]["engine"] = "bigquery"  # the fake client stands in for BigQuery
+    config.setdefault("tracing", {})["log_spans"] = False
+    if not args.cache:
+        config["cache"]["question"]["enabled"] = False
+        config["cache"]["result"]["enabled"] = False
+    config["rollups"]["enabled"] = False
+    registry.register("config", config)
+    get_tracer().configure(config["tracing"])
+    answers = load_answers(args.questions)
+    install_fakes(
+        registry,
+        answers,
+        llm_latency=args.llm_latency,
+        warehouse_latency=args.warehouse_latency,
+    )
+    return list(answers)
+
+
+def run_suite(args) -> Tuple[Dict[str, dict], str]:
+    questions = setup_pipeline(args)
+    config = get_registry().config()
+    bench = Benchmark(args.rounds, warmup=1)
+    get_tracer().reset()
+
+    # Our own code on the request path, no I/O
+    sample_sql = max(load_answers(args.questions).values(), key=len)
+    bench("canonicalize_sql", lambda: canonicalize_sql(sample_sql))
+    bench("translate_bigquery_sql", lambda: translate_bigquery_sql(
+        sample_sql, config["gcp"]["bq_dataset"], config["gcp"]["bq_table"]))
+    bench("route_query", lambda: route_query(sample_sql, config, "bigquery"))
+    small_result = get_registry().query_backend().execute(sample_sql)
+    bench("fast_answer", lambda: fast_answer(small_result))
+
+    # Whole pipeline, one benchmark per question
+    get_tracer().reset()
+    data_info = preprocess_data()
+    for i, question in enumerate(questions):
+        bench(f"e2e[{i}]", lambda: integrate_llm(data_info, question))
+    return bench.results, bench.report()
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """Names of benchmarks whose median got slower than the baseline by more than max_regression."""
+    regressions = []
+    for name, stats in results.items():
+        if name in baseline and stats["median"] > baseline[name]["median"] * (1 + max_regression):
+            regressions.append(
+                f"{name}: {baseline[name]['median'] * 1000:.3f} ms -> {stats['median'] * 1000:.3f} ms"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the question pipeline with fake LLM/warehouse.")
+    parser.add_argument("--questions", default=str(PROJECT_ROOT / "data" / "audit_questions.jsonl"))
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per Gemini call")
+    parser.add_argument("--warehouse-latency", type=float, default=0.0, help="Simulated seconds per BigQuery job")
+    parser.add_argument("--cache", action="store_true", help="Keep the question and result caches on")
+    parser.add_argument("--save", help="Write the results as JSON, e.g. a baseline")
+    parser.add_argument("--compare", help="Baseline JSON written by --save")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed median slowdown vs baseline")
+    args = parser.parse_args()
+
+    results, report = run_suite(args)
+    print(report)
+    print()
+    print(get_tracer().format_summary())
+    if args.save:
+        Path(args.save).write_text(json.dumps({"benchmarks": results, "stages": get_tracer().snapshot()}, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["benchmarks"]
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,114 @@
+"""
+Import-time / cold-start benchmark of the entry points.
+
+Imports each entry point in a fresh interpreter under `python -X importtime` and reports
+the total import time (sum of every module's self time), the interpreter's wall-clock
+start-up to exit, and the packages that took longest to import, so an eager heavy import
+(Vertex AI, BigQuery, Streamlit, plotly, matplotlib, ...) on a cold path shows up.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --save imports.json
+    python -m benchmarks.import_time --compare imports.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from src.askdata import configure_logging, logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# What a cold container / Streamlit worker / script imports first
+ENTRY_POINTS = [
+    "app",
+    "src.askdata.components.preprocess",
+    "src.askdata.components.service",
+    "src.askdata.components.data_ingestion",
+    "src.askdata.components.visualization",
+]
+
+
+def parse_importtime(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Total self time and {root package: self time of its modules} in seconds from -X importtime output."""
+    total, packages = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        seconds = int(self_us) / 1e6
+        total += seconds
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + seconds
+    return total, packages
+
+
+def measure(module: str) -> Tuple[float, float, Dict[str, float]]:
+    """(import seconds, wall seconds, per-package times) of importing `module` cold."""
+    env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT)}
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    total, packages = parse_importtime(completed.stderr)
+    return total, wall, packages
+
+
+def run(entry_points: List[str], rounds: int, top: int) -> Tuple[Dict[str, dict], str]:
+    results, lines = {}, [f"{'entry point':<44}{'import ms':>11}{'wall ms':>10}  slowest packages (ms)"]
+    for module in entry_points:
+        try:
+            measure(module)  # bytecode compilation, not part of a cold start
+            samples = [measure(module) for _ in range(rounds)]
+        except RuntimeError as e:
+            logger.warning(f"Could not import {module}: {e}")
+            lines.append(f"{module:<44}{'failed':>11}{'':>10}  {e}")
+            continue
+        imports = statistics.median(s[0] for s in samples)
+        wall = statistics.median(s[1] for s in samples)
+        heaviest = sorted(samples[-1][2].items(), key=lambda item: -item[1])[:top]
+        results[module] = {"import": imports, "wall": wall, "heaviest": dict(heaviest)}
+        lines.append(
+            f"{module:<44}{imports * 1000:>11.0f}{wall * 1000:>10.0f}  "
+            + ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in heaviest)
+        )
+    return results, "\n".join(lines)
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """Entry points whose median import time got slower than the baseline by more than max_regression."""
+    return [
+        f"{module}: {baseline[module]['import'] * 1000:.0f} ms -> {stats['import'] * 1000:.0f} ms"
+        for module, stats in results.items()
+        if module in baseline and stats["import"] > baseline[module]["import"] * (1 + max_regression)
+    ]
+
+
+if __name__ == "__main__":
+    configure_logging(log_file=None)
+    parser = argparse.ArgumentParser(description="Cold import time of the app and pipeline entry points.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest packages to list")
+    parser.add_argument("--save", help="Write the results as JSON, e.g. a baseline")
+    parser.add_argument("--compare", help="Baseline JSON written by --save")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed import-time slowdown vs baseline")
+    args = parser.parse_args()
+
+    results, report = run(args.modules, args.rounds, args.top)
+    print(report)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
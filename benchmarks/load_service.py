@@ -0,0 +1,98 @@
+"""
+Offline load test of the asyncio service.
+
+Simulates `--users` people asking questions at the same time against the fake Gemini /
+BigQuery stand-ins, in `--waves` bursts where everyone picks from `--distinct`
+questions (a shared dashboard link: many people, few questions). Reports latency
+percentiles, how many pipeline runs and backend calls the burst cost and the service's
+queue / backpressure counters.
+
+    python -m benchmarks.load_service --users 50 --distinct 3 --llm-latency 0.5 --warehouse-latency 0.3
+    python -m benchmarks.load_service --users 50 --no-coalesce
+"""
+import argparse
+import asyncio
+import random
+import time
+import numpy as np
+from benchmarks.bench_pipeline import PROJECT_ROOT, setup_pipeline
+from src.askdata import configure_logging
+from src.askdata.components.registry import get_registry
+from src.askdata.components.service import AskService, ServiceError
+from src.askdata.components.tracing import get_tracer
+
+
+async def _user(service: AskService, question: str, latencies: list, failures: dict) -> None:
+    started = time.perf_counter()
+    try:
+        await service.ask(question)
+        latencies.append(time.perf_counter() - started)
+    except ServiceError as e:
+        failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+
+async def _monitor(service: AskService, peaks: dict) -> None:
+    while True:
+        stats = service.stats()
+        peaks["queue_depth"] = max(peaks["queue_depth"], stats["queue_depth"])
+        peaks["pending"] = max(peaks["pending"], stats["pending"])
+        await asyncio.sleep(0.005)
+
+
+async def run_load(args, questions: list) -> dict:
+    service = AskService(
+        llm_concurrency=args.llm_concurrency,
+        warehouse_concurrency=args.warehouse_concurrency,
+        max_pending=args.max_pending,
+        timeout_seconds=args.timeout,
+        coalesce=not args.no_coalesce,
+    )
+    rng = random.Random(0)
+    pool = questions[: args.distinct]
+    latencies, failures, peaks = [], {}, {"queue_depth": 0, "pending": 0}
+    monitor = asyncio.create_task(_monitor(service, peaks))
+    started = time.perf_counter()
+    for _ in range(args.waves):
+        await asyncio.gather(*[
+            _user(service, rng.choice(pool), latencies, failures) for _ in range(args.users)
+        ])
+    elapsed = time.perf_counter() - started
+    monitor.cancel()
+    return {"service": service.stats(), "latencies": latencies, "failures": failures, "peaks": peaks, "elapsed": elapsed}
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Offline load test of the asyncio service with fake LLM/warehouse.")
+    parser.add_argument("--questions", default=str(PROJECT_ROOT / "data" / "audit_questions.jsonl"))
+    parser.add_argument("--users", type=int, default=50, help="Concurrent askers per wave")
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--distinct", type=int, default=3, help="Distinct questions the users pick from")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated seconds per Gemini call")
+    parser.add_argument("--warehouse-latency", type=float, default=0.3, help="Simulated seconds per BigQuery job")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--warehouse-concurrency", type=int, default=8)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--no-coalesce", action="store_true", help="Run every question separately")
+    parser.add_argument("--cache", action="store_true", help="Keep the question and result caches on")
+    args = parser.parse_args()
+
+    questions = setup_pipeline(args)
+    registry = get_registry()
+    get_tracer().reset()
+    outcome = asyncio.run(run_load(args, questions))
+
+    model = registry.generative_model(registry.config()["llm"]["model_name"])
+    client = registry.bigquery_client()
+    latencies = np.asarray(outcome["latencies"]) * 1000
+    stats = outcome["service"]
+    print(f"{stats['requests']} questions in {outcome['elapsed']:.2f}s: {stats['runs']} pipeline runs, "
+          f"{stats['coalesced']} coalesced, {model.calls} LLM calls, {client.queries} warehouse queries")
+    if len(latencies):
+        print(f"latency ms: p50 {np.percentile(latencies, 50):.0f}, p95 {np.percentile(latencies, 95):.0f}, "
+              f"max {latencies.max():.0f}")
+    print(f"peak queue depth {outcome['peaks']['queue_depth']}, peak pending {outcome['peaks']['pending']}"
+          f"/{stats['max_pending']}, failures {outcome['failures'] or 'none'}")
+    print()
+    print(get_tracer().format_summary())
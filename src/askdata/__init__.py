@@ -6,15 +6,20 @@ logging_str = "[%(asctime)s: %(levelname)s: %(module)s: %(message)s]"
 
 log_dir = "logs"
 log_filepath = os.path.join(log_dir, "ingestion.log")
-os.makedirs(log_dir, exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format=logging_str,
-    handlers=[
-        logging.FileHandler(log_filepath),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+logger = logging.getLogger('askdata_logger')
 
-logger = logging.getLogger('askdata_logger')
\ No newline at end of file
+
+def configure_logging(level: int = logging.INFO, log_file: str = log_filepath) -> None:
+    """
+    Logs to stdout and `log_file`. Called by the entry points (app, scripts, benchmarks),
+    importing the package no longer touches the root logger or the log file.
+    Like logging.basicConfig, it does nothing once the root logger has handlers.
+    """
+    if logging.getLogger().handlers:
+        return
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(level=level, format=logging_str, handlers=handlers)
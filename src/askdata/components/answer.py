@@ -0,0 +1,71 @@
+from typing import Optional
+import numbers
+import re
+import pandas as pd
+
+
+# Numeric columns that label rows rather than measure something: years, months, IDs, ...
+KEY_COLUMN_PATTERN = re.compile(r"(^|[^a-z])(year|quarter|month|week|day|hour|date|time|period|id|number|code)s?($|[^a-z])", re.I)
+# Unnamed DuckDB expressions keep their text, an aggregate is a measure whatever it aggregates
+AGGREGATE_PATTERN = re.compile(r"^(sum|count|avg|min|max)\(", re.I)
+
+
+def is_key_column(column) -> bool:
+    column = str(column) if column is not None else ""
+    return bool(KEY_COLUMN_PATTERN.search(column)) and not AGGREGATE_PATTERN.match(column)
+
+
+def format_value(value, column=None) -> str:
+    """
+    Human-friendly rendering of a result cell: thousands separators, at most 2 decimals.
+
+    Values of key columns (see `is_key_column`) such as a year are not grouped, 2011 stays 2011.
+    """
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    separator = "" if is_key_column(column) else ","
+    if isinstance(value, numbers.Integral):
+        return f"{value:{separator}}"
+    if isinstance(value, numbers.Real):
+        if pd.isna(value):
+            return "n/a"
+        return f"{value:{separator}.0f}" if float(value).is_integer() else f"{value:{separator}.2f}"
+    return str(value)
+
+
+def _label(column: str) -> str:
+    return str(column).replace("_", " ")
+
+
+def fast_answer(result_df: pd.DataFrame, max_rows: int = 10) -> Optional[str]:
+    """
+    Deterministic answer for results that need no LLM rewrite.
+
+    Covers empty results, single values and small tables (up to `max_rows` rows and three
+    columns). Returns None when the result should go through the refine prompt.
+    """
+    if result_df.empty:
+        return "No data found for this query."
+    if len(result_df.columns) == 1 and len(result_df) == 1:
+        column = str(result_df.columns[0])
+        # Unnamed expressions come back as f0_ (BigQuery) or the expression text (DuckDB)
+        if re.fullmatch(r"f\d+_", column) or "(" in column:
+            return f"The answer is {format_value(result_df.iloc[0, 0], column)}."
+        return f"The {_label(column)} is {format_value(result_df.iloc[0, 0], column)}."
+    if len(result_df) > max_rows or len(result_df.columns) > 3:
+        return None
+    if len(result_df) == 1:
+        parts = [f"{_label(c)}: {format_value(v, c)}" for c, v in result_df.iloc[0].items()]
+        return "The result is " + ", ".join(parts) + "."
+    if len(result_df.columns) == 1:
+        column = result_df.columns[0]
+        return "\n".join([f"{_label(column).capitalize()}:"] + [f"- {format_value(v, column)}" for v in result_df[column]])
+    key, values = result_df.columns[0], result_df.columns[1:]
+    lines = [
+        f"- {format_value(row[key], key)}: " + ", ".join(
+            format_value(row[c], c) if len(values) == 1 else f"{_label(c)} {format_value(row[c], c)}" for c in values
+        )
+        for _, row in result_df.iterrows()
+    ]
+    header = f"{', '.join(_label(c) for c in values).capitalize()} by {_label(key)}:"
+    return "\n".join([header] + lines)
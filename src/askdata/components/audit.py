@@ -0,0 +1,220 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from src.askdata import configure_logging, logger
+from src.askdata.components.preprocess import (
+    answer_result,
+    generate_sql,
+    load_config,
+    preprocess_data,
+    run_sql,
+)
+from src.askdata.components.query_backend import QueryBackend, get_query_backend
+from src.askdata.components.tracing import get_tracer
+
+
+@dataclass
+class AuditQuestion:
+    question: str
+    sql: Optional[str] = None  # ground-truth SQL in the BigQuery dialect
+    expected: Optional[object] = None  # expected value(s), used when no SQL is given
+
+
+@dataclass
+class AuditResult:
+    question: str
+    correct: Optional[bool] = None
+    error: Optional[str] = None
+    generated_sql: Optional[str] = None
+    answer: Optional[str] = None
+    rows: int = 0
+    latency: Dict[str, float] = field(default_factory=dict)
+
+
+def load_questions(path: str) -> List[AuditQuestion]:
+    """Reads questions from JSONL or CSV with a `question` column and optional `sql` / `expected`."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        records = pd.read_csv(path).replace({np.nan: None}).to_dict("records")
+    else:
+        records = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    return [
+        AuditQuestion(question=r["question"], sql=r.get("sql"), expected=r.get("expected"))
+        for r in records
+    ]
+
+
+def local_backend(config: dict) -> QueryBackend:
+    """DuckDB backend over the local CSV, used to compute ground truth whatever the app's engine is."""
+    backend_config = dict(config.get("query_backend", {}), engine="duckdb")
+    return get_query_backend(dict(config, query_backend=backend_config))
+
+
+def _normalize_rows(df: pd.DataFrame, decimals: int) -> List[tuple]:
+    rows = []
+    for row in df.itertuples(index=False):
+        values = []
+        for value in row:
+            if isinstance(value, (int, float, Decimal, np.number)) and not isinstance(value, bool) and not pd.isna(value):
+                value = round(float(value), decimals)
+            values.append(str(value) if not isinstance(value, float) else value)
+        rows.append(tuple(values))
+    return sorted(rows, key=str)
+
+
+def results_match(actual: pd.DataFrame, expected: pd.DataFrame, decimals: int = 2) -> bool:
+    """
+    Compares two results ignoring column names and row order.
+
+    Numbers are compared after rounding to `decimals`. A single-value expectation matches
+    when the actual result is a single value too.
+    """
+    if expected.shape != actual.shape:
+        return False
+    return _normalize_rows(actual, decimals) == _normalize_rows(expected, decimals)
+
+
+def expected_frame(item: AuditQuestion, ground_truth: QueryBackend) -> Optional[pd.DataFrame]:
+    if item.sql:
+        return ground_truth.execute(item.sql)
+    if item.expected is None:
+        return None
+    values = item.expected if isinstance(item.expected, list) else [item.expected]
+    return pd.DataFrame({"expected": values})
+
+
+class _RateLimiter:
+    """Spaces request starts at least 1/max_qps seconds apart across threads."""
+
+    def __init__(self, max_qps: Optional[float]):
+        self.interval = 1.0 / max_qps if max_qps else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def audit_question(item: AuditQuestion, ground_truth: QueryBackend, limiter: _RateLimiter) -> AuditResult:
+    """Runs one question through the pipeline stage by stage and checks it against ground truth."""
+    result = AuditResult(question=item.question)
+    limiter.wait()
+    started = time.perf_counter()
+    with get_tracer().trace():
+        try:
+            stage_started = time.perf_counter()
+            data_info = preprocess_data()
+            result.latency["preprocess"] = time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            result.generated_sql, from_cache = generate_sql(data_info, item.question)
+            result.latency["generate_sql"] = time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            result_df = run_sql(data_info, item.question, result.generated_sql, from_cache)
+            result.latency["execute"] = time.perf_counter() - stage_started
+            result.rows = len(result_df)
+
+            stage_started = time.perf_counter()
+            result.answer = answer_result(data_info, item.question, result_df)
+            result.latency["answer"] = time.perf_counter() - stage_started
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            result.correct = False if (item.sql or item.expected is not None) else None
+            result_df = None
+    result.latency["total"] = time.perf_counter() - started
+
+    # Grading runs outside the trace so ground-truth queries do not show up in the stage histograms
+    if result_df is not None:
+        try:
+            expected = expected_frame(item, ground_truth)
+        except Exception as e:
+            logger.error(f"Ground truth failed for '{item.question}': {str(e)}")
+            result.error = f"ground truth: {type(e).__name__}: {e}"
+            return result
+        if expected is not None:
+            result.correct = results_match(result_df, expected)
+    return result
+
+
+def summarize(results: List[AuditResult], elapsed: float) -> dict:
+    graded = [r for r in results if r.correct is not None]
+    summary = {
+        "questions": len(results),
+        "graded": len(graded),
+        "correct": sum(bool(r.correct) for r in graded),
+        "errors": sum(r.error is not None for r in results),
+        "accuracy": sum(bool(r.correct) for r in graded) / len(graded) if graded else None,
+        "elapsed_seconds": elapsed,
+        "throughput_qps": len(results) / elapsed if elapsed else 0.0,
+        "latency": {},
+    }
+    stages = sorted({stage for r in results for stage in r.latency})
+    for stage in stages:
+        values = np.array([r.latency[stage] for r in results if stage in r.latency])
+        summary["latency"][stage] = {
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "mean": float(values.mean()),
+        }
+    return summary
+
+
+def run_audit(questions: List[AuditQuestion], concurrency: int = 4, max_qps: Optional[float] = None) -> dict:
+    """
+    Runs the questions concurrently and grades them against ground truth computed locally.
+
+    Args:
+        questions (List[AuditQuestion]): Questions with optional ground-truth SQL or values.
+        concurrency (int): Questions in flight at once, keep it within the Vertex AI quota.
+        max_qps (Optional[float]): Upper bound on questions started per second.
+
+    Returns:
+        dict: {"summary": aggregate accuracy/throughput/latency percentiles, "results": per question}.
+    """
+    config = load_config()
+    ground_truth = local_backend(config)
+    limiter = _RateLimiter(max_qps)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda item: audit_question(item, ground_truth, limiter), questions))
+    elapsed = time.perf_counter() - started
+    summary = summarize(results, elapsed)
+    logger.info(
+        f"Audit: {summary['correct']}/{summary['graded']} correct, {summary['errors']} errors, "
+        f"{summary['throughput_qps']:.2f} questions/s"
+    )
+    return {"summary": summary, "results": [asdict(r) for r in results]}
+
+
+if __name__ == "__main__":
+    # python -m src.askdata.components.audit data/audit_questions.jsonl --concurrency 4 --output audit.json
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Audit LLM answers against ground truth computed from the local CSV.")
+    parser.add_argument("questions", help="JSONL or CSV file with question, and optionally sql / expected")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-qps", type=float, default=None)
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    report = run_audit(load_questions(args.questions), concurrency=args.concurrency, max_qps=args.max_qps)
+    for r in report["results"]:
+        status = {True: "OK  ", False: "FAIL", None: "----"}[r["correct"]]
+        print(f"{status} {r['latency']['total']:6.2f}s  {r['question']}" + (f"  [{r['error']}]" if r["error"] else ""))
+    print(json.dumps(report["summary"], indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, default=str))
@@ -0,0 +1,240 @@
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.askdata.components.question_cache import hash_parts
+from src.askdata.components.registry import get_registry
+
+OTHER_LABEL = "Other"
+# Measures the app draws as bars, any other 2-column result is drawn as a pie
+BAR_MEASURES = ("profit", "gmv", "quantity")
+TIME_NAMES = ("date", "day", "week", "month", "year", "quarter", "time")
+# Period labels as FORMAT_DATE / TO_CHAR output them, e.g. '2014-03' or 'Mar 2014'
+PERIOD_FORMATS = ("%Y-%m-%d", "%Y-%m", "%Y/%m", "%Y%m", "%b %Y", "%B %Y", "%Y")
+
+
+@dataclass
+class ChartSpec:
+    """What to draw: chart kind, the (reduced) data and its columns, plus a note on any reduction."""
+    kind: str  # none | value | bar | pie | line | histogram | scatter
+    data: pd.DataFrame
+    x: Optional[str] = None
+    y: Optional[str] = None
+    title: str = ""
+    note: str = ""
+
+
+def top_n_other(data: pd.DataFrame, key: str, value: str, n: int) -> pd.DataFrame:
+    """Keeps the n-1 largest groups by `value` and sums the rest into one 'Other' row."""
+    if len(data) <= n:
+        return data
+    ranked = data[[key, value]].sort_values(value, ascending=False)
+    head, rest = ranked.head(n - 1), ranked.iloc[n - 1:]
+    other = pd.DataFrame({key: [OTHER_LABEL], value: [rest[value].sum()]})
+    return pd.concat([head.astype({key: object}), other], ignore_index=True)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling, returns the indices of the points to keep.
+
+    Keeps the first and last points and, for every bucket in between, the point forming
+    the largest triangle with the previous kept point and the next bucket's mean, which
+    preserves peaks and troughs far better than taking every k-th point.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(float)
+    y = y.astype(float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = [0]
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        mean_x = x[next_start:next_end].mean()
+        mean_y = y[next_start:next_end].mean()
+        a = keep[-1]
+        areas = np.abs(
+            (x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a])
+        )
+        keep.append(start + int(np.argmax(areas)))
+    keep.append(n - 1)
+    return np.asarray(keep)
+
+
+def histogram_bins(values: pd.Series, bins: int) -> pd.DataFrame:
+    """
+    Counts per equal-width bin, with a readable 'low-high' label per bin. Discrete values
+    with no more distinct values than bins (e.g. quantities) are counted per value instead.
+    """
+    values = pd.to_numeric(values, errors="coerce").dropna()
+    if values.nunique() <= bins and (values % 1 == 0).all():
+        counts = values.astype(int).value_counts().sort_index()
+        return pd.DataFrame({"bin": counts.index.astype(str), "count": counts.to_numpy()})
+    counts, edges = np.histogram(values, bins=bins)
+    labels = [f"{edges[i]:,.4g}-{edges[i + 1]:,.4g}" for i in range(len(counts))]
+    return pd.DataFrame({"bin": labels, "count": counts})
+
+
+def _parse_periods(values: pd.Series) -> Optional[pd.Series]:
+    """String labels parsed as dates when every one of them matches one PERIOD_FORMATS format, else None."""
+    if not (values.dtype == object or pd.api.types.is_string_dtype(values)):
+        return None
+    labels = values.dropna().astype(str).str.strip()
+    if labels.empty or not labels.str.contains(r"\d").all():
+        return None
+    for period_format in PERIOD_FORMATS:
+        parsed = pd.to_datetime(labels, format=period_format, errors="coerce")
+        if parsed.notna().all():
+            return pd.to_datetime(values.astype(str).str.strip(), format=period_format, errors="coerce")
+    # Quarters, e.g. '2014-Q1' or '2014Q1'
+    if labels.str.fullmatch(r"\d{4}-?Q[1-4]").all():
+        return pd.PeriodIndex(values.astype(str).str.replace("-", ""), freq="Q").to_timestamp().to_series(index=values.index)
+    return None
+
+
+def _is_time(data: pd.DataFrame, column: str) -> bool:
+    values = data[column]
+    if pd.api.types.is_datetime64_any_dtype(values) or str(values.dtype) == "dbdate":
+        return True
+    if values.dtype == object and len(values) and isinstance(values.iloc[0], datetime.date):
+        return True
+    name = str(column).lower()
+    if any(part in name for part in TIME_NAMES) and pd.api.types.is_numeric_dtype(values):
+        return True
+    return _parse_periods(values) is not None
+
+
+def _time_axis(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    periods = _parse_periods(values)
+    dates = pd.to_datetime(values) if periods is None else periods
+    return dates.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+
+
+def prepare_chart(result_df: pd.DataFrame, max_categories: int = 20, max_points: int = 500, bins: int = 30) -> ChartSpec:
+    """
+    Picks the chart for a query result and reduces its data to a bounded size.
+
+    Categorical charts keep the top `max_categories` groups plus 'Other', time series are
+    downsampled to `max_points` with LTTB, two continuous measures are sampled to
+    `max_points` points and a single numeric column becomes a histogram of `bins` bins.
+    """
+    if result_df.empty:
+        return ChartSpec("none", result_df)
+    columns = list(result_df.columns)
+    if len(columns) == 1 and len(result_df) == 1:
+        return ChartSpec("value", result_df, y=columns[0])
+    if len(result_df) == 1:
+        return ChartSpec("none", result_df)
+
+    if len(columns) == 1:
+        column = columns[0]
+        if not pd.api.types.is_numeric_dtype(result_df[column]):
+            counts = result_df[column].astype(str).value_counts().rename_axis(column).reset_index(name="count")
+            data = top_n_other(counts, column, "count", max_categories)
+            return ChartSpec("bar", data, x=column, y="count", title=f"Count by {column}",
+                             note=_note(len(counts), len(data), "groups"))
+        data = histogram_bins(result_df[column], bins)
+        return ChartSpec("histogram", data, x="bin", y="count", title=f"Distribution of {column}",
+                         note=f"{len(result_df):,} values in {len(data)} bins")
+
+    x = columns[0]
+    measures = [c for c in columns[1:] if pd.api.types.is_numeric_dtype(result_df[c])]
+    if not measures:
+        return ChartSpec("none", result_df)
+    y = measures[0]
+    if _is_time(result_df, x):
+        # Sorted by time, not by label: 'Apr 2014' comes after 'Mar 2014'
+        axis = _time_axis(result_df[x])
+        order = np.argsort(axis, kind="stable")
+        data = result_df[[x, y]].iloc[order]
+        keep = lttb(axis[order], data[y].to_numpy(), max_points)
+        reduced = data.iloc[keep]
+        return ChartSpec("line", reduced, x=x, y=y, title=f"{str(y).capitalize()} over {x}",
+                         note=_note(len(data), len(reduced), "points"))
+
+    data = result_df[[x, y]]
+    if pd.api.types.is_numeric_dtype(data[x]) and data[x].nunique() > max_categories:
+        # Two continuous measures (e.g. GMV vs profit): a point sample keeps the shape of the cloud
+        reduced = data.sample(max_points, random_state=0) if len(data) > max_points else data
+        return ChartSpec("scatter", reduced, x=x, y=y, title=f"{str(y).capitalize()} vs {str(x).capitalize()}",
+                         note=_note(len(data), len(reduced), "points"))
+    if len(columns) == 2 and not any(m in str(y).lower() for m in BAR_MEASURES):
+        reduced = top_n_other(data, x, y, max_categories)
+        return ChartSpec("pie", reduced, x=x, y=y, title=f"{str(y).capitalize()} Distribution",
+                         note=_note(len(data), len(reduced), "groups"))
+    if data[x].duplicated().any():
+        data = data.groupby(x, as_index=False, sort=False)[y].sum()
+    reduced = top_n_other(data, x, y, max_categories)
+    return ChartSpec("bar", reduced, x=x, y=y, title=f"{str(y).capitalize()} by {str(x).capitalize()}",
+                     note=_note(len(data), len(reduced), "groups"))
+
+
+def _note(before: int, after: int, unit: str) -> str:
+    if after >= before:
+        return ""
+    if unit == "groups":
+        return f"Showing the top {after - 1} of {before:,} groups, the rest are combined as '{OTHER_LABEL}'."
+    return f"Downsampled from {before:,} to {after:,} {unit}."
+
+
+def result_fingerprint(result_df: pd.DataFrame) -> str:
+    """Cheap content hash of a result, to tell whether a cached figure still matches it."""
+    return hash_parts(list(map(str, result_df.columns)), int(pd.util.hash_pandas_object(result_df, index=False).sum()))
+
+
+class FigureCache:
+    """
+    In-process LRU of rendered figures keyed by the SQL hash.
+
+    Each entry keeps the fingerprint of the result it was drawn from, so a figure is only
+    reused while the SQL still returns the same data.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sql: str, fingerprint: str):
+        key = hash_parts(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, sql: str, fingerprint: str, figure) -> None:
+        key = hash_parts(sql)
+        with self._lock:
+            self._entries[key] = (fingerprint, figure)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def get_figure_cache(config: dict, kind: str = "figure") -> FigureCache:
+    """
+    Process-wide figure cache for one kind of output. Each kind (the app's plotly figures,
+    visualization's PNG bytes) has its own cache, the same SQL is drawn differently by each.
+    """
+    return get_registry().get_or_create(
+        f"figure_cache:{kind}", lambda: FigureCache(config.get("charts", {}).get("figure_cache_entries", 128))
+    )
+
+
+def chart_settings(config: dict) -> dict:
+    """Keyword arguments of prepare_chart from the `charts` config section."""
+    charts = config.get("charts", {})
+    return {
+        "max_categories": charts.get("max_categories", 20),
+        "max_points": charts.get("max_points", 500),
+        "bins": charts.get("histogram_bins", 30),
+    }
@@ -1,161 +1,397 @@
-from google.cloud import storage, bigquery
-from google.cloud import aiplatform
-from google.cloud.aiplatform_v1.types import index as gca_index  # For IndexDatapoint
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import io
-from tqdm import tqdm
-from typing import List
-import yaml
-from pathlib import Path
-import vertexai
+from typing import TYPE_CHECKING, BinaryIO, Iterator, List, Optional, Union
 
 # Assuming these are custom modules in your project
 from src.askdata.components.embedding import create_embeddings  # Function to create embeddings
-from src.askdata import logger  # Logger setup
+from src.askdata.components.embedding_pipeline import build_texts, pipeline_from_config
+from src.askdata.components.result_cache import get_result_cache
+from src.askdata.components.registry import get_registry
+from src.askdata.components.query_backend import PROJECT_ROOT, CSV_DATE_FORMAT, DATE_COLUMNS
+from src.askdata.components import incremental
+from src.askdata.components.vector_index import IndexStaging, VectorIndex, index_path, staging_path
+from src.askdata.components.rollup import build_rollups
+from src.askdata.components.partitioning import TableLayout, layout_matches, table_layout
+from src.askdata.components.data_profile import ProfileBuilder, profile_path, profile_version, save_profile
+from src.askdata import configure_logging, logger  # Logger setup
 
-def load_config(config_path: str = "config/config.yaml") -> dict:
-    """
-    Loads configuration from a YAML file.
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
-    Args:
-        config_path (str): Path to the config file relative to the project root.
+# BigQuery schema of the Superstore table as (name, type), see bigquery_schema
+SCHEMA = [
+    ("row_id", "STRING"),  # stable line ID, see incremental.assign_row_ids
+    ("order_id", "STRING"),
+    ("order_date", "DATE"),
+    ("ship_date", "DATE"),
+    ("ship_mode", "STRING"),
+    ("customer_name", "STRING"),
+    ("segment", "STRING"),
+    ("city", "STRING"),
+    ("country", "STRING"),
+    ("region", "STRING"),
+    ("category", "STRING"),
+    ("sub_category", "STRING"),
+    ("gmv", "FLOAT"),
+    ("profit", "FLOAT"),
+    ("quantity", "INTEGER"),
+    ("cost", "FLOAT"),
+    ("total_gmv", "FLOAT"),
+    ("total_cost", "FLOAT"),
+    ("total_profit", "FLOAT"),
+    ("lon", "FLOAT"),
+    ("lat", "FLOAT"),
+]
+
+# Arrow types matching SCHEMA, so every Parquet chunk has the exact column types BigQuery expects
+ARROW_SCHEMA = pa.schema([
+    (name, {"STRING": pa.string(), "DATE": pa.date32(), "FLOAT": pa.float64(), "INTEGER": pa.int64()}[field_type])
+    for name, field_type in SCHEMA
+])
+
+# Explicit CSV dtypes so every chunk parses identically and pandas skips type inference
+CSV_DTYPES = {
+    name: {"STRING": "string", "FLOAT": "float64", "INTEGER": "Int64"}[field_type]
+    for name, field_type in SCHEMA
+    if name not in DATE_COLUMNS and name != "row_id"
+}
+
+
+def bigquery_schema() -> list:
+    """SCHEMA as BigQuery SchemaFields, built on use so the module imports without the BigQuery SDK."""
+    from google.cloud import bigquery
+    return [bigquery.SchemaField(name, field_type) for name, field_type in SCHEMA]
+
+def load_config() -> dict:
+    """
+    Loads the shared configuration.
 
     Returns:
         dict: Configuration dictionary.
     """
-    config_file = Path(__file__).resolve().parents[3] / config_path
-    with open(config_file, "r") as f:
-        config = yaml.safe_load(f)
-    return config
+    return get_registry().config()
+
+def open_source(config: dict) -> BinaryIO:
+    """
+    Opens the source CSV as a binary stream.
+
+    Reads `ingestion.source_path` when set (relative to the project root), otherwise streams
+    the GCS blob in `ingestion.read_block_bytes` blocks instead of downloading it whole.
+    """
+    ingestion_config = config.get("ingestion", {})
+    source_path = ingestion_config.get("source_path")
+    if source_path:
+        return open(PROJECT_ROOT / source_path, "rb")
+    bucket = get_registry().storage_client().bucket(config["gcp"]["bucket_name"])
+    blob = bucket.blob(config["gcp"]["source_blob_name"])
+    return blob.open("rb", chunk_size=ingestion_config.get("read_block_bytes", 8 * 1024 * 1024))
+
+def iter_chunks(source: BinaryIO, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Parses the CSV incrementally with explicit dtypes and date formats.
 
-def ingest_data() -> pd.DataFrame:
+    Args:
+        source (BinaryIO): CSV stream.
+        chunk_rows (Optional[int]): Rows per chunk, None parses the whole file as one chunk.
+
+    Yields:
+        pd.DataFrame: Parsed chunk with `datetime.date` values in the date columns.
+    """
+    reader = pd.read_csv(source, dtype=CSV_DTYPES, chunksize=chunk_rows)
+    chunks = [reader] if chunk_rows is None else reader
+    for chunk in chunks:
+        for column in DATE_COLUMNS:
+            chunk[column] = pd.to_datetime(chunk[column], format=CSV_DATE_FORMAT).dt.date
+        yield chunk
+
+def load_chunk(
+    bigquery_client: "bigquery.Client",
+    table_ref,
+    chunk: pd.DataFrame,
+    write_disposition: str,
+    layout: Optional[TableLayout] = None,
+) -> None:
+    """Loads one chunk into BigQuery as Parquet through a load job, creating the table with `layout` if needed."""
+    table = pa.Table.from_pandas(chunk, preserve_index=False).select(ARROW_SCHEMA.names).cast(ARROW_SCHEMA)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    buffer.seek(0)
+    from google.cloud import bigquery
+    job_config = bigquery.LoadJobConfig(
+        schema=bigquery_schema(),
+        write_disposition=write_disposition,
+        create_disposition="CREATE_IF_NEEDED",
+        source_format=bigquery.SourceFormat.PARQUET,
+    )
+    if layout is not None and layout.partition_field:
+        job_config.time_partitioning = bigquery.TimePartitioning(type_=layout.partition_type, field=layout.partition_field)
+    if layout is not None and layout.clustering_fields:
+        job_config.clustering_fields = layout.clustering_fields
+    job = bigquery_client.load_table_from_file(buffer, table_ref, job_config=job_config)
+    job.result()
+
+    if job.errors:
+        logger.error(f"BigQuery load job errors: {job.errors}")
+        raise Exception(f"BigQuery load job failed: {job.errors}")
+
+def upsert_embeddings(my_index, data: pd.DataFrame, config: dict, staging: Optional[IndexStaging] = None) -> None:
+    """
+    Embeds the rows of `data` and upserts them, using the row_id column as datapoint ID.
+
+    When `staging` is given, (ids, texts, embeddings) of every batch are also appended to it
+    for the local vector index. With `my_index` None the rows are only staged.
+    """
+    model_name = config["embeddings"]["model_name"]
+    ids = data["row_id"].tolist()
+    texts = build_texts(data).tolist()
+    text_by_id = dict(zip(ids, texts))
+
+    def upsert(batch_ids, embeddings):
+        _upsert_batch(my_index, batch_ids, embeddings)
+        if staging is not None:
+            staging.append(batch_ids, [text_by_id[i] for i in batch_ids], embeddings)
+
+    pipeline = pipeline_from_config(
+        config,
+        embed_fn=lambda texts: create_embeddings(texts, model_name),
+        upsert_fn=upsert,
+    )
+    pipeline.run(ids, texts)
+
+def profile_builder(config: dict) -> ProfileBuilder:
+    return ProfileBuilder(
+        dict(SCHEMA),
+        max_tracked=config.get("profile", {}).get("max_tracked", 1000),
+    )
+
+def write_profile(config: dict, builder: ProfileBuilder, hashes: List[pd.Series]) -> dict:
+    """Saves the profile of the ingested table, versioned by its row content hashes."""
+    table_id = f"{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}"
+    profile = builder.build(table_id, profile_version(hashes), config.get("profile", {}).get("max_values", 30))
+    save_profile(profile_path(config), profile)
+    return profile
+
+def build_profile(config: dict) -> dict:
+    """Profiles the source CSV without loading it anywhere, e.g. for a local-only setup."""
+    builder = profile_builder(config)
+    hashes = []
+    seen_identities = {}
+    with open_source(config) as source:
+        for chunk in iter_chunks(source, config.get("ingestion", {}).get("chunk_rows", 50000)):
+            chunk = incremental.assign_row_ids(chunk, seen_identities)
+            hashes.append(incremental.content_hashes(chunk))
+            builder.update(chunk)
+    return write_profile(config, builder, hashes)
+
+def save_vector_index(config: dict, staging: IndexStaging, deleted_ids: List[str], mode: str) -> None:
+    """Builds (or, in incremental mode, updates) the local vector index used at question time."""
+    path = index_path(config)
+    ids, texts, matrix = staging.read()
+    if mode == "incremental" and path.exists():
+        index = VectorIndex.load(path).updated(deleted_ids, ids, texts, matrix)
+    else:
+        index = VectorIndex(ids, texts, matrix)
+    index.save(path)
+
+def prepare_table_layout(bigquery_client: "bigquery.Client", table_id: str, layout: TableLayout, mode: str) -> str:
+    """
+    Makes sure the next load creates the table with the configured partitioning and clustering.
+
+    A load job cannot change the layout of an existing table, so a table with another
+    layout is dropped before a full load, and an incremental ingest turns into a full
+    streaming load. Returns the mode to run.
+    """
+    from google.api_core.exceptions import NotFound
+    try:
+        table = bigquery_client.get_table(table_id)
+    except NotFound:
+        # Not created yet, the first load job creates it with the layout
+        return mode
+    if layout_matches(table, layout):
+        return mode
+    if mode == "incremental":
+        logger.info(f"{table_id} does not have the configured layout, running a full streaming load")
+        mode = "streaming"
+    logger.info(
+        f"Recreating {table_id} partitioned by {layout.partition_field} ({layout.partition_type}), "
+        f"clustered on {', '.join(layout.clustering_fields) or 'nothing'}"
+    )
+    bigquery_client.delete_table(table_id, not_found_ok=True)
+    return mode
+
+def swap_table(bigquery_client: "bigquery.Client", staging_id: str, table_id: str) -> None:
+    """Replaces `table_id` with the fully loaded staging table in one copy job and drops the staging table."""
+    from google.cloud import bigquery
+    job_config = bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+    bigquery_client.copy_table(staging_id, table_id, job_config=job_config).result()
+    bigquery_client.delete_table(staging_id, not_found_ok=True)
+    logger.info(f"Replaced {table_id} with {staging_id}")
+
+def _upsert_batch(my_index, ids: List[str], embeddings: List[List[float]]) -> None:
+    if my_index is None:
+        return
+    from google.cloud.aiplatform_v1.types import index as gca_index  # For IndexDatapoint
+    to_upsert = [
+        gca_index.IndexDatapoint(
+            datapoint_id=id,
+            feature_vector=embedding
+        )
+        for id, embedding in zip(ids, embeddings)
+    ]
+    my_index.upsert_datapoints(to_upsert)
+
+def ingest_data(mode: Optional[str] = None) -> Union[pd.DataFrame, int]:
     """
     Ingests data into BigQuery, creates embeddings, and updates the Vector Search index.
 
+    In "batch" mode the whole CSV is parsed and loaded at once. In "streaming" mode it is
+    read in `ingestion.chunk_rows` chunks; each chunk is loaded into a staging table with its
+    own Parquet load job and embedded before the next chunk is read, so peak memory is bounded
+    by the chunk size instead of the file size. The staging table replaces the live table only
+    after the last chunk loaded.
+
+    In "incremental" mode rows are compared with the content-hash manifest of the previous
+    ingest: only new or changed rows are staged, MERGEd into the table on row_id and
+    re-embedded, and rows missing from the source are deleted from the table. Without a
+    manifest it falls back to a full streaming load; without a local vector index every
+    row is embedded so the index can be rebuilt. Every mode removes datapoints of rows
+    that disappeared from the index and writes a fresh manifest and data profile.
+
+    Args:
+        mode (Optional[str]): "batch", "streaming" or "incremental", defaults to `ingestion.mode`.
+
     Returns:
-        pd.DataFrame: The ingested data.
+        Union[pd.DataFrame, int]: The ingested data in batch mode, otherwise the number of rows loaded.
 
     Raises:
         Exception: If any step in the ingestion process fails.
     """
     config = load_config()
+    registry = get_registry()
+    ingestion_config = config.get("ingestion", {})
+    mode = mode or ingestion_config.get("mode", "batch")
+    if mode not in ("batch", "streaming", "incremental"):
+        raise ValueError(f"Unknown ingestion mode: {mode}")
+    chunk_rows = ingestion_config.get("chunk_rows", 50000) if mode != "batch" else None
+    manifest_path = PROJECT_ROOT / ingestion_config.get("manifest_path", "data/ingest_manifest.parquet")
+    manifest = incremental.load_manifest(manifest_path)
+    if mode == "incremental" and manifest is None:
+        logger.info("No ingest manifest found, running a full streaming load")
+        mode = "streaming"
 
     # Initialize Vertex AI
-    vertexai.init(project=config["gcp"]["project_id"], location=config["gcp"]["location"])
+    registry.init_vertexai()
 
     try:
-        # --- 1. Load Data from GCS ---
-        storage_client = storage.Client()
-        bigquery_client = bigquery.Client()
-        bucket = storage_client.bucket(config["gcp"]["bucket_name"])
-        blob = bucket.blob(config["gcp"]["source_blob_name"])
-        data_bytes = blob.download_as_bytes()
-        data = pd.read_csv(
-            io.StringIO(data_bytes.decode("utf-8")),
-            parse_dates=["order_date", "ship_date"]
-        )
-        # Format dates as strings for BigQuery
-        data["order_date"] = data["order_date"].dt.strftime("%Y-%m-%d")
-        data["ship_date"] = data["ship_date"].dt.strftime("%Y-%m-%d")
-        logger.info(
-            f"Data CSV downloaded from {config['gcp']['bucket_name']}/{config['gcp']['source_blob_name']}"
-        )
-
-        # --- 2. Define BigQuery Schema ---
-        schema = [
-            bigquery.SchemaField("order_id", "STRING"),
-            bigquery.SchemaField("order_date", "DATE"),
-            bigquery.SchemaField("ship_date", "DATE"),
-            bigquery.SchemaField("ship_mode", "STRING"),
-            bigquery.SchemaField("customer_name", "STRING"),
-            bigquery.SchemaField("segment", "STRING"),
-            bigquery.SchemaField("city", "STRING"),
-            bigquery.SchemaField("country", "STRING"),
-            bigquery.SchemaField("region", "STRING"),
-            bigquery.SchemaField("category", "STRING"),
-            bigquery.SchemaField("sub_category", "STRING"),
-            bigquery.SchemaField("gmv", "FLOAT"),
-            bigquery.SchemaField("profit", "FLOAT"),
-            bigquery.SchemaField("quantity", "INTEGER"),
-            bigquery.SchemaField("cost", "FLOAT"),
-            bigquery.SchemaField("total_gmv", "FLOAT"),
-            bigquery.SchemaField("total_cost", "FLOAT"),
-            bigquery.SchemaField("total_profit", "FLOAT"),
-            bigquery.SchemaField("lon", "FLOAT"),
-            bigquery.SchemaField("lat", "FLOAT"),
-        ]
-
-        # --- 3. Load Data into BigQuery ---
+        bigquery_client = registry.bigquery_client()
         dataset_ref = bigquery_client.dataset(config["gcp"]["bq_dataset"])
         table_ref = dataset_ref.table(config["gcp"]["bq_table"])
-        job_config = bigquery.LoadJobConfig(
-            schema=schema,
-            write_disposition="WRITE_TRUNCATE",
-            create_disposition="CREATE_IF_NEEDED",
-            source_format=bigquery.SourceFormat.CSV,
-            skip_leading_rows=1,
-            autodetect=False,
-        )
-
-        job = bigquery_client.load_table_from_dataframe(
-            data, table_ref, job_config=job_config
-        )
-        job.result()
-
-        if job.errors:
-            logger.error(f"BigQuery load job errors: {job.errors}")
-            raise Exception(f"BigQuery load job failed: {job.errors}")
+        table_id = f"{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}"
+        staging_ref = dataset_ref.table(f"{config['gcp']['bq_table']}_staging")
+        staging_id = f"{table_id}_staging"
+        layout = table_layout(config)
+        mode = prepare_table_layout(bigquery_client, table_id, layout, mode)
 
-        logger.info(
-            f"Data loaded to BigQuery: {config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}"
-        )
+        # Initialize the index outside the loop for efficiency, the aiplatform SDK is slow to import
+        from google.cloud import aiplatform
+        my_index = aiplatform.MatchingEngineIndex(config["gcp"]["index_name"])
+        total_rows = 0
+        loaded_rows = 0
+        data = None
+        seen_identities = {}
+        hashes = []
+        build_local_index = config.get("retrieval", {}).get("backend", "local") == "local"
+        # Vectors for the local index are spilled to disk per batch, not kept for the whole ingest
+        staging = IndexStaging(staging_path(config)) if build_local_index else None
+        # Without an index to update, an incremental ingest has to embed the unchanged rows too
+        rebuild_local_index = build_local_index and mode == "incremental" and not index_path(config).exists()
+        if rebuild_local_index:
+            logger.info(f"No local vector index at {index_path(config)}, rebuilding it from every row")
+        builder = profile_builder(config)
 
-        # --- 4. Create Embeddings and Update Vector Search Index ---
-        embeddings_data = []
-        batch_size = 100
+        # Left over from an interrupted run it may have another layout than the load job needs
+        bigquery_client.delete_table(staging_id, not_found_ok=True)
 
-        # Initialize the index outside the loop for efficiency
-        my_index = aiplatform.MatchingEngineIndex(config["gcp"]["index_name"])
+        with open_source(config) as source:
+            for chunk in iter_chunks(source, chunk_rows):
+                chunk = incremental.assign_row_ids(chunk, seen_identities)
+                chunk_hashes = incremental.content_hashes(chunk)
+                hashes.append(chunk_hashes)
+                total_rows += len(chunk)
+                # Every source row, also the unchanged ones an incremental load skips
+                builder.update(chunk)
 
-        for idx, row in tqdm(data.iterrows(), total=len(data), desc="Creating embeddings"):
-            text = (
-                f"Category: {row['category']}, Sub-Category: {row['sub_category']}, "
-                f"Order ID: {row['order_id']}, Customer: {row['customer_name']}"
-            )
-            embeddings_data.append(text)
-
-            if len(embeddings_data) >= batch_size:
-                embeddings = create_embeddings(embeddings_data, config["embeddings"]["model_name"])
-                ids = [str(i) for i in range(idx - len(embeddings_data) + 1, idx + 1)]
-                to_upsert = [
-                    gca_index.IndexDatapoint(
-                        datapoint_id=id,
-                        feature_vector=embedding
+                # --- 1. Load Data into BigQuery ---
+                if mode == "incremental":
+                    # New and changed rows are collected in a staging table and merged at the end
+                    changed = incremental.changed_rows(chunk, chunk_hashes, manifest)
+                    if rebuild_local_index:
+                        # Only staged for the local index, Vector Search already has these rows
+                        upsert_embeddings(None, chunk[~chunk["row_id"].isin(changed["row_id"])], config, staging)
+                    chunk = changed
+                    if chunk.empty:
+                        continue
+                    load_chunk(bigquery_client, staging_ref, chunk, "WRITE_TRUNCATE" if loaded_rows == 0 else "WRITE_APPEND")
+                elif mode == "streaming":
+                    # Chunks go to a staging table that replaces the live one after the last chunk,
+                    # so questions never see a partially loaded table and a failed load leaves it intact
+                    load_chunk(
+                        bigquery_client, staging_ref, chunk, "WRITE_TRUNCATE" if loaded_rows == 0 else "WRITE_APPEND", layout
                     )
-                    for id, embedding in zip(ids, embeddings)
-                ]
-                my_index.upsert_datapoints(to_upsert)
-                embeddings_data = []
-
-        # Process any remaining data
-        if embeddings_data:
-            embeddings = create_embeddings(embeddings_data, config["embeddings"]["model_name"])
-            ids = [str(i) for i in range(len(data) - len(embeddings_data), len(data))]
-            to_upsert = [
-                gca_index.IndexDatapoint(
-                    datapoint_id=id,
-                    feature_vector=embedding
+                else:
+                    load_chunk(bigquery_client, table_ref, chunk, "WRITE_TRUNCATE", layout)
+                loaded_rows += len(chunk)
+                logger.info(
+                    f"Loaded {len(chunk)} rows ({loaded_rows} total) to BigQuery: "
+                    f"{table_id if mode == 'batch' else staging_id}"
                 )
-                for id, embedding in zip(ids, embeddings)
-            ]
-            my_index.upsert_datapoints(to_upsert)
+
+                # --- 2. Create Embeddings and Update Vector Search Index ---
+                upsert_embeddings(my_index, chunk, config, staging)
+                if mode == "batch":
+                    data = chunk
+
+        # --- 3. Apply the delta and drop deleted rows ---
+        current_ids = pd.Index(pd.concat(hashes).index) if hashes else pd.Index([])
+        deleted_ids = manifest.index.difference(current_ids).tolist() if manifest is not None else []
+        if mode == "incremental":
+            if loaded_rows:
+                incremental.merge_staging(bigquery_client, table_id, staging_id, [name for name, _ in SCHEMA])
+                bigquery_client.delete_table(staging_id, not_found_ok=True)
+            if deleted_ids:
+                incremental.delete_rows(bigquery_client, table_id, deleted_ids)
+        elif mode == "streaming" and loaded_rows:
+            swap_table(bigquery_client, staging_id, table_id)
+        if deleted_ids:
+            my_index.remove_datapoints(datapoint_ids=deleted_ids)
+            logger.info(f"Removed {len(deleted_ids)} deleted rows from the Vector Search index")
+        if build_local_index:
+            save_vector_index(config, staging, deleted_ids, mode)
+            staging.remove()
+        incremental.save_manifest(manifest_path, hashes)
+        # Read by preprocess_data instead of fetching the schema for every question
+        write_profile(config, builder, hashes)
+        logger.info(f"{total_rows} source rows, {loaded_rows} loaded, {len(deleted_ids)} deleted ({mode} mode)")
+
+        # The table was modified, cached schema and query results are stale
+        if loaded_rows or deleted_ids:
+            registry.invalidate_table_schema()
+            result_cache = get_result_cache(config)
+            if result_cache:
+                result_cache.invalidate()
+            # --- 4. Rebuild the pre-aggregated rollups ---
+            if config.get("rollups", {}).get("enabled", False):
+                build_rollups(config, registry.query_backend())
 
         logger.info("Embeddings created and Vector Search index updated.")
-        return data
+        return data if mode == "batch" else loaded_rows
 
     except Exception as e:
         logger.error(f"Error in data ingestion: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    configure_logging()
+    ingest_data()
@@ -0,0 +1,214 @@
+import datetime
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from src.askdata import logger
+from src.askdata.components.query_backend import PROJECT_ROOT
+from src.askdata.components.question_cache import hash_parts
+from src.askdata.components.registry import get_registry
+from src.askdata.components.result_limits import CHARS_PER_TOKEN, estimate_tokens
+
+# Per-unit measures have a total_<measure> counterpart equal to measure * quantity
+QUANTITY_COLUMN = "quantity"
+TOTAL_PREFIX = "total_"
+
+
+class _ColumnProfile:
+    """Running statistics of one column, updated chunk by chunk."""
+
+    def __init__(self, name: str, column_type: str, max_tracked: int):
+        self.name = name
+        self.type = column_type
+        self.max_tracked = max_tracked
+        self.nulls = 0
+        self.minimum = None
+        self.maximum = None
+        # Value counts until the column turns out to have more than max_tracked distinct values
+        self.counts: Optional[Dict[str, int]] = {}
+
+    def update(self, values: pd.Series) -> None:
+        self.nulls += int(values.isna().sum())
+        values = values.dropna()
+        if values.empty:
+            return
+        if self.type in ("INTEGER", "FLOAT", "DATE"):
+            low, high = values.min(), values.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+        if self.counts is not None:
+            for value, count in values.astype(str).value_counts().items():
+                self.counts[value] = self.counts.get(value, 0) + int(count)
+            if len(self.counts) > self.max_tracked:
+                self.counts = None
+
+    def build(self, max_values: int) -> dict:
+        column = {"name": self.name, "type": self.type, "nulls": self.nulls}
+        column["distinct"] = len(self.counts) if self.counts is not None else None
+        if self.minimum is not None:
+            column["min"], column["max"] = _json_value(self.minimum), _json_value(self.maximum)
+        if self.counts is not None and len(self.counts) <= max_values and self.type == "STRING":
+            # Most frequent first, so a truncated list in the prompt keeps the common values
+            column["values"] = [v for v, _ in sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))]
+        return column
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return value.isoformat()[:10]
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    return float(value)
+
+
+def _column_type(values: pd.Series) -> str:
+    if pd.api.types.is_integer_dtype(values):
+        return "INTEGER"
+    if pd.api.types.is_numeric_dtype(values):
+        return "FLOAT"
+    if pd.api.types.is_datetime64_any_dtype(values) or (
+        len(values.dropna()) and isinstance(values.dropna().iloc[0], datetime.date)
+    ):
+        return "DATE"
+    return "STRING"
+
+
+class ProfileBuilder:
+    """
+    Builds the data profile incrementally, one ingest chunk at a time.
+
+    Tracks per column the type, null count, min / max of numbers and dates and the value
+    counts of columns with at most `max_tracked` distinct values, plus which total_<x>
+    columns equal x * quantity on every row. Memory is bounded by `max_tracked` values per
+    column, whatever the table size.
+    """
+
+    def __init__(self, column_types: Optional[Dict[str, str]] = None, max_tracked: int = 1000):
+        self.column_types = column_types or {}
+        self.max_tracked = max_tracked
+        self.row_count = 0
+        self.columns: Dict[str, _ColumnProfile] = {}
+        self._derived: Dict[str, bool] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.row_count += len(chunk)
+        for name in chunk.columns:
+            if name not in self.columns:
+                column_type = self.column_types.get(name) or _column_type(chunk[name])
+                self.columns[name] = _ColumnProfile(name, column_type, self.max_tracked)
+            self.columns[name].update(chunk[name])
+        if QUANTITY_COLUMN not in chunk.columns:
+            return
+        for name in chunk.columns:
+            base = name[len(TOTAL_PREFIX):]
+            if not name.startswith(TOTAL_PREFIX) or base not in chunk.columns or not self._derived.get(name, True):
+                continue
+            rows = chunk[[name, base, QUANTITY_COLUMN]].dropna().astype(float)
+            self._derived[name] = bool(np.allclose(rows[name], rows[base] * rows[QUANTITY_COLUMN]))
+
+    def build(self, table: str, version: str, max_values: int = 30) -> dict:
+        columns = []
+        for name, column in self.columns.items():
+            profile = column.build(max_values)
+            if self._derived.get(name):
+                profile["derived"] = f"{name[len(TOTAL_PREFIX):]} * {QUANTITY_COLUMN}"
+            columns.append(profile)
+        return {
+            "table": table,
+            "version": version,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "row_count": self.row_count,
+            "columns": columns,
+        }
+
+
+def profile_version(hashes: List[pd.Series]) -> str:
+    """Changes whenever any row of the table does: a hash over the per-row content hashes of the ingest."""
+    content = pd.concat(hashes) if hashes else pd.Series(dtype=str)
+    return hash_parts(len(content), int(pd.util.hash_pandas_object(content, index=True).sum()))
+
+
+def profile_path(config: dict) -> Path:
+    return PROJECT_ROOT / config.get("profile", {}).get("path", "data/data_profile.json")
+
+
+def save_profile(path: Path, profile: dict) -> None:
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(profile, indent=1))
+    os.replace(tmp_path, path)
+    logger.info(f"Data profile {profile['version']} saved to {path} ({profile['row_count']} rows)")
+
+
+def load_profile(path: Path) -> Optional[dict]:
+    """The profile written by the last ingest, re-read only when the file changes. None if there is none."""
+    if not path.exists():
+        return None
+    return get_registry().get_versioned(f"profile:{path}", path.stat().st_mtime_ns, lambda: json.loads(path.read_text()))
+
+
+def _format_number(value) -> str:
+    return f"{int(value):,}" if float(value).is_integer() else f"{value:,.2f}"
+
+
+def _column_line(column: dict, with_range: bool) -> str:
+    line = f"- {column['name']} ({column['type']})"
+    if column.get("derived"):
+        line += f" = {column['derived']}"
+    if with_range and "min" in column:
+        if column["type"] == "DATE":
+            line += f", {column['min']} to {column['max']}"
+        else:
+            line += f", {_format_number(column['min'])} to {_format_number(column['max'])}"
+    elif with_range and column.get("distinct") and not column.get("values"):
+        line += f", {column['distinct']:,} distinct values"
+    return line
+
+
+def profile_prompt(profile: dict, token_budget: int = 600) -> str:
+    """
+    Prompt text describing the table from its profile, within `token_budget` tokens.
+
+    The column list with types always goes in. Derived columns and numeric / date ranges
+    come next, then the values of low-cardinality columns, fewest distinct first, each
+    list added only while the text still fits.
+    """
+    header = f"Dataset table: {profile['table']}, {profile['row_count']:,} rows. Columns:"
+    columns = profile["columns"]
+    lines = [_column_line(c, with_range=True) for c in columns]
+    if estimate_tokens("\n".join([header] + lines)) > token_budget:
+        lines = [_column_line(c, with_range=False) for c in columns]
+    text = "\n".join([header] + lines)
+
+    with_values = sorted((i for i, c in enumerate(columns) if c.get("values")), key=lambda i: len(columns[i]["values"]))
+    for i in with_values:
+        candidate_lines = list(lines)
+        candidate_lines[i] = f"{lines[i]}, values: {', '.join(columns[i]['values'])}"
+        candidate = "\n".join([header] + candidate_lines)
+        if estimate_tokens(candidate) <= token_budget:
+            lines, text = candidate_lines, candidate
+    if estimate_tokens(text) > token_budget:
+        # Even the bare column list can exceed a tiny budget, keep the whole lines that fit
+        text = text[: token_budget * CHARS_PER_TOKEN].rsplit("\n", 1)[0]
+    return text
+
+
+if __name__ == "__main__":
+    # python -m src.askdata.components.data_profile build | show
+    import argparse
+    from src.askdata import configure_logging
+    from src.askdata.components.registry import get_registry
+
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Build the data profile from the source CSV, or show its prompt text.")
+    parser.add_argument("command", choices=["build", "show"])
+    args = parser.parse_args()
+    config = get_registry().config()
+    profile_config = config.get("profile", {})
+    if args.command == "build":
+        from src.askdata.components.data_ingestion import build_profile
+        build_profile(config)
+    profile = load_profile(profile_path(config))
+    print(profile_prompt(profile, profile_config.get("prompt_token_budget", 600)) if profile else "No profile built yet.")
@@ -1,14 +1,28 @@
-from vertexai.language_models import TextEmbeddingModel
 from typing import List
 from src.askdata import logger  # Import your logger
-import vertexai
+from src.askdata.components.registry import get_registry
+from src.askdata.components.embedding_store import get_embedding_store
 
 def create_embeddings(texts: List[str], model_name: str) -> List[List[float]]:
-    """Creates embeddings using a Vertex AI TextEmbeddingModel."""
+    """
+    Creates embeddings using a Vertex AI TextEmbeddingModel.
+
+    Texts already in the local embedding store (`embeddings.store`) are served from it,
+    only the misses are sent to Vertex AI and then added to the store.
+    """
     try:
-        model = TextEmbeddingModel.from_pretrained(model_name)
-        embeddings = model.get_embeddings(texts)
-        return [embedding.values for embedding in embeddings]
+        store = get_embedding_store(get_registry().config(), model_name)
+        cached = store.get_many(texts) if store else [None] * len(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        results = [None if vector is None else vector.tolist() for vector in cached]
+        if missing:
+            model = get_registry().embedding_model(model_name)
+            embeddings = model.get_embeddings([texts[i] for i in missing])
+            for i, embedding in zip(missing, embeddings):
+                results[i] = embedding.values
+            if store:
+                store.put_many([texts[i] for i in missing], [results[i] for i in missing])
+        return results
     except Exception as e:
         logger.error(f"Error creating embeddings: {e}")
-        raise
\ No newline at end of file
+        raise
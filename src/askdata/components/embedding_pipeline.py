@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Sequence
+import numpy as np
+import pandas as pd
+from src.askdata import configure_logging, logger
+
+# Error class names / messages Vertex AI uses when a quota or rate limit is hit
+RATE_LIMIT_ERRORS = ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable")
+RATE_LIMIT_MARKERS = ("429", "quota", "rate limit")
+
+
+def build_texts(data: pd.DataFrame) -> pd.Series:
+    """Builds the text embedded for each row, vectorized over the whole DataFrame."""
+    return (
+        "Category: " + data["category"].astype(str)
+        + ", Sub-Category: " + data["sub_category"].astype(str)
+        + ", Order ID: " + data["order_id"].astype(str)
+        + ", Customer: " + data["customer_name"].astype(str)
+        + ", City: " + data["city"].astype(str)
+        + ", Country: " + data["country"].astype(str)
+    )
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if type(error).__name__ in RATE_LIMIT_ERRORS:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+class _FakeEmbedding:
+    def __init__(self, values: List[float]):
+        self.values = values
+
+
+class FakeEmbeddingModel:
+    """
+    Deterministic stand-in for TextEmbeddingModel, for offline runs and benchmarks.
+
+    Vectors are derived from a hash of the text; `latency` seconds are slept per call
+    to simulate the Vertex AI round trip. Install it with
+    `get_registry().register("embedding_model:<model_name>", FakeEmbeddingModel())`.
+    """
+
+    def __init__(self, dimension: int = 768, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def get_embeddings(self, texts: List[str]) -> List[_FakeEmbedding]:
+        if self.latency:
+            time.sleep(self.latency)
+        embeddings = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            embeddings.append(_FakeEmbedding((vector / np.linalg.norm(vector)).tolist()))
+        return embeddings
+
+
+@dataclass
+class PipelineMetrics:
+    rows: int = 0
+    batches: int = 0
+    retries: int = 0
+    max_in_flight: int = 0
+    embed_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class EmbeddingPipeline:
+    """
+    Embeds texts with a pool of concurrent workers and overlaps the upserts with embedding.
+
+    Batches are embedded by `workers` threads (at most `workers + queue_size` batches in
+    flight). Rate-limit errors are retried with exponential backoff and jitter. Finished
+    batches go through a bounded queue to a single upserter thread, so the index upsert of
+    one batch runs while the next batches are being embedded.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        upsert_fn: Callable[[List[str], List[List[float]]], None],
+        batch_size: int = 100,
+        workers: int = 4,
+        queue_size: int = 8,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+    ):
+        self.embed_fn = embed_fn
+        self.upsert_fn = upsert_fn
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.metrics = PipelineMetrics()
+        self._metrics_lock = threading.Lock()
+        self._in_flight = 0
+
+    def _embed_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embed_fn(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Embedding rate limited, retrying in {delay:.1f}s: {e}")
+                with self._metrics_lock:
+                    self.metrics.retries += 1
+                time.sleep(delay)
+
+    def _embed_batch(self, ids: List[str], texts: List[str], results: queue.Queue, slots: threading.Semaphore):
+        try:
+            started = time.perf_counter()
+            embeddings = self._embed_with_backoff(texts)
+            with self._metrics_lock:
+                self.metrics.embed_seconds += time.perf_counter() - started
+            results.put((ids, embeddings))
+        except Exception as e:
+            results.put(e)
+        finally:
+            with self._metrics_lock:
+                self._in_flight -= 1
+            slots.release()
+
+    def _upsert_loop(self, results: queue.Queue, errors: list):
+        while True:
+            item = results.get()
+            if item is None:
+                return
+            if errors:
+                # Drain the queue after a failure so producers never block
+                continue
+            if isinstance(item, Exception):
+                errors.append(item)
+                continue
+            ids, embeddings = item
+            try:
+                started = time.perf_counter()
+                self.upsert_fn(ids, embeddings)
+                with self._metrics_lock:
+                    self.metrics.upsert_seconds += time.perf_counter() - started
+                    self.metrics.rows += len(ids)
+                    self.metrics.batches += 1
+            except Exception as e:
+                errors.append(e)
+
+    def run(self, ids: Sequence[str], texts: Sequence[str]) -> PipelineMetrics:
+        """Embeds and upserts all texts, returning throughput metrics. Raises the first failure."""
+        started = time.perf_counter()
+        results = queue.Queue(maxsize=self.queue_size)
+        slots = threading.Semaphore(self.workers + self.queue_size)
+        errors = []
+        upserter = threading.Thread(target=self._upsert_loop, args=(results, errors), daemon=True)
+        upserter.start()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, len(texts), self.batch_size):
+                if errors:
+                    break
+                slots.acquire()
+                with self._metrics_lock:
+                    self._in_flight += 1
+                    self.metrics.max_in_flight = max(self.metrics.max_in_flight, self._in_flight)
+                executor.submit(
+                    self._embed_batch,
+                    list(ids[start:start + self.batch_size]),
+                    list(texts[start:start + self.batch_size]),
+                    results,
+                    slots,
+                )
+        results.put(None)
+        upserter.join()
+
+        self.metrics.elapsed_seconds = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        logger.info(
+            f"Embedded {self.metrics.rows} rows in {self.metrics.batches} batches: "
+            f"{self.metrics.rows_per_second:.1f} rows/s, max {self.metrics.max_in_flight} batches in flight, "
+            f"{self.metrics.retries} retries"
+        )
+        return self.metrics
+
+
+def pipeline_from_config(config: dict, embed_fn: Callable, upsert_fn: Callable) -> EmbeddingPipeline:
+    embeddings_config = config.get("embeddings", {})
+    return EmbeddingPipeline(
+        embed_fn,
+        upsert_fn,
+        batch_size=embeddings_config.get("batch_size", 100),
+        workers=embeddings_config.get("workers", 4),
+        queue_size=embeddings_config.get("queue_size", 8),
+        max_retries=embeddings_config.get("max_retries", 5),
+        backoff_seconds=embeddings_config.get("backoff_seconds", 1.0),
+    )
+
+
+if __name__ == "__main__":
+    # Offline throughput benchmark with the fake model, e.g.
+    # python -m src.askdata.components.embedding_pipeline --workers 8 --latency 0.2
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Benchmark the embedding pipeline with a fake model.")
+    parser.add_argument("--csv", default="superstore_data.csv")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated seconds per embedding call")
+    parser.add_argument("--upsert-latency", type=float, default=0.05, help="Simulated seconds per upsert")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv)
+    model = FakeEmbeddingModel(latency=args.latency)
+    pipeline = EmbeddingPipeline(
+        lambda texts: [e.values for e in model.get_embeddings(texts)],
+        lambda ids, embeddings: time.sleep(args.upsert_latency),
+        batch_size=args.batch_size,
+        workers=args.workers,
+    )
+    metrics = pipeline.run([str(i) for i in data.index], build_texts(data).tolist())
+    print(metrics, f"rows/s={metrics.rows_per_second:.1f}")
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+import numpy as np
+from src.askdata import logger
+from src.askdata.components.registry import get_registry
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingStore:
+    """
+    Append-only local store of embeddings for one model, keyed by text hash.
+
+    Vectors live in a float32 matrix file read through `np.memmap`; alongside it
+    `keys.bin` holds a 16-byte text hash and `checksums.bin` a CRC32 per row. Rows are
+    only ever appended, later rows win for duplicate keys, and `compact` rewrites the
+    files without superseded or unwanted rows. Meant for a single writer process
+    (ingestion) and any number of readers.
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        self.vectors_path = self.store_dir / "vectors.f32"
+        self.keys_path = self.store_dir / "keys.bin"
+        self.checksums_path = self.store_dir / "checksums.bin"
+        self.meta_path = self.store_dir / "meta.json"
+        self._lock = threading.RLock()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        self.dimension = None
+        self._index = {}
+        self._matrix = None
+        self._checksums = None
+        self._count = 0
+        if self.meta_path.exists():
+            self.dimension = json.loads(self.meta_path.read_text())["dimension"]
+        if self.dimension is None:
+            return
+        files = ((self.vectors_path, self.dimension * 4), (self.keys_path, KEY_BYTES), (self.checksums_path, 4))
+        count = min(os.path.getsize(path) // row_bytes if path.exists() else 0 for path, row_bytes in files)
+        # A crash between the three appends leaves the files at different lengths. Cut them
+        # back to the rows all three have, so the next append lands on row `count` everywhere.
+        for path, row_bytes in files:
+            if not path.exists() or os.path.getsize(path) != count * row_bytes:
+                logger.warning(f"Embedding store {self.store_dir}: truncating {path.name} to {count} rows")
+                with open(path, "ab") as f:
+                    f.truncate(count * row_bytes)
+        if count:
+            keys = np.fromfile(self.keys_path, dtype=np.uint8, count=count * KEY_BYTES).reshape(count, KEY_BYTES)
+            self._index = {key.tobytes(): row for row, key in enumerate(keys)}
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimension))
+            self._checksums = np.memmap(self.checksums_path, dtype=np.uint32, mode="r", shape=(count,))
+        self._count = count
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Returns the stored vector for each text, None where the text is not stored or its row is corrupt."""
+        with self._lock:
+            rows = [self._index.get(text_key(text)) for text in texts]
+            return [None if row is None else self._read(row) for row in rows]
+
+    def _read(self, row: int) -> Optional[np.ndarray]:
+        vector = np.array(self._matrix[row])
+        if zlib.crc32(vector.tobytes()) != self._checksums[row]:
+            logger.warning(f"Embedding store {self.store_dir}: checksum mismatch on row {row}, treated as a miss")
+            return None
+        return vector
+
+    def put_many(self, texts: Sequence[str], vectors: Iterable[Sequence[float]]) -> None:
+        matrix = np.asarray(list(vectors), dtype=np.float32)
+        if not len(texts):
+            return
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = matrix.shape[1]
+                self.meta_path.write_text(json.dumps({"dimension": self.dimension}))
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store ({self.dimension})")
+            keys = np.frombuffer(b"".join(text_key(text) for text in texts), dtype=np.uint8)
+            checksums = np.array([zlib.crc32(row.tobytes()) for row in matrix], dtype=np.uint32)
+            for path, array in ((self.vectors_path, matrix), (self.checksums_path, checksums), (self.keys_path, keys)):
+                with open(path, "ab") as f:
+                    array.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+            for offset, text in enumerate(texts):
+                self._index[text_key(text)] = self._count + offset
+            self._count += len(texts)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dimension))
+            self._checksums = np.memmap(self.checksums_path, dtype=np.uint32, mode="r", shape=(self._count,))
+
+    def verify(self) -> List[int]:
+        """Recomputes every row checksum and forgets corrupt rows, returning their positions."""
+        with self._lock:
+            if self._matrix is None:
+                return []
+            corrupt = [
+                row for row in range(self._count)
+                if zlib.crc32(np.ascontiguousarray(self._matrix[row]).tobytes()) != self._checksums[row]
+            ]
+            if corrupt:
+                bad = set(corrupt)
+                self._index = {key: row for key, row in self._index.items() if row not in bad}
+                logger.warning(f"Embedding store {self.store_dir}: {len(corrupt)} corrupt rows dropped from the index")
+            return corrupt
+
+    def compact(self, keep_texts: Optional[Iterable[str]] = None) -> int:
+        """
+        Rewrites the store with one row per live key, optionally keeping only `keep_texts`.
+
+        Returns:
+            int: Number of rows removed.
+        """
+        with self._lock:
+            if self._matrix is None:
+                return 0
+            self.verify()
+            keep = None if keep_texts is None else {text_key(text) for text in keep_texts}
+            live = sorted(
+                (row, key) for key, row in self._index.items() if keep is None or key in keep
+            )
+            rows = np.array([row for row, _ in live], dtype=np.int64)
+            matrix = np.asarray(self._matrix[rows]) if len(rows) else np.empty((0, self.dimension), np.float32)
+            keys = np.frombuffer(b"".join(key for _, key in live), dtype=np.uint8)
+            checksums = np.fromfile(self.checksums_path, dtype=np.uint32, count=self._count)[rows]
+            removed = self._count - len(rows)
+            self._matrix = None
+            self._checksums = None
+            for path, array in ((self.vectors_path, matrix), (self.checksums_path, checksums), (self.keys_path, keys)):
+                tmp_path = path.with_suffix(path.suffix + ".tmp")
+                array.tofile(tmp_path)
+                os.replace(tmp_path, path)
+            self._load()
+            logger.info(f"Embedding store {self.store_dir} compacted: {removed} rows removed, {len(rows)} kept")
+            return removed
+
+
+def get_embedding_store(config: dict, model_name: str) -> Optional[EmbeddingStore]:
+    """Returns the store for `model_name` under `embeddings.store.dir`, or None if disabled."""
+    store_config = config.get("embeddings", {}).get("store", {})
+    if not store_config.get("enabled", False):
+        return None
+    store_dir = Path(store_config.get("dir", "data/embeddings"))
+    store_dir = store_dir if store_dir.is_absolute() else PROJECT_ROOT / store_dir
+    store_dir = store_dir / re.sub(r"[^\w.@-]", "_", model_name)
+    return get_registry().get_or_create(f"embedding_store:{store_dir}", lambda: EmbeddingStore(store_dir))
@@ -0,0 +1,196 @@
+import datetime
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+import pandas as pd
+from src.askdata.components.embedding_pipeline import FakeEmbeddingModel
+from src.askdata.components.query_backend import DuckDBBackend
+from src.askdata.components.question_cache import normalize_question
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Deterministic stand-in for GenerativeModel, for offline runs and benchmarks.
+
+    SQL prompts are answered from `answers` ({question: SQL}, matched after
+    normalization) and fall back to `default_sql`. Refine prompts get back a sentence
+    built from the SQL result in the prompt. `latency` seconds are slept per call, and
+    `stream=True` yields the text word by word like the real streaming API.
+    """
+
+    def __init__(self, answers: Optional[Dict[str, str]] = None, default_sql: str = "", latency: float = 0.0):
+        self.answers = {normalize_question(q): sql for q, sql in (answers or {}).items()}
+        self.default_sql = default_sql
+        self.latency = latency
+        self.calls = 0
+
+    def _text(self, prompt: str) -> str:
+        question = re.search(r"User question: (.*)", prompt)
+        question = question.group(1).strip() if question else ""
+        if "Generate a valid SQL query" in prompt:
+            return self.answers.get(normalize_question(question), self.default_sql)
+        result = re.search(r"SQL result: (.*?)\nUser question:", prompt, flags=re.DOTALL)
+        return f"Based on the data: {result.group(1).strip() if result else 'no result'}"
+
+    def generate_content(self, prompt: str, generation_config=None, stream: bool = False):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._text(prompt)
+        if stream:
+            return (FakeResponse(chunk) for chunk in re.findall(r"\S+\s*", text))
+        return FakeResponse(text)
+
+
+class _FakeField:
+    def __init__(self, name: str, field_type: str):
+        self.name = name
+        self.field_type = field_type
+
+
+class _FakeTable:
+    def __init__(self, schema, num_rows: int, modified: datetime.datetime):
+        self.schema = schema
+        self.num_rows = num_rows
+        self.modified = modified
+
+
+class FakeRowIterator:
+    def __init__(self, result_df: pd.DataFrame, max_results: Optional[int] = None):
+        self._df = result_df
+        self.total_rows = len(result_df)
+        self.max_results = max_results
+
+    def to_dataframe(self, *args, **kwargs) -> pd.DataFrame:
+        return self._df if self.max_results is None else self._df.head(self.max_results)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.to_dataframe().itertuples(index=False))
+
+
+class FakeQueryJob:
+    def __init__(self, client: "FakeBigQueryClient", sql: str):
+        self._client = client
+        self.sql = sql
+        self.job_id = f"fake_{client.queries}"
+        # Job statistics BigQuery reports, unknown for the local engine
+        self.total_bytes_processed = None
+        self.total_bytes_billed = None
+        self.cache_hit = False
+        self._df = None
+
+    def result(self, max_results: Optional[int] = None, **kwargs) -> FakeRowIterator:
+        if self._df is None:
+            if self._client.latency:
+                time.sleep(self._client.latency)
+            self._df = self._client.run(self.sql)
+        return FakeRowIterator(self._df, max_results)
+
+    def to_dataframe(self, *args, **kwargs) -> pd.DataFrame:
+        return self.result().to_dataframe()
+
+
+class FakeBigQueryClient:
+    """
+    Stand-in for bigquery.Client that answers queries with DuckDB over the local CSV.
+
+    Covers what the app uses: `query(sql)` jobs with `result()` / `to_dataframe()` and
+    `get_table()` for the schema and last-modified time. `latency` seconds are slept per
+    query to simulate the warehouse round trip.
+    """
+
+    def __init__(self, backend: DuckDBBackend, latency: float = 0.0):
+        self.backend = backend
+        self.latency = latency
+        self.queries = 0
+        self._modified = datetime.datetime.now(datetime.timezone.utc)
+
+    def query(self, sql: str, job_config=None) -> FakeQueryJob:
+        self.queries += 1
+        job = FakeQueryJob(self, sql)
+        if job_config is not None and getattr(job_config, "dry_run", False):
+            # Like BigQuery, a dry run fails on invalid SQL and reports a scan size: the whole snapshot
+            cursor = self._cursor()
+            try:
+                cursor.execute(f"EXPLAIN {self.backend.translate(sql)}")
+            finally:
+                cursor.close()
+            job.total_bytes_processed = self.backend.parquet_path.stat().st_size
+        return job
+
+    def _cursor(self):
+        with self.backend._lock:
+            return self.backend.conn.cursor()
+
+    def run(self, sql: str) -> pd.DataFrame:
+        # Straight to DuckDB rather than backend.execute, whose spans would nest in the caller's
+        cursor = self._cursor()
+        try:
+            return cursor.execute(self.backend.translate(sql)).df()
+        finally:
+            cursor.close()
+
+    def get_table(self, table_ref: str) -> _FakeTable:
+        table_name = str(table_ref).split(".")[-1]
+        cursor = self._cursor()
+        try:
+            columns = cursor.execute(f"DESCRIBE \"{table_name}\"").fetchall()
+            num_rows = cursor.execute(f"SELECT COUNT(*) FROM \"{table_name}\"").fetchone()[0]
+        finally:
+            cursor.close()
+        schema = [_FakeField(name, str(column_type)) for name, column_type, *_ in columns]
+        return _FakeTable(schema, num_rows, self._modified)
+
+
+def load_answers(path: str) -> Dict[str, str]:
+    """{question: SQL} from an audit questions JSONL file (see audit.load_questions)."""
+    answers = {}
+    for line in Path(path).read_text().splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if record.get("sql"):
+                answers[record["question"]] = record["sql"]
+    return answers
+
+
+def install_fakes(
+    registry,
+    answers: Optional[Dict[str, str]] = None,
+    llm_latency: float = 0.0,
+    warehouse_latency: float = 0.0,
+    embedding_latency: float = 0.0,
+) -> FakeBigQueryClient:
+    """
+    Replaces the Vertex AI models and the BigQuery client in the registry with the fakes,
+    so the whole pipeline runs offline against the local CSV. Returns the fake client.
+    """
+    config = registry.config()
+    local = config.get("query_backend", {}).get("local", {})
+    backend = DuckDBBackend(
+        config["gcp"]["bq_dataset"],
+        config["gcp"]["bq_table"],
+        local.get("csv_path", "superstore_data.csv"),
+        local.get("parquet_path", "data/superstore_data.parquet"),
+        local.get("table_dir", "data/tables"),
+    )
+    client = FakeBigQueryClient(backend, latency=warehouse_latency)
+    default_sql = f"SELECT COUNT(*) FROM `{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}`"
+    registry.register("vertexai", True)
+    # The fake model ignores it, a plain dict keeps the Vertex AI SDK out of offline runs
+    registry.register("generation_config", dict(config["llm"]["generation_config"]))
+    registry.register("bigquery_client", client)
+    registry.register(
+        f"generative_model:{config['llm']['model_name']}",
+        FakeGenerativeModel(answers, default_sql=default_sql, latency=llm_latency),
+    )
+    registry.register(
+        f"embedding_model:{config['embeddings']['model_name']}", FakeEmbeddingModel(latency=embedding_latency)
+    )
+    return client
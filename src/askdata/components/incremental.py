@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+import pandas as pd
+from src.askdata import logger
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+# Columns that identify an order line; everything else may change between exports
+IDENTITY_COLUMNS = ["order_id", "category", "sub_category"]
+
+
+def _hex_hash(values: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(values, index=False).map("{:016x}".format)
+
+
+def assign_row_ids(chunk: pd.DataFrame, seen: dict) -> pd.DataFrame:
+    """
+    Adds a stable `row_id` column: the order ID plus a hash of the line identity.
+
+    Identical identity tuples (the same sub-category twice in one order) are told apart
+    by their occurrence number, counted across chunks in `seen`.
+    """
+    identity = chunk[IDENTITY_COLUMNS].astype(str).agg("|".join, axis=1)
+    offset = identity.map(seen).fillna(0).astype(int)
+    occurrence = identity.groupby(identity).cumcount() + offset
+    for key, count in identity.value_counts().items():
+        seen[key] = seen.get(key, 0) + count
+    line_hash = _hex_hash((identity + "#" + occurrence.astype(str)).to_frame())
+    chunk = chunk.copy()
+    chunk.insert(0, "row_id", chunk["order_id"].astype(str) + "-" + line_hash.str[:12])
+    return chunk
+
+
+def content_hashes(chunk: pd.DataFrame) -> pd.Series:
+    """Hash of every column value of each row, indexed by row_id."""
+    columns = [c for c in chunk.columns if c != "row_id"]
+    hashes = _hex_hash(chunk[columns].astype(str))
+    hashes.index = chunk["row_id"].values
+    return hashes
+
+
+def load_manifest(path: Path) -> Optional[pd.Series]:
+    """Returns the content hash per row_id recorded by the last ingest, or None on first run."""
+    if not path.exists():
+        return None
+    manifest = pd.read_parquet(path)
+    return pd.Series(manifest["content_hash"].values, index=manifest["row_id"].values)
+
+
+def save_manifest(path: Path, hashes: List[pd.Series]) -> None:
+    manifest = pd.concat(hashes) if hashes else pd.Series(dtype=str)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    pd.DataFrame({"row_id": manifest.index, "content_hash": manifest.values}).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    logger.info(f"Ingest manifest saved to {path} ({len(manifest)} rows)")
+
+
+def changed_rows(chunk: pd.DataFrame, hashes: pd.Series, manifest: pd.Series) -> pd.DataFrame:
+    """Rows of the chunk that are new or whose content differs from the manifest."""
+    previous = manifest.reindex(hashes.index)
+    return chunk[(previous.values != hashes.values)]
+
+
+def merge_staging(bigquery_client: "bigquery.Client", table_id: str, staging_id: str, columns: List[str]) -> None:
+    """Upserts the staging table into the main table on row_id."""
+    updates = ", ".join(f"{c} = S.{c}" for c in columns if c != "row_id")
+    merge_sql = (
+        f"MERGE `{table_id}` T USING `{staging_id}` S ON T.row_id = S.row_id "
+        f"WHEN MATCHED THEN UPDATE SET {updates} "
+        f"WHEN NOT MATCHED THEN INSERT ROW"
+    )
+    bigquery_client.query(merge_sql).result()
+    logger.info(f"Merged {staging_id} into {table_id}")
+
+
+def delete_rows(bigquery_client: "bigquery.Client", table_id: str, row_ids: List[str]) -> None:
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("row_ids", "STRING", row_ids)]
+    )
+    bigquery_client.query(
+        f"DELETE FROM `{table_id}` WHERE row_id IN UNNEST(@row_ids)", job_config=job_config
+    ).result()
+    logger.info(f"Deleted {len(row_ids)} rows from {table_id}")
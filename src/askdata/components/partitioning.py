@@ -0,0 +1,195 @@
+import datetime
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import sqlglot
+from sqlglot import exp
+from src.askdata import logger
+
+# Used when `table_layout` is not configured
+DEFAULT_PARTITION_FIELD = "order_date"
+DEFAULT_PARTITION_TYPE = "MONTH"
+DEFAULT_CLUSTERING_FIELDS = ["country", "category", "region"]
+
+
+@dataclass
+class TableLayout:
+    partition_field: Optional[str] = DEFAULT_PARTITION_FIELD
+    partition_type: str = DEFAULT_PARTITION_TYPE  # DAY | MONTH | YEAR
+    clustering_fields: List[str] = field(default_factory=lambda: list(DEFAULT_CLUSTERING_FIELDS))
+
+
+def table_layout(config: dict) -> TableLayout:
+    layout_config = config.get("table_layout", {})
+    return TableLayout(
+        partition_field=layout_config.get("partition_field", DEFAULT_PARTITION_FIELD),
+        partition_type=layout_config.get("partition_type", DEFAULT_PARTITION_TYPE),
+        clustering_fields=list(layout_config.get("clustering_fields", DEFAULT_CLUSTERING_FIELDS) or []),
+    )
+
+
+def layout_matches(table, layout: TableLayout) -> bool:
+    """Whether an existing bigquery.Table already has the configured partitioning and clustering."""
+    partitioning = table.time_partitioning
+    if layout.partition_field:
+        if partitioning is None or partitioning.field != layout.partition_field \
+                or partitioning.type_ != layout.partition_type:
+            return False
+    elif partitioning is not None:
+        return False
+    return list(table.clustering_fields or []) == layout.clustering_fields
+
+
+def _year_range(year: int) -> Tuple[datetime.date, datetime.date]:
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+
+def _month_range(year: int, month: int) -> Tuple[datetime.date, datetime.date]:
+    end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return datetime.date(year, month, 1), end
+
+
+def _date(value: datetime.date) -> exp.Expression:
+    return exp.cast(exp.Literal.string(value.isoformat()), "DATE")
+
+
+def _range(column: exp.Column, start: datetime.date, end: datetime.date) -> exp.Expression:
+    """column >= start AND column < end, parenthesized so it can replace any predicate."""
+    return exp.Paren(this=exp.and_(
+        exp.GTE(this=column.copy(), expression=_date(start)),
+        exp.LT(this=column.copy(), expression=_date(end)),
+    ))
+
+
+def _date_part(node: exp.Expression, column: str) -> Optional[Tuple[str, exp.Column]]:
+    """('year' | 'month' | 'year_month', column) if `node` derives that part from the date column."""
+    if isinstance(node, exp.Extract) and isinstance(node.expression, exp.Column) and node.expression.name == column:
+        unit = node.this.name.lower()
+        if unit in ("year", "month"):
+            return unit, node.expression
+    # FORMAT_DATE('%Y', col) / FORMAT_DATE('%Y-%m', col)
+    if isinstance(node, exp.TimeToStr):
+        inner = node.this.this if isinstance(node.this, exp.TsOrDsToDate) else node.this
+        fmt = node.args.get("format")
+        if isinstance(inner, exp.Column) and inner.name == column and isinstance(fmt, exp.Literal):
+            if fmt.this == "%Y":
+                return "year", inner
+            if fmt.this == "%Y-%m":
+                return "year_month", inner
+    return None
+
+
+def _literal_year_month(part: str, literal: exp.Expression) -> Optional[Tuple[int, int]]:
+    if not isinstance(literal, exp.Literal):
+        return None
+    try:
+        if part == "year":
+            return int(literal.this), 0
+        if part == "year_month":
+            year, month = literal.this.split("-")
+            return int(year), int(month)
+    except ValueError:
+        return None
+    return None
+
+
+def _rewrite_predicate(node: exp.Expression, column: str) -> Optional[exp.Expression]:
+    """Date-range equivalent of a year / year-month predicate on the column, None if not one."""
+    if isinstance(node, (exp.EQ, exp.GT, exp.GTE, exp.LT, exp.LTE)):
+        found, right, op = _date_part(node.this, column), node.expression, type(node)
+        if found is None:
+            # 2014 = EXTRACT(YEAR FROM order_date)
+            found, right = _date_part(node.expression, column), node.this
+            op = {exp.GT: exp.LT, exp.GTE: exp.LTE, exp.LT: exp.GT, exp.LTE: exp.GTE}.get(op, op)
+        if found is None or found[0] == "month":
+            return None
+        part, date_column = found
+        value = _literal_year_month(part, right)
+        if value is None:
+            return None
+        start, end = _year_range(value[0]) if part == "year" else _month_range(*value)
+        if op is exp.EQ:
+            return _range(date_column, start, end)
+        if part != "year":
+            return None
+        # Year comparisons become a half-open bound on the date
+        if op is exp.GT:
+            return exp.GTE(this=date_column.copy(), expression=_date(end))
+        if op is exp.GTE:
+            return exp.GTE(this=date_column.copy(), expression=_date(start))
+        if op is exp.LT:
+            return exp.LT(this=date_column.copy(), expression=_date(start))
+        return exp.LT(this=date_column.copy(), expression=_date(end))
+    if isinstance(node, exp.Between):
+        found = _date_part(node.this, column)
+        if found is None or found[0] != "year":
+            return None
+        low = _literal_year_month("year", node.args.get("low"))
+        high = _literal_year_month("year", node.args.get("high"))
+        if low is None or high is None:
+            return None
+        return _range(found[1], _year_range(low[0])[0], _year_range(high[0])[1])
+    if isinstance(node, exp.In) and not node.args.get("query"):
+        found = _date_part(node.this, column)
+        if found is None or found[0] == "month":
+            return None
+        values = [_literal_year_month(found[0], e) for e in node.expressions]
+        if not values or any(v is None for v in values):
+            return None
+        ranges = [_year_range(y) if found[0] == "year" else _month_range(y, m) for y, m in values]
+        return exp.Paren(this=exp.or_(*[_range(found[1], start, end) for start, end in ranges]))
+    return None
+
+
+def _merge_year_month(where: exp.Where, column: str) -> None:
+    """EXTRACT(YEAR ..) = y AND EXTRACT(MONTH ..) = m among the top-level conjuncts -> one month range."""
+    conjuncts = list(where.this.flatten()) if isinstance(where.this, exp.And) else [where.this]
+    parts = {"year": [], "month": []}
+    for node in conjuncts:
+        if not isinstance(node, exp.EQ) or not isinstance(node.expression, exp.Literal) or node.expression.is_string:
+            continue
+        found = _date_part(node.this, column)
+        if found and found[0] in parts:
+            parts[found[0]].append((node, found[1]))
+    if len(parts["year"]) != 1 or len(parts["month"]) != 1:
+        return
+    (year_node, date_column), (month_node, _) = parts["year"][0], parts["month"][0]
+    try:
+        start, end = _month_range(int(year_node.expression.this), int(month_node.expression.this))
+    except ValueError:
+        return
+    merged = [
+        _range(date_column, start, end) if node is year_node else node
+        for node in conjuncts
+        if node is not month_node
+    ]
+    where.set("this", exp.and_(*merged, copy=False))
+
+
+def prune_date_filters(sql: str, column: str = DEFAULT_PARTITION_FIELD) -> str:
+    """
+    Rewrites year / month filters on the partition column into date ranges BigQuery can prune on.
+
+    EXTRACT(YEAR FROM order_date) = 2014 becomes order_date >= '2014-01-01' AND order_date <
+    '2015-01-01'; year comparisons, BETWEEN and IN lists, FORMAT_DATE('%Y' | '%Y-%m', ..)
+    equalities and a top-level year AND month pair are handled the same way. Only WHERE
+    clauses are touched, SELECT and GROUP BY keep their EXTRACTs. Unparseable SQL is
+    returned unchanged.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return sql
+    changed = False
+    for where in list(tree.find_all(exp.Where)):
+        before = where.sql(dialect="bigquery")
+        _merge_year_month(where, column)
+        for node in list(where.find_all(exp.EQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between, exp.In)):
+            rewritten = _rewrite_predicate(node, column)
+            if rewritten is not None:
+                node.replace(rewritten)
+        changed = changed or where.sql(dialect="bigquery") != before
+    if not changed:
+        return sql
+    pruned = tree.sql(dialect="bigquery")
+    logger.info(f"Partition-prunable SQL: {pruned}")
+    return pruned
@@ -0,0 +1,188 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+import sqlglot
+from sqlglot import exp
+from src.askdata import logger
+from src.askdata.components.partitioning import prune_date_filters
+
+# Dialects tried, in order, when the SQL does not parse as BigQuery
+FALLBACK_DIALECTS = ("postgres", "sqlite")
+
+# Postgres TO_CHAR patterns -> BigQuery FORMAT_DATE patterns
+TO_CHAR_FORMATS = {"YYYY": "%Y", "YYYY-MM": "%Y-%m", "MM": "%m", "YYYY-MM-DD": "%Y-%m-%d", "Mon": "%b", "Month": "%B"}
+
+# Root nodes of a read-only query
+READ_ONLY_ROOTS = (exp.Select, exp.Union, exp.Intersect, exp.Except)
+WRITE_STATEMENTS = (exp.DML, exp.Drop, exp.Create, exp.Alter, exp.Command)
+
+# sqlglot underlines the offending token with terminal escape codes, the model should not see them
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class PreflightError(Exception):
+    """Generated SQL that must not be executed. The message is fed back to the model for repair."""
+
+
+@dataclass
+class PreflightResult:
+    sql: str
+    fixes: List[str] = field(default_factory=list)
+    estimated_bytes: Optional[int] = None
+
+
+def _parse(sql: str) -> Tuple[exp.Expression, Optional[str]]:
+    """Parses as BigQuery, falling back to Postgres / SQLite. Returns the tree and the dialect used if not BigQuery."""
+    try:
+        statements = sqlglot.parse(sql, read="bigquery")
+        dialect = None
+    except sqlglot.errors.SqlglotError as error:
+        # SqlglotError also covers tokenizer errors, e.g. an unterminated string
+        for dialect in FALLBACK_DIALECTS:
+            try:
+                statements = sqlglot.parse(sql, read=dialect)
+                break
+            except sqlglot.errors.SqlglotError:
+                continue
+        else:
+            raise PreflightError(f"The SQL does not parse: {ANSI_ESCAPE.sub('', str(error))}")
+    statements = [s for s in statements if s is not None]
+    if len(statements) != 1:
+        raise PreflightError(f"Expected exactly one SQL statement, got {len(statements)}.")
+    return statements[0], dialect
+
+
+def _check_read_only(tree: exp.Expression) -> None:
+    if not isinstance(tree, READ_ONLY_ROOTS):
+        statement = tree.key.upper() if isinstance(tree, WRITE_STATEMENTS) else "no query"
+        raise PreflightError(f"Only SELECT queries are allowed, got {statement}.")
+    for node in tree.walk():
+        if isinstance(node, WRITE_STATEMENTS):
+            raise PreflightError(f"Only SELECT queries are allowed, found {node.key.upper()}.")
+
+
+def _fix_dialect(tree: exp.Expression, columns: Sequence[str], fixes: List[str]) -> exp.Expression:
+    """Rewrites SQLite / Postgres functions BigQuery lacks, and double-quoted column names."""
+    column_names = {c.lower() for c in columns}
+
+    def transform(node):
+        if isinstance(node, exp.Anonymous):
+            name = node.name.upper()
+            args = node.expressions
+            # STRFTIME('%Y', order_date) -> FORMAT_DATE('%Y', order_date)
+            if name == "STRFTIME" and len(args) == 2:
+                fixes.append("STRFTIME -> FORMAT_DATE")
+                return exp.TimeToStr(this=exp.TsOrDsToDate(this=args[1]), format=args[0])
+            # DATE_PART('year', order_date) -> EXTRACT(YEAR FROM order_date)
+            if name == "DATE_PART" and len(args) == 2 and isinstance(args[0], exp.Literal):
+                fixes.append("DATE_PART -> EXTRACT")
+                return exp.Extract(this=exp.var(args[0].this.upper()), expression=args[1])
+        if isinstance(node, exp.ToChar) and isinstance(node.args.get("format"), exp.Literal):
+            fmt = TO_CHAR_FORMATS.get(node.args["format"].this)
+            if fmt:
+                fixes.append("TO_CHAR -> FORMAT_DATE")
+                return exp.TimeToStr(this=exp.TsOrDsToDate(this=node.this), format=exp.Literal.string(fmt))
+        # "country" is a string in BigQuery, as a selected / grouped / ordered item it was meant as the column
+        if isinstance(node, exp.Literal) and node.is_string and node.this.lower() in column_names:
+            parent = node.parent
+            if isinstance(parent, (exp.Select, exp.Group, exp.Ordered)) or (
+                isinstance(parent, exp.Alias) and isinstance(parent.parent, exp.Select)
+            ):
+                fixes.append(f'"{node.this}" -> column')
+                return exp.column(node.this)
+        return node
+
+    return tree.transform(transform)
+
+
+def _check_columns(tree: exp.Expression, columns: Sequence[str], bq_table: str) -> None:
+    """Every table must be the Superstore table or a CTE, every column one of its columns or an alias."""
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    unknown_tables = sorted({
+        t.name for t in tree.find_all(exp.Table)
+        if t.name.lower() != bq_table.lower() and t.name.lower() not in ctes
+    })
+    if unknown_tables:
+        raise PreflightError(f"Unknown table(s) {', '.join(unknown_tables)}. Only `{bq_table}` exists.")
+
+    known = {c.lower() for c in columns}
+    # Aliases of every SELECT list (outer, CTE and subquery outputs) can be referenced too
+    known |= {e.alias.lower() for select in tree.find_all(exp.Select) for e in select.expressions if e.alias}
+    known |= {t.alias.lower() for t in tree.find_all(exp.Subquery, exp.Table) if t.alias}
+    unknown = sorted({c.name for c in tree.find_all(exp.Column) if c.name and c.name.lower() not in known})
+    if unknown:
+        raise PreflightError(
+            f"Unknown column(s) {', '.join(unknown)}. Available columns: {', '.join(columns)}."
+        )
+
+
+def normalize_dialect(sql: str, columns: Sequence[str]) -> str:
+    """
+    Transpiles SQLite / Postgres syntax and functions BigQuery lacks to BigQuery, without any
+    of the preflight checks. SQL that does not parse is returned unchanged.
+    """
+    try:
+        tree, dialect = _parse(sql)
+    except PreflightError:
+        return sql
+    fixes = [f"transpiled from {dialect}"] if dialect else []
+    normalized = _fix_dialect(tree, columns, fixes).sql(dialect="bigquery")
+    if fixes:
+        logger.info(f"Dialect fixed SQL ({', '.join(dict.fromkeys(fixes))}): {normalized}")
+    return normalized
+
+
+def preflight(
+    sql: str,
+    columns: Sequence[str],
+    bq_table: str,
+    backend=None,
+    max_bytes: Optional[int] = None,
+    prune_column: Optional[str] = None,
+) -> PreflightResult:
+    """
+    Checks generated SQL before it reaches the warehouse and normalizes it to BigQuery.
+
+    Parses the SQL (SQLite / Postgres syntax is accepted and transpiled), rewrites functions
+    BigQuery lacks, rejects anything but a single read-only query and checks tables and
+    columns against the schema. With a `backend`, the query is also dry-run and rejected
+    when its estimated scan exceeds `max_bytes`; with a `prune_column` the dry run sees the
+    partition-pruned SQL that run_sql will execute.
+
+    Raises:
+        PreflightError: With a message meant to be shown to the model for a repair attempt.
+    """
+    tree, dialect = _parse(sql)
+    fixes = [f"transpiled from {dialect}"] if dialect else []
+    _check_read_only(tree)
+    tree = _fix_dialect(tree, columns, fixes)
+    fixes = list(dict.fromkeys(fixes))
+    _check_columns(tree, columns, bq_table)
+    # Always the regenerated BigQuery SQL: syntax BigQuery lacks but sqlglot reads as BigQuery
+    # (e.g. Postgres x::INT casts) is only translated by generating it again
+    result = PreflightResult(tree.sql(dialect="bigquery"), fixes)
+    if fixes:
+        logger.info(f"Preflight fixed SQL ({', '.join(fixes)}): {result.sql}")
+
+    if backend is not None:
+        try:
+            dry_run_sql = prune_date_filters(result.sql, prune_column) if prune_column else result.sql
+            result.estimated_bytes = backend.dry_run(dry_run_sql)
+        except Exception as e:
+            raise PreflightError(f"The query was rejected by the warehouse: {e}")
+        if max_bytes and result.estimated_bytes is not None and result.estimated_bytes > max_bytes:
+            raise PreflightError(
+                f"The query would scan {result.estimated_bytes:,} bytes, more than the {max_bytes:,} byte limit. "
+                f"Filter or aggregate more narrowly."
+            )
+    return result
+
+
+def repair_prompt(prompt: str, sql: str, error: PreflightError) -> str:
+    """The original prompt plus the rejected SQL and why, asking for a corrected query."""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous answer was:\n{sql}\n"
+        f"It was rejected: {error}\n"
+        f"Return a corrected SQL query only, following the same instructions."
+    )
@@ -1,100 +1,225 @@
-from google.cloud import bigquery
-from vertexai.preview.generative_models import GenerativeModel, GenerationConfig
-import vertexai
-import yaml
-from pathlib import Path
-from src.askdata import logger
+from src.askdata import configure_logging, logger
+from src.askdata.components.registry import get_registry, read_config
+from src.askdata.components.question_cache import get_question_cache, hash_parts
+from src.askdata.components.result_cache import get_result_cache, execute_cached
+from src.askdata.components.vector_index import retrieve_values
+from src.askdata.components.rollup import route_query
+from src.askdata.components.answer import fast_answer
+from src.askdata.components.result_limits import cap_rows, limit_sql, summarize_result
+from src.askdata.components.partitioning import prune_date_filters, table_layout
+from src.askdata.components.data_profile import load_profile, profile_path, profile_prompt
+from src.askdata.components.preflight import PreflightError, normalize_dialect, preflight, repair_prompt
+from src.askdata.components.tracing import span
+from typing import Iterator, Optional, Tuple
+import pandas as pd
 import re
-import streamlit as st
-import json
-from google.oauth2 import service_account
 
 def load_config(config_path: str = "config/config.yaml") -> dict:
     try:
-        if "gcp" in st.secrets:
-            config = {}
-            for section in st.secrets:
-                config[section] = dict(st.secrets[section])
-            if "service_account_key" in config.get("gcp", {}):
-                credentials = service_account.Credentials.from_service_account_info(
-                    json.loads(config["gcp"]["service_account_key"])
-                )
-                config["gcp"]["credentials"] = credentials
-            return config
-        config_file = Path(__file__).resolve().parents[3] / config_path
-        with open(config_file, "r") as f:
-            return yaml.safe_load(f)
+        if config_path != "config/config.yaml":
+            return read_config(config_path)
+        return get_registry().config()
     except Exception as e:
         logger.error(f"Error loading config: {str(e)}")
         raise
 
 def get_table_schema() -> list:
-    config = load_config()
-    credentials = config["gcp"].get("credentials")
-    bq_client = bigquery.Client(credentials=credentials) if credentials else bigquery.Client()
-    table_ref = f"{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}"
-    table = bq_client.get_table(table_ref)
-    return [field.name for field in table.schema]
+    return get_registry().table_schema()
 
 def preprocess_data() -> dict:
+    """
+    Table description for the prompts. Read from the data profile written by ingest_data
+    when there is one, so no warehouse call is needed; the live schema otherwise.
+    """
     config = load_config()
     try:
-        columns = get_table_schema()
+        profile = load_profile(profile_path(config))
+        with span("schema_fetch", source="profile" if profile else "warehouse"):
+            if profile:
+                columns = [column["name"] for column in profile["columns"]]
+                budget = config.get("profile", {}).get("prompt_token_budget", 600)
+                profile_text = profile_prompt(profile, budget)
+            else:
+                columns = get_table_schema()
+                profile_text = ""
         data_summary = (
             f"Dataset table: {config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}. "
             f"Columns: {', '.join(columns)}."
         )
         logger.info(f"Data summary: {data_summary}")
-        return {"summary": data_summary}
+        return {
+            "summary": data_summary,
+            "schema_hash": hash_parts(columns),
+            "columns": columns,
+            # Used for SQL generation only, the refine prompt keeps the short summary
+            "profile": profile_text,
+            "profile_version": profile["version"] if profile else None,
+        }
     except Exception as e:
         logger.error(f"Error in preprocessing: {str(e)}")
         raise
 
-def integrate_llm(data_info: dict, query: str, return_df: bool = False) -> tuple:
+def sql_cache_scope(config: dict, data_info: dict) -> str:
+    """
+    What cached SQL for a question depends on: the schema, the model and its settings and
+    the data profile in the prompt, whose literal values change with each ingest.
+    """
+    return hash_parts(
+        data_info.get("schema_hash", data_info["summary"]),
+        config["llm"]["model_name"],
+        config["llm"]["generation_config"],
+        data_info.get("profile_version"),
+    )
+
+def generate_sql(data_info: dict, query: str) -> Tuple[str, bool]:
+    """Returns SQL answering the question and whether it came from the question cache."""
     config = load_config()
-    credentials = config["gcp"].get("credentials")
-    vertexai.init(project=config["gcp"]["project_id"], location=config["gcp"]["location"], credentials=credentials)
-    try:
-        model = GenerativeModel(config["llm"]["model_name"])
-        generation_config = GenerationConfig(**config["llm"]["generation_config"])
+    question_cache = get_question_cache(config)
+    cached_sql = question_cache.get(query, sql_cache_scope(config, data_info)) if question_cache else None
+    if cached_sql:
+        logger.info(f"Cached SQL: {cached_sql}")
+        return cached_sql, True
 
+    model = get_registry().generative_model(config["llm"]["model_name"])
+    generation_config = get_registry().generation_config()
+    with span("prompt_build") as attributes:
+        # Literal values (countries, cities, customers, ...) of the rows closest to the question
+        values = retrieve_values(config, query)
+        values_hint = "".join(
+            f"Known {column} values related to the question: {', '.join(column_values)}.\n"
+            for column, column_values in values.items()
+        )
         prompt = (
-            f"{data_info['summary']}\n"
+            f"{data_info.get('profile') or data_info['summary']}\n"
+            f"{values_hint}"
             f"User question: {query}\n"
             f"Generate a valid SQL query to answer the question using BigQuery table "
             f"`{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}`. "
             f"Use 'total_profit' for profit-related queries unless specified otherwise. "
+            f"Spell literal values exactly as in the known values above when they apply. "
             f"For date operations, use BigQuery functions like EXTRACT (e.g., EXTRACT(YEAR FROM order_date)), "
             f"FORMAT_DATE, or DATE_TRUNC instead of STRFTIME, which BigQuery does not support. "
+            f"Filter years and months as EXTRACT(YEAR FROM order_date) = 2014 / EXTRACT(MONTH FROM order_date) = 3 "
+            f"or as order_date ranges, never by casting order_date to a string, so the table's order_date "
+            f"partitions can be pruned. "
             f"Return only the SQL query as plain text, no markdown (e.g., no ```sql or ```), "
             f"no explanations, and no extra formatting."
         )
-        response = model.generate_content(prompt, generation_config=generation_config)
-        sql_query_raw = response.text.strip()
-        sql_query = re.sub(r'```sql|```', '', sql_query_raw).strip()
-        sql_query = re.sub(r"STRFTIME\('%Y', (\w+)\)", r"EXTRACT(YEAR FROM \1)", sql_query, flags=re.IGNORECASE)
-        sql_query = re.sub(r"STRFTIME\('%Y-%m', (\w+)\)", r"FORMAT_DATE('%Y-%m', \1)", sql_query, flags=re.IGNORECASE)
+        attributes["prompt_chars"] = len(prompt)
+    preflight_config = config.get("preflight", {})
+    max_repairs = preflight_config.get("max_repairs", 2) if preflight_config.get("enabled", True) else 0
+    attempt_prompt = prompt
+    for attempt in range(max_repairs + 1):
+        with span("llm_generate", attempt=attempt):
+            response = model.generate_content(attempt_prompt, generation_config=generation_config)
+        sql_query = re.sub(r'```sql|```', '', response.text.strip()).strip()
         logger.info(f"Generated SQL: {sql_query}")
+        if not preflight_config.get("enabled", True):
+            # No checks, but BigQuery still cannot run STRFTIME and the like
+            return normalize_dialect(sql_query, data_info.get("columns") or get_table_schema()), False
+        try:
+            return check_sql(config, sql_query, data_info.get("columns") or get_table_schema()), False
+        except PreflightError as e:
+            logger.warning(f"Preflight rejected SQL (attempt {attempt + 1} of {max_repairs + 1}): {e}")
+            if attempt == max_repairs:
+                raise
+            attempt_prompt = repair_prompt(prompt, sql_query, e)
+
+def check_sql(config: dict, sql_query: str, columns: list) -> str:
+    """Preflight of generated SQL (see `preflight` in config), returns it normalized to BigQuery."""
+    preflight_config = config.get("preflight", {})
+    backend = get_registry().query_backend() if preflight_config.get("dry_run", False) else None
+    with span("preflight", dry_run=backend is not None) as attributes:
+        result = preflight(
+            sql_query,
+            columns,
+            config["gcp"]["bq_table"],
+            backend=backend,
+            max_bytes=preflight_config.get("max_bytes"),
+            prune_column=table_layout(config).partition_field,
+        )
+        attributes["fixes"] = len(result.fixes)
+        attributes["estimated_bytes"] = result.estimated_bytes
+    return result.sql
 
-        bq_client = bigquery.Client(credentials=credentials) if credentials else bigquery.Client()
-        result_df = bq_client.query(sql_query).to_dataframe()
+def run_sql(data_info: dict, query: str, sql_query: str, from_cache: bool = False) -> pd.DataFrame:
+    """
+    Executes the SQL (routed to a rollup when possible) and caches newly generated SQL once it succeeds.
 
-        if not result_df.empty:
-            if len(result_df.columns) == 1 and len(result_df) == 1:
-                answer = f"The answer is {result_df.iloc[0, 0]}."
-            else:
-                answer = result_df.to_string(index=False)
+    At most `data_limit` rows are kept, `attrs["truncated"]` on the result tells whether
+    the query returned more.
+    """
+    config = load_config()
+    backend = get_registry().query_backend()
+    executed_sql = sql_query
+    if config.get("rollups", {}).get("enabled", False):
+        decision = route_query(sql_query, config, backend.name)
+        logger.info(f"Rollup routing: {decision.rollup or 'base table'} ({decision.reason})")
+        executed_sql = decision.sql
+    partition_field = table_layout(config).partition_field
+    if executed_sql == sql_query and partition_field:
+        # Not routed to a rollup: year/month filters become order_date ranges so partitions are pruned
+        executed_sql = prune_date_filters(executed_sql, partition_field)
+    max_rows = config.get("data_limit")
+    # One row over the limit tells a result that fits apart from one that was cut
+    fetch_rows = max_rows + 1 if max_rows else None
+    if fetch_rows:
+        executed_sql = limit_sql(executed_sql, fetch_rows)
+    result_df = execute_cached(backend, executed_sql, get_result_cache(config), fetch_rows)
+    if max_rows:
+        result_df = cap_rows(result_df, max_rows)
+
+    # Only SQL that executed successfully is worth reusing
+    question_cache = get_question_cache(config)
+    if question_cache and not from_cache:
+        question_cache.put(query, sql_cache_scope(config, data_info), sql_query)
+    return result_df
+
+def quick_answer(result_df: pd.DataFrame) -> Optional[str]:
+    """Template answer if the fast path applies (see `answer` in config), else None."""
+    answer_config = load_config().get("answer", {})
+    if not answer_config.get("fast_path", False):
+        return None
+    return fast_answer(result_df, answer_config.get("fast_path_max_rows", 10))
+
+def build_refine_prompt(data_info: dict, query: str, result_df: pd.DataFrame) -> Tuple[str, str]:
+    """Returns the refine prompt and the plain-text fallback answer."""
+    if not result_df.empty:
+        if len(result_df.columns) == 1 and len(result_df) == 1:
+            answer = f"The answer is {result_df.iloc[0, 0]}."
         else:
-            answer = "No data found for this query."
+            token_budget = load_config().get("answer", {}).get("refine_token_budget", 1500)
+            answer = summarize_result(result_df, token_budget)
+    else:
+        answer = "No data found for this query."
 
-        refine_prompt = (
-            f"Dataset: {data_info['summary']}\n"
-            f"SQL result: {answer}\n"
-            f"User question: {query}\n"
-            f"Provide a concise, natural language answer based on the SQL result."
-        )
-        refined_response = model.generate_content(refine_prompt, generation_config=generation_config)
+    refine_prompt = (
+        f"Dataset: {data_info['summary']}\n"
+        f"SQL result: {answer}\n"
+        f"User question: {query}\n"
+        f"Provide a concise, natural language answer based on the SQL result."
+    )
+    return refine_prompt, answer
+
+def answer_result(data_info: dict, query: str, result_df: pd.DataFrame) -> str:
+    """Natural-language answer for the result: the fast-path template or the refine LLM call."""
+    llm_response = quick_answer(result_df)
+    if llm_response is None:
+        config = load_config()
+        model = get_registry().generative_model(config["llm"]["model_name"])
+        generation_config = get_registry().generation_config()
+        refine_prompt, answer = build_refine_prompt(data_info, query, result_df)
+        with span("refine"):
+            refined_response = model.generate_content(refine_prompt, generation_config=generation_config)
         llm_response = refined_response.text.strip() if refined_response.text else answer
+    return llm_response
+
+def integrate_llm(data_info: dict, query: str, return_df: bool = False) -> tuple:
+    try:
+        sql_query, from_cache = generate_sql(data_info, query)
+        result_df = run_sql(data_info, query, sql_query, from_cache)
+
+        llm_response = answer_result(data_info, query, result_df)
         logger.info(f"LLM response: {llm_response}")
 
         if return_df:
@@ -104,9 +229,63 @@ def integrate_llm(data_info: dict, query: str, return_df: bool = False) -> tuple
         logger.error(f"Error in LLM integration: {str(e)}")
         raise
 
+def stream_answer(data_info: dict, query: str, result_df: pd.DataFrame) -> Iterator[Tuple[str, object]]:
+    """
+    Answer for a query result, streamed as it is generated.
+
+    Yields:
+        Tuple[str, object]: ("answer_chunk", str) pieces of the answer (a single chunk on
+        the fast path, token chunks from the refine call otherwise) and finally
+        ("answer", str) with the complete answer.
+    """
+    llm_response = quick_answer(result_df)
+    if llm_response is not None:
+        yield "answer_chunk", llm_response
+    else:
+        model = get_registry().generative_model(load_config()["llm"]["model_name"])
+        generation_config = get_registry().generation_config()
+        refine_prompt, answer = build_refine_prompt(data_info, query, result_df)
+        chunks = []
+        # The span includes the time the caller spends rendering the chunks it is handed
+        with span("refine", stream=True):
+            for response in model.generate_content(refine_prompt, generation_config=generation_config, stream=True):
+                try:
+                    text = response.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final safety/usage chunk)
+                    text = ""
+                if text:
+                    chunks.append(text)
+                    yield "answer_chunk", text
+        llm_response = "".join(chunks).strip()
+        if not llm_response:
+            llm_response = answer
+            yield "answer_chunk", answer
+    logger.info(f"LLM response: {llm_response}")
+    yield "answer", llm_response
+
+def integrate_llm_stream(data_info: dict, query: str) -> Iterator[Tuple[str, object]]:
+    """
+    Streaming variant of integrate_llm that yields each piece as soon as it exists.
+
+    Yields:
+        Tuple[str, object]: ("sql", str) once the SQL is known, ("result", pd.DataFrame)
+        once it has run, then the events of stream_answer.
+    """
+    try:
+        sql_query, from_cache = generate_sql(data_info, query)
+        yield "sql", sql_query
+        result_df = run_sql(data_info, query, sql_query, from_cache)
+        yield "result", result_df
+        yield from stream_answer(data_info, query, result_df)
+    except Exception as e:
+        logger.error(f"Error in LLM integration: {str(e)}")
+        raise
+
 if __name__ == "__main__":
+    configure_logging()
     config = load_config()
     query = "What is the total profit for all orders in Spain?"
     data_info = preprocess_data()
     response = integrate_llm(data_info, query)
-    print("LLM Answer:\n", response)
\ No newline at end of file
+    print("LLM Answer:\n", response)
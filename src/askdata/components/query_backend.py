@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+from src.askdata import logger
+from src.askdata.components.tracing import span
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+# Dates in the Superstore export are written as e.g. 4/21/2011
+CSV_DATE_FORMAT = "%m/%d/%Y"
+DATE_COLUMNS = ["order_date", "ship_date"]
+
+
+class QueryBackend:
+    """Executes BigQuery-dialect SQL generated by the LLM and returns a DataFrame."""
+
+    name = "base"
+
+    def execute(self, sql: str, max_rows: Optional[int] = None) -> pd.DataFrame:
+        """Runs `sql`, fetching at most `max_rows` rows when given."""
+        raise NotImplementedError
+
+    def dry_run(self, sql: str) -> Optional[int]:
+        """Validates `sql` without running it, returning the bytes it would scan if the engine knows."""
+        return None
+
+    def table_version(self) -> str:
+        """Marker that changes whenever the underlying table is modified."""
+        raise NotImplementedError
+
+    def columns(self) -> List[str]:
+        """Column names of the Superstore table."""
+        raise NotImplementedError
+
+    def materialize(self, table_name: str, sql: str) -> int:
+        """Stores the result of `sql` as table `table_name` in the dataset, returning its row count."""
+        raise NotImplementedError
+
+
+class BigQueryBackend(QueryBackend):
+    """Runs queries as BigQuery jobs."""
+
+    name = "bigquery"
+
+    def __init__(
+        self, bq_dataset: str, bq_table: str, credentials=None, version_ttl_seconds: float = 60, client=None
+    ):
+        if client is None:
+            from google.cloud import bigquery
+            client = bigquery.Client(credentials=credentials) if credentials else bigquery.Client()
+        self.client = client
+        self.bq_dataset = bq_dataset
+        self.table_ref = f"{bq_dataset}.{bq_table}"
+        self.version_ttl_seconds = version_ttl_seconds
+        self._version = None
+        self._version_checked = 0.0
+
+    def execute(self, sql: str, max_rows: Optional[int] = None) -> pd.DataFrame:
+        with span("sql_execute", engine=self.name) as attributes:
+            job = self.client.query(sql)
+            # Pages are only downloaded up to max_results, the rest of the result stays in BigQuery
+            rows = job.result(max_results=max_rows) if max_rows else job.result()
+            attributes["bytes_processed"] = job.total_bytes_processed
+            attributes["bytes_billed"] = job.total_bytes_billed
+            attributes["cache_hit"] = job.cache_hit
+        logger.info(
+            f"BigQuery job {job.job_id}: {_format_bytes(job.total_bytes_processed)} processed, "
+            f"{_format_bytes(job.total_bytes_billed)} billed{' (cached)' if job.cache_hit else ''}"
+        )
+        with span("result_download", engine=self.name) as attributes:
+            result_df = rows.to_dataframe()
+            attributes["rows"] = len(result_df)
+        return result_df
+
+    def dry_run(self, sql: str) -> Optional[int]:
+        from google.cloud import bigquery
+        # Free: BigQuery plans the query and reports its scan size without running it
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        with span("dry_run", engine=self.name) as attributes:
+            job = self.client.query(sql, job_config=job_config)
+            attributes["bytes_processed"] = job.total_bytes_processed
+        logger.info(f"Dry run: {_format_bytes(job.total_bytes_processed)} would be processed")
+        return job.total_bytes_processed
+
+    def table_version(self) -> str:
+        # get_table is a metadata call, re-check at most every version_ttl_seconds
+        if self._version is None or time.time() - self._version_checked > self.version_ttl_seconds:
+            self._version = self.client.get_table(self.table_ref).modified.isoformat()
+            self._version_checked = time.time()
+        return self._version
+
+    def columns(self) -> List[str]:
+        return [field.name for field in self.client.get_table(self.table_ref).schema]
+
+    def materialize(self, table_name: str, sql: str) -> int:
+        table_id = f"{self.bq_dataset}.{table_name}"
+        self.client.query(f"CREATE OR REPLACE TABLE `{table_id}` AS {sql}").result()
+        return self.client.get_table(table_id).num_rows
+
+
+class DuckDBBackend(QueryBackend):
+    """
+    Runs queries in-process with DuckDB over a Parquet snapshot of the Superstore CSV.
+
+    The snapshot is (re)built from the CSV whenever it is missing or older than the CSV,
+    and queries are translated from the BigQuery dialect before execution. Materialized
+    tables (rollups) are kept as Parquet files in `table_dir` and exposed as views.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, bq_dataset: str, bq_table: str, csv_path: str, parquet_path: str, table_dir: str = "data/tables"):
+        self.bq_dataset = bq_dataset
+        self.bq_table = bq_table
+        self.csv_path = _resolve_path(csv_path)
+        self.parquet_path = _resolve_path(parquet_path)
+        self.table_dir = _resolve_path(table_dir)
+        self._lock = threading.Lock()
+        import duckdb  # only the local engine needs it
+        build_parquet_snapshot(self.csv_path, self.parquet_path)
+        self.conn = duckdb.connect(database=":memory:")
+        self._create_view(bq_table, self.parquet_path)
+        if self.table_dir.exists():
+            for table_path in self.table_dir.glob("*.parquet"):
+                self._create_view(table_path.stem, table_path)
+
+    def _create_view(self, name: str, path: Path) -> None:
+        with self._lock:
+            self.conn.execute(f"CREATE OR REPLACE VIEW \"{name}\" AS SELECT * FROM read_parquet('{path.as_posix()}')")
+
+    def translate(self, sql: str) -> str:
+        return translate_bigquery_sql(sql, self.bq_dataset, self.bq_table)
+
+    def execute(self, sql: str, max_rows: Optional[int] = None) -> pd.DataFrame:
+        local_sql = self.translate(sql)
+        if max_rows:
+            local_sql = f"SELECT * FROM ({local_sql}) LIMIT {int(max_rows)}"
+        logger.info(f"Translated SQL for DuckDB: {local_sql}")
+        # A DuckDB connection must not be shared between threads, cursors are cheap
+        with self._lock:
+            cursor = self.conn.cursor()
+        try:
+            with span("sql_execute", engine=self.name):
+                cursor.execute(local_sql)
+            with span("result_download", engine=self.name) as attributes:
+                result_df = cursor.df()
+                attributes["rows"] = len(result_df)
+            return result_df
+        finally:
+            cursor.close()
+
+    def dry_run(self, sql: str) -> Optional[int]:
+        # EXPLAIN binds tables and columns without reading data, scan size is not estimated locally
+        with self._lock:
+            cursor = self.conn.cursor()
+        try:
+            with span("dry_run", engine=self.name):
+                cursor.execute(f"EXPLAIN {self.translate(sql)}")
+            return None
+        finally:
+            cursor.close()
+
+    def table_version(self) -> str:
+        return str(self.parquet_path.stat().st_mtime_ns)
+
+    def columns(self) -> List[str]:
+        with self._lock:
+            cursor = self.conn.cursor()
+        try:
+            cursor.execute(f'SELECT * FROM "{self.bq_table}" LIMIT 0')
+            return [column[0] for column in cursor.description]
+        finally:
+            cursor.close()
+
+    def materialize(self, table_name: str, sql: str) -> int:
+        result_df = self.execute(sql)
+        os.makedirs(self.table_dir, exist_ok=True)
+        table_path = self.table_dir / f"{table_name}.parquet"
+        tmp_path = table_path.with_suffix(".parquet.tmp")
+        result_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, table_path)
+        self._create_view(table_name, table_path)
+        return len(result_df)
+
+
+def _format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return "unknown bytes"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def _resolve_path(path: str) -> Path:
+    path = Path(path)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def build_parquet_snapshot(csv_path: Path, parquet_path: Path) -> Path:
+    """Writes a Parquet copy of the CSV with typed date columns, unless an up-to-date one exists."""
+    if parquet_path.exists() and parquet_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        return parquet_path
+    data = pd.read_csv(csv_path)
+    for column in DATE_COLUMNS:
+        data[column] = pd.to_datetime(data[column], format=CSV_DATE_FORMAT).dt.date
+    os.makedirs(parquet_path.parent, exist_ok=True)
+    tmp_path = parquet_path.with_suffix(".parquet.tmp")
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+    logger.info(f"Parquet snapshot written to {parquet_path} ({len(data)} rows)")
+    return parquet_path
+
+
+def translate_bigquery_sql(sql: str, bq_dataset: str, bq_table: str) -> str:
+    """
+    Translates BigQuery SQL to DuckDB SQL.
+
+    `dataset.table` references (the base table and any table materialized next to it)
+    are rewritten to local table names and BigQuery functions such as FORMAT_DATE,
+    DATE_TRUNC and EXTRACT are mapped by sqlglot.
+    """
+    tree = sqlglot.parse_one(sql, read="bigquery")
+    for table in tree.find_all(exp.Table):
+        if table.db == bq_dataset or (table.name == bq_table and not table.db):
+            table.set("db", None)
+            table.set("catalog", None)
+    return tree.sql(dialect="duckdb")
+
+
+def get_query_backend(config: dict, bigquery_client=None) -> QueryBackend:
+    """
+    Returns the query backend selected by `query_backend.engine` in the config (default: bigquery).
+
+    `bigquery_client` lets the caller share an existing client with the BigQuery backend.
+    """
+    backend_config = config.get("query_backend", {})
+    engine = backend_config.get("engine", "bigquery")
+    if engine == "bigquery":
+        return BigQueryBackend(
+            bq_dataset=config["gcp"]["bq_dataset"],
+            bq_table=config["gcp"]["bq_table"],
+            credentials=config["gcp"].get("credentials"),
+            version_ttl_seconds=backend_config.get("version_ttl_seconds", 60),
+            client=bigquery_client,
+        )
+    if engine == "duckdb":
+        local = backend_config.get("local", {})
+        return DuckDBBackend(
+            bq_dataset=config["gcp"]["bq_dataset"],
+            bq_table=config["gcp"]["bq_table"],
+            csv_path=local.get("csv_path", "superstore_data.csv"),
+            parquet_path=local.get("parquet_path", "data/superstore_data.parquet"),
+            table_dir=local.get("table_dir", "data/tables"),
+        )
+    raise ValueError(f"Unknown query backend: {engine}")
@@ -0,0 +1,214 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional
+import numpy as np
+from src.askdata import logger
+from src.askdata.components.registry import get_registry
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+# Words that may differ between two questions without changing their meaning
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "what", "which", "me", "please", "show",
+    "give", "tell", "of", "for", "all", "do", "does", "did", "there", "in",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases, unifies quotes, collapses whitespace and drops trailing punctuation."""
+    question = question.lower().replace("’", "'").replace("‘", "'")
+    question = re.sub(r"\b(\w+)'s\b", r"\1 is", question)
+    question = re.sub(r"\s+", " ", question).strip()
+    return question.rstrip("?.! ")
+
+
+def _content_tokens(question: str) -> set:
+    tokens = re.findall(r"[\w-]+", question)
+    return {t[:-1] if len(t) > 3 and t.endswith("s") else t for t in tokens if t not in FILLER_WORDS}
+
+
+def _numbers(question: str) -> set:
+    return set(re.findall(r"\d+(?:\.\d+)?", question))
+
+
+def hash_parts(*parts) -> str:
+    """Stable short hash of JSON-serializable parts (schema columns, model config, ...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class QuestionCache:
+    """
+    Persistent NL->SQL cache backed by SQLite.
+
+    Entries are scoped by a hash of the table schema and the LLM model/config, so a schema
+    change or model swap never serves stale SQL. Eviction is LRU (`max_entries`) plus TTL.
+    Paraphrases can be matched with difflib (`fuzzy_threshold`) and, when `embed_fn` is
+    given, by cosine similarity of question embeddings (`embedding_threshold`). A difflib
+    match additionally requires both questions to share the same content words, so
+    "profit in Spain" never matches "profit in France"; an embedding match requires the same
+    numbers (years, top-N).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5000,
+        ttl_seconds: Optional[float] = None,
+        fuzzy_threshold: float = 0.0,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        embedding_threshold: float = 0.95,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fuzzy_threshold = fuzzy_threshold
+        self.embed_fn = embed_fn
+        self.embedding_threshold = embedding_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS question_cache ("
+                " key TEXT PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL,"
+                " sql TEXT NOT NULL, embedding BLOB, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_question_cache_scope ON question_cache (scope)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(scope: str, question: str) -> str:
+        return hash_parts(scope, question)
+
+    def get(self, question: str, scope: str) -> Optional[str]:
+        """Returns cached SQL for the question (exact, then fuzzy/embedding match) or None."""
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM question_cache WHERE created < ?", (now - self.ttl_seconds,))
+            row = conn.execute(
+                "SELECT key, sql FROM question_cache WHERE key = ?", (self._key(scope, normalized),)
+            ).fetchone()
+            if row is None and (self.fuzzy_threshold or self.embed_fn):
+                row = self._similar(conn, normalized, scope)
+                if row is not None:
+                    self.fuzzy_hits += 1
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE question_cache SET last_access = ? WHERE key = ?", (now, row[0]))
+            self.hits += 1
+            return row[1]
+
+    def _similar(self, conn: sqlite3.Connection, normalized: str, scope: str):
+        candidates = conn.execute(
+            "SELECT key, sql, question, embedding FROM question_cache WHERE scope = ?", (scope,)
+        ).fetchall()
+        if not candidates:
+            return None
+        best, best_score = None, 0.0
+        tokens = _content_tokens(normalized)
+        for key, sql, question, _ in candidates:
+            if _content_tokens(question) != tokens:
+                continue
+            score = difflib.SequenceMatcher(None, normalized, question).ratio()
+            if score > best_score:
+                best, best_score = (key, sql), score
+        if self.fuzzy_threshold and best_score >= self.fuzzy_threshold:
+            logger.info(f"Question cache fuzzy match (score={best_score:.3f})")
+            return best
+        numbers = _numbers(normalized)
+        embedded = [c for c in candidates if c[3] is not None and _numbers(c[2]) == numbers]
+        if self.embed_fn and embedded:
+            query_vector = _unit(np.asarray(self.embed_fn([normalized])[0], dtype=np.float32))
+            matrix = np.stack([np.frombuffer(c[3], dtype=np.float32) for c in embedded])
+            scores = matrix @ query_vector
+            i = int(np.argmax(scores))
+            if scores[i] >= self.embedding_threshold:
+                logger.info(f"Question cache embedding match (score={scores[i]:.3f})")
+                return embedded[i][0], embedded[i][1]
+        return None
+
+    def put(self, question: str, scope: str, sql: str) -> None:
+        normalized = normalize_question(question)
+        embedding = None
+        if self.embed_fn:
+            embedding = _unit(np.asarray(self.embed_fn([normalized])[0], dtype=np.float32)).tobytes()
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO question_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(scope, normalized), scope, normalized, sql, embedding, now, now),
+            )
+            conn.execute(
+                "DELETE FROM question_cache WHERE key IN ("
+                " SELECT key FROM question_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM question_cache")
+
+    def stats(self) -> dict:
+        with self._lock, self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM question_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def get_question_cache(config: dict) -> Optional[QuestionCache]:
+    """Returns the process-wide question cache configured under `cache.question`, or None if disabled."""
+    cache_config = config.get("cache", {}).get("question", {})
+    if not cache_config.get("enabled", False):
+        return None
+    path = Path(cache_config.get("path", "data/cache/question_cache.sqlite"))
+    path = path if path.is_absolute() else PROJECT_ROOT / path
+
+    def factory():
+        embed_fn = None
+        if cache_config.get("use_embeddings", False):
+            from src.askdata.components.embedding import create_embeddings
+            model_name = config["embeddings"]["model_name"]
+            embed_fn = lambda texts: create_embeddings(texts, model_name)
+        return QuestionCache(
+            path,
+            max_entries=cache_config.get("max_entries", 5000),
+            ttl_seconds=cache_config.get("ttl_seconds"),
+            fuzzy_threshold=cache_config.get("fuzzy_threshold", 0.0),
+            embed_fn=embed_fn,
+            embedding_threshold=cache_config.get("embedding_threshold", 0.95),
+        )
+    return get_registry().get_or_create(f"question_cache:{path}", factory)
@@ -0,0 +1,200 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+import yaml
+from src.askdata import logger
+from src.askdata.components.query_backend import QueryBackend, get_query_backend
+from src.askdata.components.tracing import get_tracer, span
+
+if TYPE_CHECKING:
+    # The GCP SDKs take seconds to import, they are imported by the factories that need them
+    from google.cloud import bigquery, storage
+    from vertexai.language_models import TextEmbeddingModel
+    from vertexai.preview.generative_models import GenerativeModel
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+
+def _streamlit_secrets():
+    """st.secrets when running in Streamlit or a secrets.toml exists, else None without importing Streamlit."""
+    if "streamlit" not in sys.modules and not any(
+        path.exists() for path in (Path.cwd() / ".streamlit" / "secrets.toml", Path.home() / ".streamlit" / "secrets.toml")
+    ):
+        return None
+    import streamlit as st
+    return st.secrets
+
+
+def read_config(config_path: str = "config/config.yaml") -> dict:
+    """
+    Reads the configuration from Streamlit secrets when available, otherwise from YAML.
+
+    A `gcp.service_account_key` secret is turned into service-account credentials
+    stored under `gcp.credentials`.
+    """
+    secrets = _streamlit_secrets()
+    try:
+        secrets_available = secrets is not None and "gcp" in secrets
+    except FileNotFoundError:
+        # No secrets.toml, e.g. when running ingestion or scripts outside Streamlit
+        secrets_available = False
+    if secrets_available:
+        config = {}
+        for section in secrets:
+            config[section] = dict(secrets[section])
+        if "service_account_key" in config.get("gcp", {}):
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_info(
+                json.loads(config["gcp"]["service_account_key"])
+            )
+            config["gcp"]["credentials"] = credentials
+        return config
+    config_file = PROJECT_ROOT / config_path
+    with open(config_file, "r") as f:
+        return yaml.safe_load(f)
+
+
+class Registry:
+    """
+    Process-wide, lazily initialized holder for config, credentials, GCP clients, model
+    handles and the components' shared objects (caches, stores, indexes, the service).
+
+    Every object is created on first use and shared by all components and threads.
+    `register` replaces an entry (e.g. with a fake model in tests) and `reset_registry`
+    drops everything.
+    """
+
+    def __init__(self, config_path: str = "config/config.yaml"):
+        self.config_path = config_path
+        self._lock = threading.RLock()
+        self._objects = {}
+        self._versions = {}
+        self._schema = None
+        self._schema_loaded = 0.0
+
+    def get_or_create(self, key: str, factory: Callable):
+        """The object under `key`, created by `factory` on first use."""
+        # Fast path without the lock, objects are never mutated once created
+        obj = self._objects.get(key)
+        if obj is not None:
+            return obj
+        with self._lock:
+            if key not in self._objects:
+                logger.info(f"Initializing {key}")
+                self._objects[key] = factory()
+            return self._objects[key]
+
+    def get_versioned(self, key: str, version, factory: Callable):
+        """Like get_or_create, but the object is created again whenever `version` (e.g. a file mtime) changes."""
+        with self._lock:
+            if key not in self._objects or self._versions.get(key) != version:
+                self._objects[key] = factory()
+                self._versions[key] = version
+            return self._objects[key]
+
+    def register(self, key: str, obj) -> None:
+        """Installs `obj` under `key`, e.g. 'config', 'bigquery_client', 'generative_model:<name>'."""
+        with self._lock:
+            self._objects[key] = obj
+            self._versions.pop(key, None)
+
+    def config(self) -> dict:
+        def factory():
+            with span("config_load"):
+                config = read_config(self.config_path)
+            get_tracer().configure(config.get("tracing", {}))
+            return config
+        return self.get_or_create("config", factory)
+
+    def credentials(self):
+        return self.config()["gcp"].get("credentials")
+
+    def bigquery_client(self) -> "bigquery.Client":
+        def factory():
+            from google.cloud import bigquery
+            credentials = self.credentials()
+            return bigquery.Client(credentials=credentials) if credentials else bigquery.Client()
+        return self.get_or_create("bigquery_client", factory)
+
+    def storage_client(self) -> "storage.Client":
+        def factory():
+            from google.cloud import storage
+            credentials = self.credentials()
+            return storage.Client(credentials=credentials) if credentials else storage.Client()
+        return self.get_or_create("storage_client", factory)
+
+    def init_vertexai(self) -> None:
+        def factory():
+            import vertexai
+            config = self.config()
+            vertexai.init(
+                project=config["gcp"]["project_id"],
+                location=config["gcp"]["location"],
+                credentials=self.credentials(),
+            )
+            return True
+        self.get_or_create("vertexai", factory)
+
+    def generative_model(self, model_name: str) -> "GenerativeModel":
+        def factory():
+            from vertexai.preview.generative_models import GenerativeModel
+            return GenerativeModel(model_name)
+        self.init_vertexai()
+        return self.get_or_create(f"generative_model:{model_name}", factory)
+
+    def embedding_model(self, model_name: str) -> "TextEmbeddingModel":
+        def factory():
+            from vertexai.language_models import TextEmbeddingModel
+            return TextEmbeddingModel.from_pretrained(model_name)
+        self.init_vertexai()
+        return self.get_or_create(f"embedding_model:{model_name}", factory)
+
+    def generation_config(self):
+        """GenerationConfig built from `llm.generation_config`, shared by every LLM call."""
+        def factory():
+            from vertexai.preview.generative_models import GenerationConfig
+            return GenerationConfig(**self.config()["llm"]["generation_config"])
+        return self.get_or_create("generation_config", factory)
+
+    def query_backend(self) -> QueryBackend:
+        def factory():
+            config = self.config()
+            engine = config.get("query_backend", {}).get("engine", "bigquery")
+            return get_query_backend(config, self.bigquery_client() if engine == "bigquery" else None)
+        return self.get_or_create("query_backend", factory)
+
+    def table_schema(self) -> list:
+        """Column names of the table on the configured query backend, cached for `cache.schema.ttl_seconds`."""
+        ttl = self.config().get("cache", {}).get("schema", {}).get("ttl_seconds", 300)
+        with self._lock:
+            if self._schema is None or time.time() - self._schema_loaded > ttl:
+                self._schema = self.query_backend().columns()
+                self._schema_loaded = time.time()
+            return self._schema
+
+    def invalidate_table_schema(self) -> None:
+        with self._lock:
+            self._schema = None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry()
+    return _registry
+
+
+def reset_registry() -> None:
+    """Drops every cached client, model, config, cache, store, index and the service. Intended for tests."""
+    global _registry
+    with _registry_lock:
+        _registry = None
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+import sqlglot
+from src.askdata import logger
+from src.askdata.components.registry import get_registry
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Normalizes formatting so equivalent SQL text maps to the same cache entry."""
+    try:
+        return sqlglot.parse_one(sql, read="bigquery").sql(dialect="bigquery")
+    except sqlglot.errors.ParseError:
+        return re.sub(r"\s+", " ", sql).strip().rstrip(";")
+
+
+class ResultCache:
+    """
+    Disk-backed SQL result cache shared by every process pointing at the same directory.
+
+    Results are stored as Parquet files, indexed in SQLite, keyed by canonical SQL plus the
+    table version, and evicted least-recently-used once `max_bytes` is exceeded. The table
+    version combines the backend's last-modified marker with a local generation counter
+    that `invalidate()` bumps after each ingest.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, file TEXT NOT NULL, bytes INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.cache_dir / "index.sqlite", timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def generation(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _key(self, sql: str, table_version: str) -> str:
+        payload = f"{self.generation()}|{table_version}|{canonicalize_sql(sql)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, sql: str, table_version: str) -> Optional[pd.DataFrame]:
+        key = self._key(sql, table_version)
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT file FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            result_df = pd.read_parquet(self.cache_dir / row[0])
+        except (OSError, ValueError) as e:
+            # Evicted by another process between the lookup and the read
+            logger.warning(f"Result cache entry unreadable, treating as miss: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result_df
+
+    def put(self, sql: str, table_version: str, result_df: pd.DataFrame) -> None:
+        key = self._key(sql, table_version)
+        file_name = f"{key}.parquet"
+        tmp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            result_df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.cache_dir / file_name)
+        except Exception as e:
+            logger.warning(f"Could not cache query result: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        size = (self.cache_dir / file_name).stat().st_size
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, file_name, size, now, now))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, file_name, size in conn.execute(
+            "SELECT key, file, bytes FROM results ORDER BY last_access ASC"
+        ).fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            (self.cache_dir / file_name).unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def invalidate(self) -> None:
+        """Drops every cached result, e.g. after a WRITE_TRUNCATE load replaced the table."""
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            for (file_name,) in conn.execute("SELECT file FROM results").fetchall():
+                (self.cache_dir / file_name).unlink(missing_ok=True)
+            conn.execute("DELETE FROM results")
+        logger.info(f"Result cache invalidated: {self.cache_dir}")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+def get_result_cache(config: dict) -> Optional[ResultCache]:
+    """Returns the result cache configured under `cache.result`, or None if disabled."""
+    cache_config = config.get("cache", {}).get("result", {})
+    if not cache_config.get("enabled", False):
+        return None
+    cache_dir = Path(cache_config.get("dir", "data/cache/results"))
+    cache_dir = cache_dir if cache_dir.is_absolute() else PROJECT_ROOT / cache_dir
+    return get_registry().get_or_create(
+        f"result_cache:{cache_dir}",
+        lambda: ResultCache(cache_dir, max_bytes=cache_config.get("max_bytes", 512 * 1024 * 1024)),
+    )
+
+
+def execute_cached(
+    backend, sql: str, result_cache: Optional[ResultCache], max_rows: Optional[int] = None
+) -> pd.DataFrame:
+    """Runs `sql` on the backend (fetching at most `max_rows` rows) unless a result for the current table version is cached."""
+    if result_cache is None:
+        return backend.execute(sql, max_rows=max_rows)
+    # The fetch cap changes the result, so it is part of the version the entry is valid for
+    table_version = f"{backend.table_version()}|{max_rows}"
+    result_df = result_cache.get(sql, table_version)
+    if result_df is not None:
+        logger.info("Result cache hit")
+        return result_df
+    result_df = backend.execute(sql, max_rows=max_rows)
+    result_cache.put(sql, table_version, result_df)
+    return result_df
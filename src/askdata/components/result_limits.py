@@ -0,0 +1,109 @@
+from typing import List, Optional
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+from src.askdata import logger
+from src.askdata.components.answer import format_value
+
+# Rough size of a Gemini token in characters of tabular English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def limit_sql(sql: str, max_rows: int) -> str:
+    """
+    Caps the outer query at `max_rows` rows with a LIMIT, keeping a smaller existing LIMIT.
+
+    Returns the SQL unchanged if it cannot be parsed, the fetch cap still applies then.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError:
+        return sql
+    if not isinstance(tree, (exp.Select, exp.Union)):
+        return sql
+    limit = tree.args.get("limit")
+    if limit is not None:
+        value = limit.expression
+        if isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows:
+            return sql
+    return tree.limit(max_rows, copy=False).sql(dialect="bigquery")
+
+
+def cap_rows(result_df: pd.DataFrame, max_rows: int) -> pd.DataFrame:
+    """
+    Keeps the first `max_rows` rows. The result is fetched with one row to spare, so
+    `attrs["truncated"]` tells whether the query returned more rows than were kept.
+    """
+    truncated = len(result_df) > max_rows
+    if truncated:
+        result_df = result_df.head(max_rows).copy()
+        logger.warning(f"Large result: more than {max_rows} rows, keeping the first {max_rows}")
+    result_df.attrs["truncated"] = truncated
+    result_df.attrs["row_limit"] = max_rows
+    return result_df
+
+
+def _column_stats(result_df: pd.DataFrame, top_values: int) -> List[str]:
+    lines = []
+    for column in result_df.columns:
+        values = result_df[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            lines.append(
+                f"- {column}: min {format_value(values.min(), column)}, max {format_value(values.max(), column)}, "
+                f"mean {format_value(values.mean(), column)}, sum {format_value(values.sum(), column)}"
+            )
+        else:
+            counts = values.astype(str).value_counts()
+            if len(counts) and counts.iloc[0] == 1:
+                lines.append(f"- {column}: all {len(counts)} values distinct, e.g. {', '.join(counts.index[:top_values])}")
+                continue
+            top = ", ".join(f"{value} ({count})" for value, count in counts.head(top_values).items())
+            lines.append(f"- {column}: {len(counts)} distinct, most frequent: {top}")
+    return lines
+
+
+def _top_groups(result_df: pd.DataFrame, count: int) -> Optional[str]:
+    """Top rows by the first numeric column, when the result looks like key -> measure."""
+    numeric = [c for c in result_df.columns if pd.api.types.is_numeric_dtype(result_df[c])]
+    keys = [c for c in result_df.columns if c not in numeric]
+    if not numeric or not keys:
+        return None
+    measure = numeric[0]
+    top = result_df.nlargest(count, measure)[keys[:2] + [measure]]
+    return f"Top {len(top)} rows by {measure}:\n{top.to_string(index=False)}"
+
+
+def summarize_result(result_df: pd.DataFrame, token_budget: int = 1500, sample_rows: int = 5) -> str:
+    """
+    Text rendering of a query result for the refine prompt, within `token_budget` tokens.
+
+    Small results are rendered in full. Larger ones become a summary: shape, per-column
+    statistics, the top rows by the first measure and the first/last rows, added in that
+    order, skipping those that do not fit.
+    """
+    truncated = result_df.attrs.get("truncated", False)
+    note = f" (first {len(result_df)} rows only, the full result is larger)" if truncated else ""
+    full = result_df.to_string(index=False)
+    if not truncated and estimate_tokens(full) <= token_budget:
+        return full
+
+    sections = [f"{len(result_df)} rows x {len(result_df.columns)} columns{note}."]
+    sections.append("Column statistics" + (" over the rows fetched" if truncated else "") + ":\n"
+                    + "\n".join(_column_stats(result_df, top_values=5)))
+    top_groups = _top_groups(result_df, sample_rows)
+    if top_groups:
+        sections.append(top_groups)
+    sections.append(f"First {sample_rows} rows:\n{result_df.head(sample_rows).to_string(index=False)}")
+    sections.append(f"Last {sample_rows} rows:\n{result_df.tail(sample_rows).to_string(index=False)}")
+
+    summary = sections[0]
+    for section in sections[1:]:
+        candidate = f"{summary}\n{section}"
+        if estimate_tokens(candidate) <= token_budget:
+            summary = candidate
+    # The shape line alone can still exceed a tiny budget
+    return summary[: token_budget * CHARS_PER_TOKEN]
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+import sqlglot
+from sqlglot import exp
+from src.askdata import configure_logging, logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+DIMENSIONS = ["country", "region", "category", "sub_category", "segment", "ship_mode", "year", "month"]
+MEASURES = ["gmv", "profit", "quantity", "total_profit"]
+DISTINCT_COLUMNS = ["order_id", "customer_name"]
+
+# Derived dimensions and the BigQuery expression that computes them from the base table
+DERIVED_DIMENSIONS = {
+    "year": "EXTRACT(YEAR FROM order_date)",
+    "month": "EXTRACT(MONTH FROM order_date)",
+}
+
+# Used when `rollups.definitions` is not configured, smallest first
+DEFAULT_ROLLUPS = {
+    "country": ["country"],
+    "segment": ["segment"],
+    "category": ["category", "sub_category"],
+    "time": ["year", "month"],
+    "geo_product": ["country", "region", "category", "sub_category"],
+    "geo_time": ["country", "region", "year", "month"],
+    "segment_ship": ["segment", "ship_mode", "year", "month"],
+    "full": DIMENSIONS,
+}
+
+
+@dataclass
+class RoutingDecision:
+    sql: str
+    rollup: Optional[str] = None
+    reason: str = ""
+    dimensions: List[str] = field(default_factory=list)
+
+
+def _manifest_path(config: dict) -> Path:
+    path = Path(config.get("rollups", {}).get("manifest_path", "data/rollups.json"))
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def rollup_table(config: dict, name: str) -> str:
+    return f"{config['gcp']['bq_table']}_rollup_{name}"
+
+
+def rollup_sql(config: dict, dimensions: List[str]) -> str:
+    """BigQuery SELECT that aggregates the base table to the given dimensions."""
+    select = [f"{DERIVED_DIMENSIONS[d]} AS {d}" if d in DERIVED_DIMENSIONS else d for d in dimensions]
+    select += [f"SUM({m}) AS sum_{m}" for m in MEASURES]
+    select += ["COUNT(*) AS row_count"]
+    select += [f"COUNT(DISTINCT {c}) AS distinct_{c}" for c in DISTINCT_COLUMNS]
+    return (
+        f"SELECT {', '.join(select)} "
+        f"FROM `{config['gcp']['bq_dataset']}.{config['gcp']['bq_table']}` "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(dimensions)))}"
+    )
+
+
+def build_rollups(config: dict, backend) -> Dict[str, dict]:
+    """
+    Materializes every configured rollup with the backend and records their sizes.
+
+    Returns:
+        Dict[str, dict]: The manifest, {name: {table, dimensions, rows, engine, built_at}}.
+    """
+    definitions = config.get("rollups", {}).get("definitions") or DEFAULT_ROLLUPS
+    manifest = {}
+    for name, dimensions in definitions.items():
+        unknown = set(dimensions) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Rollup {name} has unknown dimensions: {sorted(unknown)}")
+        table = rollup_table(config, name)
+        rows = backend.materialize(table, rollup_sql(config, dimensions))
+        manifest[name] = {
+            "table": table,
+            "dimensions": list(dimensions),
+            "rows": rows,
+            "engine": backend.name,
+            "built_at": time.time(),
+        }
+        logger.info(f"Rollup {table} built: {rows} rows over {', '.join(dimensions)}")
+    path = _manifest_path(config)
+    os.makedirs(path.parent, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def describe_rollups(config: dict) -> Dict[str, dict]:
+    """Manifest of the rollups built by the last ingest, {} if none were built."""
+    path = _manifest_path(config)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _dimension_of(node: exp.Expression) -> Optional[str]:
+    if isinstance(node, exp.Column) and node.name in DIMENSIONS and node.name not in DERIVED_DIMENSIONS:
+        return node.name
+    if isinstance(node, exp.Extract) and isinstance(node.expression, exp.Column) and node.expression.name == "order_date":
+        unit = node.this.name.lower()
+        if unit in DERIVED_DIMENSIONS:
+            return unit
+    return None
+
+
+def _as_count(total: exp.Expression) -> exp.Expression:
+    """A SUM of stored counts typed like the COUNT it replaces (DuckDB widens SUM of integers to HUGEINT)."""
+    return exp.Cast(this=total, to=exp.DataType.build("INT64", dialect="bigquery"))
+
+
+def _rewrite_aggregate(node: exp.Expression) -> Optional[exp.Expression]:
+    """Aggregate over the base table -> equivalent aggregate over rollup columns, None if unsupported."""
+    if isinstance(node, exp.Count):
+        arg = node.this
+        if isinstance(arg, exp.Distinct):
+            if len(arg.expressions) == 1 and isinstance(arg.expressions[0], exp.Column) \
+                    and arg.expressions[0].name in DISTINCT_COLUMNS:
+                return _as_count(exp.Sum(this=exp.column(f"distinct_{arg.expressions[0].name}")))
+            return None
+        # Every column of the Superstore table is non-null, COUNT(col) is a row count
+        if isinstance(arg, exp.Star) or isinstance(arg, exp.Column):
+            return _as_count(exp.Sum(this=exp.column("row_count")))
+        return None
+    if isinstance(node, (exp.Sum, exp.Avg)) and isinstance(node.this, exp.Column) and node.this.name in MEASURES:
+        total = exp.Sum(this=exp.column(f"sum_{node.this.name}"))
+        if isinstance(node, exp.Sum):
+            return total
+        return exp.Div(this=total, expression=exp.Sum(this=exp.column("row_count")))
+    return None
+
+
+def route_query(sql: str, config: dict, engine: str) -> RoutingDecision:
+    """
+    Rewrites `sql` to read from the smallest rollup that can answer it.
+
+    Supported shape: one SELECT over the base table with no joins or subqueries, grouping
+    and filtering only on rollup dimensions (EXTRACT(YEAR|MONTH FROM order_date) map to
+    year/month), aggregating with SUM/AVG of measures, COUNT(*) and COUNT(DISTINCT
+    order_id|customer_name). COUNT DISTINCT cannot be re-aggregated, so it only routes to a
+    rollup whose dimensions are exactly the GROUP BY. Anything else falls back to the base table.
+    """
+    rollups = {n: r for n, r in describe_rollups(config).items() if r.get("engine") == engine}
+    if not rollups:
+        return RoutingDecision(sql, reason="no rollups built")
+    try:
+        tree = sqlglot.parse_one(sql, read="bigquery")
+    except sqlglot.errors.ParseError as e:
+        return RoutingDecision(sql, reason=f"unparseable: {e}")
+    if not isinstance(tree, exp.Select) or tree.args.get("joins") or tree.find(exp.Subquery, exp.Window, exp.With):
+        return RoutingDecision(sql, reason="not a single-table SELECT")
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name != config["gcp"]["bq_table"]:
+        return RoutingDecision(sql, reason="not the base table")
+
+    # Aggregates first, so the dimension scan below only sees columns outside aggregates
+    aggregates = list(tree.find_all(exp.AggFunc))
+    if not aggregates:
+        return RoutingDecision(sql, reason="no aggregation")
+    replacements = {}
+    needs_exact = False
+    for node in aggregates:
+        rewritten = _rewrite_aggregate(node)
+        if rewritten is None:
+            return RoutingDecision(sql, reason=f"unsupported aggregate {node.sql(dialect='bigquery')}")
+        needs_exact = needs_exact or isinstance(node.this, exp.Distinct)
+        replacements[id(node)] = rewritten
+
+    aliases = {e.alias for e in tree.expressions if e.alias}
+    dimensions = set()
+    for node in tree.find_all(exp.Column, exp.Extract):
+        if node.find_ancestor(exp.AggFunc) or (isinstance(node, exp.Column) and node.find_ancestor(exp.Extract)):
+            continue
+        dimension = _dimension_of(node)
+        if dimension:
+            dimensions.add(dimension)
+        elif not (isinstance(node, exp.Column) and node.name in aliases and not node.table):
+            return RoutingDecision(sql, reason=f"non-dimension column {node.sql(dialect='bigquery')}")
+
+    group = tree.args.get("group")
+    group_dimensions = set()
+    if group:
+        for node in group.expressions:
+            if isinstance(node, exp.Literal):
+                node = tree.expressions[int(node.this) - 1].unalias()
+            elif isinstance(node, exp.Column) and node.name in aliases:
+                node = next(e for e in tree.expressions if e.alias == node.name).unalias()
+            group_dimensions.add(_dimension_of(node))
+
+    candidates = []
+    for name, rollup in rollups.items():
+        rollup_dimensions = set(rollup["dimensions"])
+        if not dimensions <= rollup_dimensions:
+            continue
+        if needs_exact and (rollup_dimensions != group_dimensions or not dimensions <= group_dimensions):
+            continue
+        candidates.append((rollup["rows"], name))
+    if not candidates:
+        return RoutingDecision(sql, reason="no rollup covers the query", dimensions=sorted(dimensions))
+    _, name = min(candidates)
+
+    def transform(node):
+        if id(node) in replacements:
+            return replacements[id(node)]
+        dimension = _dimension_of(node) if isinstance(node, exp.Extract) else None
+        if dimension:
+            return exp.column(dimension)
+        if isinstance(node, exp.Table):
+            return exp.table_(rollups[name]["table"], db=node.db or None)
+        return node
+
+    # No copy: the replacements are keyed by the identity of this tree's nodes
+    routed = tree.transform(transform, copy=False).sql(dialect="bigquery")
+    return RoutingDecision(routed, rollup=name, reason="routed", dimensions=sorted(dimensions))
+
+
+if __name__ == "__main__":
+    # python -m src.askdata.components.rollup build | describe | route "<sql>"
+    configure_logging()
+    from src.askdata.components.registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Build, inspect and test routing of rollups.")
+    parser.add_argument("command", choices=["build", "describe", "route"])
+    parser.add_argument("sql", nargs="?")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    config = registry.config()
+    if args.command == "build":
+        print(json.dumps(build_rollups(config, registry.query_backend()), indent=2))
+    elif args.command == "describe":
+        print(json.dumps(describe_rollups(config), indent=2))
+    else:
+        decision = route_query(args.sql, config, registry.query_backend().name)
+        print(f"rollup: {decision.rollup} ({decision.reason})\n{decision.sql}")
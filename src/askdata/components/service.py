@@ -0,0 +1,321 @@
+import asyncio
+import concurrent.futures
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import pandas as pd
+from src.askdata import logger
+from src.askdata.components.preprocess import answer_result, generate_sql, load_config, preprocess_data, quick_answer, run_sql
+from src.askdata.components.question_cache import normalize_question
+from src.askdata.components.registry import get_registry
+from src.askdata.components.tracing import get_tracer, span
+
+
+class ServiceError(Exception):
+    """Base class of the errors the service raises in place of an answer."""
+
+
+class Overloaded(ServiceError):
+    """Too many questions are already waiting, the caller should retry later."""
+
+
+class QuestionTimeout(ServiceError):
+    """The question was not answered within the timeout."""
+
+
+@dataclass
+class Answer:
+    question: str
+    answer: str
+    sql: str
+    result: pd.DataFrame
+    coalesced: bool = False  # True if this caller shared another caller's pipeline run
+
+
+@dataclass
+class QueryResult:
+    """The SQL and its result without the answer, for callers that stream the answer themselves."""
+    question: str
+    data_info: dict
+    sql: str
+    result: pd.DataFrame
+    coalesced: bool = False
+
+
+class AskService:
+    """
+    Asyncio front of the question pipeline, shared by all Streamlit sessions or used headless.
+
+    Identical questions asked while one is already being answered share that run
+    (single flight), per stage: the SQL stages of a question are shared by `ask` and
+    `query` callers, and `ask` runs the answer stage on top of them. LLM and warehouse calls go through per-backend semaphores, so a burst
+    of questions queues instead of opening unbounded Vertex / BigQuery calls, and at most
+    `max_pending` distinct questions may be in flight or queued before new ones are
+    rejected with Overloaded. Each caller waits at most `timeout_seconds`; a run nobody
+    waits for any more is cancelled at its next stage.
+
+    The blocking pipeline stages run in worker threads via asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        llm_concurrency: int = 4,
+        warehouse_concurrency: int = 8,
+        max_pending: int = 64,
+        timeout_seconds: Optional[float] = 60,
+        coalesce: bool = True,
+    ):
+        self.llm_concurrency = llm_concurrency
+        self.warehouse_concurrency = warehouse_concurrency
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.coalesce = coalesce
+        # Created on first use, asyncio primitives belong to the loop they are used on
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # (stage, question key) -> run; the "answer" stage of a question runs on top of its "query" stage
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[str, str], int] = {}
+        # Question key -> SQL of its query stage, set before the SQL runs
+        self._sql_ready: Dict[str, asyncio.Future] = {}
+        self._queued = {"llm": 0, "warehouse": 0}
+        self._loop = None
+        self.counters = {"requests": 0, "runs": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AskService":
+        service_config = config.get("service", {})
+        return cls(
+            llm_concurrency=service_config.get("llm_concurrency", 4),
+            warehouse_concurrency=service_config.get("warehouse_concurrency", 8),
+            max_pending=service_config.get("max_pending", 64),
+            timeout_seconds=service_config.get("timeout_seconds", 60),
+            coalesce=service_config.get("coalesce", True),
+        )
+
+    def stats(self) -> dict:
+        """
+        Queue depth and counters. `queue_depth` is the number of stage calls waiting for a
+        semaphore, `pending` the distinct questions being answered; `pending` reaching
+        `max_pending` is the backpressure point where questions start being rejected.
+        """
+        return {
+            "pending": self._pending(),
+            "max_pending": self.max_pending,
+            "queue_depth": sum(self._queued.values()),
+            "llm_queued": self._queued["llm"],
+            "warehouse_queued": self._queued["warehouse"],
+            **self.counters,
+        }
+
+    @asynccontextmanager
+    async def _slot(self, backend: str):
+        """Holds one of the `backend` semaphore's slots, the wait is traced as `<backend>_queue`."""
+        semaphore = self._semaphores.get(backend)
+        if semaphore is None:
+            limit = self.llm_concurrency if backend == "llm" else self.warehouse_concurrency
+            semaphore = self._semaphores[backend] = asyncio.Semaphore(limit)
+        self._queued[backend] += 1
+        try:
+            with span(f"{backend}_queue", queue_depth=self._queued[backend]):
+                await semaphore.acquire()
+        finally:
+            self._queued[backend] -= 1
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    async def _call(self, backend: str, fn: Callable, *args):
+        async with self._slot(backend):
+            return await asyncio.to_thread(fn, *args)
+
+    async def _query(self, question: str, sql_ready: asyncio.Future) -> QueryResult:
+        """The SQL stages of the pipeline: data info, SQL generation and execution."""
+        # Every run, so a new data profile or an expired schema cache is picked up; the profile
+        # and schema are cached where they are loaded, this is cheap once they are
+        data_info = await self._call("warehouse", preprocess_data)
+        # The question cache lookup is cheap, but a miss is an LLM call
+        sql_query, from_cache = await self._call("llm", generate_sql, data_info, question)
+        # Callers can show the SQL while it runs
+        sql_ready.set_result(sql_query)
+        result_df = await self._call("warehouse", run_sql, data_info, question, sql_query, from_cache)
+        return QueryResult(question, data_info, sql_query, result_df)
+
+    async def _run_query(self, question: str, sql_ready: asyncio.Future, traced: bool) -> QueryResult:
+        self.counters["runs"] += 1
+        if not traced:
+            # Started by an answer run, whose trace it is part of
+            return await self._query(question, sql_ready)
+        with get_tracer().trace():
+            return await self._query(question, sql_ready)
+
+    async def _run(self, question: str, key: str) -> Answer:
+        """The answer stage on top of the question's SQL stages, shared with `query` callers."""
+        with get_tracer().trace():
+            task, coalesced = self._join_query(key, question, traced=False)
+            query = await self._wait(("query", key), task, question, None, count=False)
+            answer = quick_answer(query.result)
+            if answer is None:
+                answer = await self._call("llm", answer_result, query.data_info, question, query.result)
+        logger.info(f"LLM response: {answer}")
+        return Answer(question, answer, query.sql, query.result, coalesced)
+
+    def _question_key(self, question: str) -> str:
+        key = normalize_question(question)
+        if not self.coalesce:
+            key = f"{key}#{self.counters['requests']}"
+        return key
+
+    def _pending(self) -> int:
+        """Distinct questions in flight, in any stage."""
+        return len({key for _, key in self._in_flight})
+
+    def _admit(self, key: str, question: str) -> None:
+        """Rejects a question that is not in flight yet once `max_pending` questions are."""
+        if any(flight_key == key for _, flight_key in self._in_flight):
+            return
+        if self._pending() >= self.max_pending:
+            self.counters["rejected"] += 1
+            logger.warning(f"Service overloaded: {self._pending()} questions pending, rejecting '{question}'")
+            raise Overloaded(f"{self._pending()} questions are already pending, try again shortly.")
+
+    def _join(self, flight: Tuple[str, str], run: Callable[[], Awaitable]) -> Tuple[asyncio.Task, bool]:
+        """The task of `flight`, started with `run()` unless already in flight, and whether it was shared."""
+        task = self._in_flight.get(flight)
+        coalesced = task is not None
+        if coalesced:
+            self.counters["coalesced"] += 1
+        else:
+            task = self._in_flight[flight] = asyncio.create_task(run())
+        self._waiters[flight] = self._waiters.get(flight, 0) + 1
+        return task, coalesced
+
+    def _join_query(self, key: str, question: str, traced: bool) -> Tuple[asyncio.Task, bool]:
+        def run():
+            self._sql_ready[key] = asyncio.get_running_loop().create_future()
+            return self._run_query(question, self._sql_ready[key], traced)
+
+        return self._join(("query", key), run)
+
+    def _release(self, flight: Tuple[str, str], task: asyncio.Task) -> None:
+        self._waiters[flight] -= 1
+        if self._waiters[flight] == 0:
+            del self._waiters[flight]
+            if self._in_flight.get(flight) is task:
+                del self._in_flight[flight]
+                if flight[0] == "query":
+                    del self._sql_ready[flight[1]]
+            if not task.done():
+                # Nobody is waiting for it: stop at the next stage instead of spending LLM / warehouse calls
+                task.cancel()
+
+    async def _wait(
+        self,
+        flight: Tuple[str, str],
+        task: asyncio.Task,
+        question: str,
+        timeout: Optional[float],
+        result: Optional[Awaitable] = None,
+        count: bool = True,
+    ):
+        """
+        Waits up to `timeout` for `result` (default: the task's result) and releases the caller's
+        hold on the flight. Nested waits of one stage on another pass count=False, so a failure
+        is only counted and logged once.
+        """
+        try:
+            # shield: one caller timing out or being cancelled must not cancel the others' run
+            return await asyncio.wait_for(result or asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            logger.warning(f"Question timed out after {timeout}s: '{question}'")
+            raise QuestionTimeout(f"No answer within {timeout} seconds.")
+        except Exception as e:
+            if count:
+                self.counters["errors"] += 1
+                logger.error(f"Error answering '{question}': {str(e)}")
+            raise
+        finally:
+            self._release(flight, task)
+
+    async def ask(self, question: str, timeout: Optional[float] = None) -> Answer:
+        """
+        Answers `question`, sharing the run of an identical question already in flight. Its
+        SQL stages are shared with `query` callers of the same question.
+
+        Raises:
+            Overloaded: `max_pending` distinct questions are already in flight.
+            QuestionTimeout: No answer within `timeout` (default `timeout_seconds`).
+        """
+        self.counters["requests"] += 1
+        key = self._question_key(question)
+        self._admit(key, question)
+        task, coalesced = self._join(("answer", key), lambda: self._run(question, key))
+        timeout = self.timeout_seconds if timeout is None else timeout
+        answer = await self._wait(("answer", key), task, question, timeout)
+        return replace(answer, question=question, coalesced=True) if coalesced else answer
+
+    async def query(
+        self, question: str, timeout: Optional[float] = None, on_sql: Optional[Callable[[str], None]] = None
+    ) -> QueryResult:
+        """
+        SQL and result for `question` without the answer, for a caller that streams the
+        answer itself. Shares the SQL stages of an identical question already in flight,
+        asked through `query` or `ask`, with the same limits and errors as `ask`.
+        `on_sql` is called with the SQL as soon as it is generated, before it runs.
+        """
+        self.counters["requests"] += 1
+        key = self._question_key(question)
+        self._admit(key, question)
+        task, coalesced = self._join_query(key, question, traced=True)
+        sql_ready = self._sql_ready[key]
+
+        async def result():
+            if on_sql is not None:
+                await asyncio.wait([sql_ready, task], return_when=asyncio.FIRST_COMPLETED)
+                if sql_ready.done():
+                    on_sql(sql_ready.result())
+            return await asyncio.shield(task)
+
+        timeout = self.timeout_seconds if timeout is None else timeout
+        query = await self._wait(("query", key), task, question, timeout, result())
+        return replace(query, question=question, coalesced=True) if coalesced else query
+
+    def start(self) -> "AskService":
+        """Runs the service's event loop in a daemon thread, for callers without one (Streamlit)."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="ask-service", daemon=True).start()
+        return self
+
+    def _blocking(self, coroutine, sql_ready: Optional[concurrent.futures.Future] = None, on_sql=None):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.start()._loop)
+        try:
+            if sql_ready is not None:
+                # on_sql runs in the calling thread, e.g. to draw into the caller's Streamlit page
+                concurrent.futures.wait([sql_ready, future], return_when=concurrent.futures.FIRST_COMPLETED)
+                if sql_ready.done():
+                    on_sql(sql_ready.result())
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def ask_blocking(self, question: str, timeout: Optional[float] = None) -> Answer:
+        """`ask` from synchronous code, on the loop started by `start`."""
+        return self._blocking(self.ask(question, timeout))
+
+    def query_blocking(
+        self, question: str, timeout: Optional[float] = None, on_sql: Optional[Callable[[str], None]] = None
+    ) -> QueryResult:
+        """`query` from synchronous code, on the loop started by `start`. `on_sql` is called in the calling thread."""
+        if on_sql is None:
+            return self._blocking(self.query(question, timeout))
+        sql_ready = concurrent.futures.Future()
+        return self._blocking(self.query(question, timeout, on_sql=sql_ready.set_result), sql_ready, on_sql)
+
+
+def get_service(config: Optional[dict] = None) -> AskService:
+    """Process-wide service on its own event loop thread, shared by every Streamlit session."""
+    return get_registry().get_or_create("service", lambda: AskService.from_config(config or load_config()).start())
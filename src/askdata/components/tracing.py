@@ -0,0 +1,143 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import numpy as np
+
+# Upper bounds (seconds) of the latency histogram buckets, the last bucket is unbounded
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans go to their own logger as one JSON object per line, so they can be filtered or shipped separately
+trace_logger = logging.getLogger("askdata_trace")
+
+_trace_id = contextvars.ContextVar("askdata_trace_id", default=None)
+
+
+class Histogram:
+    """Bucketed latency histogram plus a window of recent samples for percentiles."""
+
+    def __init__(self, buckets=BUCKETS, window: int = 10000):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def snapshot(self) -> dict:
+        samples = np.fromiter(self.samples, dtype=float)
+        cumulative = np.cumsum(self.counts).tolist()
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": float(np.percentile(samples, 50)) if len(samples) else 0.0,
+            "p95": float(np.percentile(samples, 95)) if len(samples) else 0.0,
+            "p99": float(np.percentile(samples, 99)) if len(samples) else 0.0,
+            "max": self.max,
+            # Prometheus-style cumulative counts, {"le": count}
+            "buckets": {**{str(b): c for b, c in zip(self.buckets, cumulative)}, "+Inf": cumulative[-1]},
+        }
+
+
+class Tracer:
+    """
+    Times pipeline stages and keeps one latency histogram per stage.
+
+    Spans opened inside `trace()` share its trace id, so the log lines of one question can
+    be put back together. Each finished span is logged as JSON on `askdata_trace` when
+    `log_spans` is set.
+    """
+
+    def __init__(self, enabled: bool = True, log_spans: bool = True):
+        self.enabled = enabled
+        self.log_spans = log_spans
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, tracing_config: dict) -> None:
+        self.enabled = tracing_config.get("enabled", True)
+        self.log_spans = tracing_config.get("log_spans", True)
+
+    @contextmanager
+    def span(self, stage: str, **attributes) -> Iterator[dict]:
+        """
+        Times the block as `stage`. The yielded dict can be filled with attributes
+        (e.g. row counts) that are logged with the span.
+        """
+        if not self.enabled:
+            yield attributes
+            return
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attributes
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self._histograms.setdefault(stage, Histogram()).observe(duration)
+            if self.log_spans:
+                record = {
+                    "trace_id": _trace_id.get(),
+                    "span": stage,
+                    "duration_ms": round(duration * 1000, 3),
+                    "status": status,
+                }
+                record.update(attributes)
+                trace_logger.info(json.dumps(record, default=str))
+
+    @contextmanager
+    def trace(self, name: str = "request", trace_id: Optional[str] = None) -> Iterator[str]:
+        """Root span for one question, every span opened inside it carries the same trace id."""
+        token = _trace_id.set(trace_id or uuid.uuid4().hex[:16])
+        try:
+            with self.span(name):
+                yield _trace_id.get()
+        finally:
+            _trace_id.reset(token)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """{stage: histogram snapshot} of every stage seen so far."""
+        with self._lock:
+            return {stage: histogram.snapshot() for stage, histogram in self._histograms.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def format_summary(self) -> str:
+        lines = [f"{'stage':<16}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for stage, stats in sorted(self.snapshot().items()):
+            lines.append(
+                f"{stage:<16}{stats['count']:>7}{stats['mean'] * 1000:>10.1f}{stats['p50'] * 1000:>10.1f}"
+                f"{stats['p95'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}"
+            )
+        return "\n".join(lines)
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(stage: str, **attributes):
+    """Shortcut for `get_tracer().span(...)`."""
+    return _tracer.span(stage, **attributes)
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.askdata import configure_logging, logger
+from src.askdata.components.registry import get_registry
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+# Field labels used in the embedded row texts (see embedding_pipeline.build_texts) -> column
+TEXT_FIELDS = {
+    "Category": "category",
+    "Sub-Category": "sub_category",
+    "Customer": "customer_name",
+    "City": "city",
+    "Country": "country",
+}
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    In-process cosine-similarity index over row embeddings.
+
+    "exact" mode scores the query against every row. "ivf" mode clusters the rows with
+    k-means into `n_lists` inverted lists and only scores the rows of the `n_probe`
+    closest clusters, trading a little recall for much less work on large tables.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        matrix: np.ndarray,
+        mode: str = "exact",
+        n_lists: int = 0,
+        n_probe: int = 8,
+    ):
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown vector index mode: {mode}")
+        self.ids = np.asarray(ids, dtype=str)
+        self.texts = np.asarray(texts, dtype=str)
+        self.matrix = _normalize(np.asarray(matrix, dtype=np.float32))
+        self.mode = mode
+        self.n_lists = n_lists or max(1, int(np.sqrt(len(self.ids))))
+        self.n_probe = n_probe
+        self.centroids = None
+        self.assignments = None
+        if mode == "ivf" and len(self.ids):
+            self._train()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _train(self, iterations: int = 10, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        n_lists = min(self.n_lists, len(self.matrix))
+        centroids = self.matrix[rng.choice(len(self.matrix), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(self.matrix @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.matrix[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        self.assignments = np.argmax(self.matrix @ centroids.T, axis=1)
+
+    def search(self, query: Sequence[float], k: int) -> List[Tuple[str, str, float]]:
+        """Returns up to k (id, text, score) tuples, best first."""
+        if not len(self.ids):
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        if self.mode == "ivf":
+            probes = np.argsort(-(self.centroids @ query))[: self.n_probe]
+            candidates = np.flatnonzero(np.isin(self.assignments, probes))
+        else:
+            candidates = np.arange(len(self.ids))
+        scores = self.matrix[candidates] @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[candidates[i]], self.texts[candidates[i]], float(scores[i])) for i in top]
+
+    def updated(self, remove_ids: Sequence[str], ids: Sequence[str], texts: Sequence[str], matrix: np.ndarray) -> "VectorIndex":
+        """Returns a new index without `remove_ids` and with the given rows added or replaced."""
+        drop = set(remove_ids) | set(ids)
+        keep = np.array([i not in drop for i in self.ids], dtype=bool)
+        return VectorIndex(
+            np.concatenate([self.ids[keep], np.asarray(ids, dtype=str)]),
+            np.concatenate([self.texts[keep], np.asarray(texts, dtype=str)]),
+            np.concatenate([self.matrix[keep], _normalize(np.asarray(matrix, dtype=np.float32).reshape(-1, self.matrix.shape[1]))]),
+            mode=self.mode,
+            n_lists=self.n_lists,
+            n_probe=self.n_probe,
+        )
+
+    def save(self, path: Path) -> None:
+        os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, ids=self.ids, texts=self.texts, matrix=self.matrix)
+        os.replace(tmp_path, path)
+        logger.info(f"Vector index saved to {path} ({len(self)} rows)")
+
+    @classmethod
+    def load(cls, path: Path, mode: str = "exact", n_lists: int = 0, n_probe: int = 8) -> "VectorIndex":
+        with np.load(path) as data:
+            return cls(data["ids"], data["texts"], data["matrix"], mode=mode, n_lists=n_lists, n_probe=n_probe)
+
+
+class IndexStaging:
+    """
+    Rows for the local index collected during an ingest, appended to files under `directory`
+    batch by batch, so the ingest holds one batch of vectors in memory instead of all of them.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.vectors_path = self.directory / "vectors.f32"
+        self.rows_path = self.directory / "rows.jsonl"
+        self.dimension = None
+        self.count = 0
+        # Left over by an ingest that crashed
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+
+    def append(self, ids: Sequence[str], texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if not len(matrix):
+            return
+        self.dimension = matrix.shape[1]
+        with open(self.vectors_path, "ab") as f:
+            matrix.tofile(f)
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps([i, text]) + "\n" for i, text in zip(ids, texts))
+        self.count += len(matrix)
+
+    def read(self) -> Tuple[List[str], List[str], np.ndarray]:
+        """(ids, texts, vectors) of every appended row, the vectors memory-mapped from disk."""
+        if not self.count:
+            return [], [], np.empty((0, self.dimension or 0), dtype=np.float32)
+        with open(self.rows_path, encoding="utf-8") as f:
+            ids, texts = zip(*(json.loads(line) for line in f))
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dimension))
+        return list(ids), list(texts), matrix
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def parse_text_fields(text: str) -> Dict[str, str]:
+    """Parses 'Category: X, Sub-Category: Y, ...' back into {column: value}."""
+    fields = {}
+    labels = "|".join(re.escape(label) for label in TEXT_FIELDS)
+    for label, value in re.findall(rf"({labels}|Order ID): (.*?)(?=, (?:{labels}|Order ID): |$)", text):
+        if label in TEXT_FIELDS:
+            fields[TEXT_FIELDS[label]] = value
+    return fields
+
+
+def matching_values(hits: List[Tuple[str, str, float]], max_values: int = 10) -> Dict[str, List[str]]:
+    """Distinct entity values per column from the retrieved rows, in order of relevance."""
+    values = {}
+    for _, text, _ in hits:
+        for column, value in parse_text_fields(text).items():
+            column_values = values.setdefault(column, [])
+            if value not in column_values and len(column_values) < max_values:
+                column_values.append(value)
+    return values
+
+
+def index_path(config: dict) -> Path:
+    path = Path(config.get("retrieval", {}).get("index_path", "data/vector_index.npz"))
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def staging_path(config: dict) -> Path:
+    path = index_path(config)
+    return path.with_name(f"{path.stem}_staging")
+
+
+def get_vector_index(config: dict) -> Optional[VectorIndex]:
+    """Loads the local index saved by ingest_data once per process, None if disabled or not built yet."""
+    retrieval = config.get("retrieval", {})
+    if retrieval.get("backend", "local") != "local":
+        return None
+    path = index_path(config)
+    if not path.exists():
+        return None
+    return get_registry().get_versioned(
+        f"vector_index:{path}",
+        path.stat().st_mtime_ns,
+        lambda: VectorIndex.load(
+            path,
+            mode=retrieval.get("mode", "exact"),
+            n_lists=retrieval.get("ivf_lists", 0),
+            n_probe=retrieval.get("ivf_probe", 8),
+        ),
+    )
+
+
+def retrieve_values(config: dict, query: str) -> Dict[str, List[str]]:
+    """Embeds the question and returns entity values of the `retrieval.num_neighbors` closest rows."""
+    index = get_vector_index(config)
+    if index is None:
+        return {}
+    # Straight to the model: questions are one-off texts, they do not belong in the ingest's embedding store
+    query_vector = get_registry().embedding_model(config["embeddings"]["model_name"]).get_embeddings([query])[0].values
+    hits = index.search(query_vector, config.get("retrieval", {}).get("num_neighbors", 200))
+    return matching_values(hits, config.get("retrieval", {}).get("max_values_per_column", 10))
+
+
+if __name__ == "__main__":
+    # Latency / recall benchmark of ivf against exact search on synthetic clustered vectors, e.g.
+    # python -m src.askdata.components.vector_index --rows 100000 --probe 8
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Benchmark exact vs IVF vector search.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=200)
+    parser.add_argument("--lists", type=int, default=0)
+    parser.add_argument("--probe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((64, args.dimension))
+    matrix = centers[rng.integers(0, 64, args.rows)] + 0.5 * rng.standard_normal((args.rows, args.dimension))
+    queries = matrix[rng.integers(0, args.rows, args.queries)] + 0.1 * rng.standard_normal((args.queries, args.dimension))
+    ids = [str(i) for i in range(args.rows)]
+
+    exact = VectorIndex(ids, ids, matrix)
+    started = time.perf_counter()
+    ivf = VectorIndex(ids, ids, matrix, mode="ivf", n_lists=args.lists, n_probe=args.probe)
+    build_seconds = time.perf_counter() - started
+
+    for name, index in (("exact", exact), ("ivf", ivf)):
+        started = time.perf_counter()
+        results = [index.search(q, args.k) for q in queries]
+        latency_ms = (time.perf_counter() - started) / args.queries * 1000
+        if name == "exact":
+            truth = [{hit[0] for hit in r} for r in results]
+        recall = np.mean([len({hit[0] for hit in r} & t) / len(t) for r, t in zip(results, truth)])
+        print(f"{name}: {latency_ms:.2f} ms/query, recall@{args.k}={recall:.3f}")
+    print(f"ivf build: {build_seconds:.2f}s, {ivf.n_lists} lists, probe {args.probe}")
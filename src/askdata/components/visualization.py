@@ -1,14 +1,37 @@
-from google.cloud import bigquery, storage
-import matplotlib.pyplot as plt
 import os
-from src.askdata import logger
+from concurrent.futures import Future, ThreadPoolExecutor
+from src.askdata import configure_logging, logger
+from src.askdata.components.registry import get_registry
+from src.askdata.components.chart_prep import chart_settings, get_figure_cache, result_fingerprint, top_n_other
 import pandas as pd
 
-def generate_visualization(bq_dataset: str, bq_table: str, query: str, bucket_name: str, output_path: str):
-    """Generate a general visualization from BigQuery data based on user query and save to Cloud Storage for web app."""
+# Uploads run in the background so rendering returns as soon as the PNG is on disk
+_upload_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="visualization-upload")
+
+def _upload(output_path: str, bucket_name: str) -> str:
+    storage_client = get_registry().storage_client()
+    blob_name = f"visualizations/{os.path.basename(output_path)}"
+    try:
+        storage_client.bucket(bucket_name).blob(blob_name).upload_from_filename(output_path)
+    except Exception as e:
+        logger.error(f"Error uploading visualization: {str(e)}")
+        raise
+    logger.info(f"Visualization uploaded to {bucket_name}/{blob_name}")
+    return blob_name
+
+def upload_visualization_async(output_path: str, bucket_name: str) -> Future:
+    """Queues the upload of a rendered image to Cloud Storage, the future resolves to the blob name."""
+    return _upload_executor.submit(_upload, output_path, bucket_name)
+
+def generate_visualization(bq_dataset: str, bq_table: str, query: str, bucket_name: str, output_path: str) -> Future:
+    """
+    Generate a general visualization from BigQuery data based on user query and save to Cloud Storage for web app.
+
+    Returns the future of the background upload.
+    """
     try:
         # Inisialisasi BigQuery client
-        bigquery_client = bigquery.Client()
+        bigquery_client = get_registry().bigquery_client()
 
         # Query data dari BigQuery berdasarkan query visualisasi user
         if "distribusi" in query.lower() or "visualisasi" in query.lower():
@@ -20,6 +43,7 @@ def generate_visualization(bq_dataset: str, bq_table: str, query: str, bucket_na
             if not columns or not groups:
                 logger.warning(f"Query '{query}' tidak spesifik, pake default (distribusi order_id per kategori)")
                 data_query = f"SELECT category, COUNT(order_id) as order_count FROM `{bq_dataset}.{bq_table}` GROUP BY category"
+                column, group = "order_id", "category"
                 chart_title = "Distribusi Jumlah Order per Kategori"
                 x_label = "Kategori (Category)"
                 y_label = "Jumlah Order"
@@ -38,32 +62,48 @@ def generate_visualization(bq_dataset: str, bq_table: str, query: str, bucket_na
                 logger.warning(f"Tidak ada data untuk query: {query}")
                 raise ValueError("Tidak ada data untuk visualisasi ini")
 
-            # Generate visualisasi (default pake bar chart, fleksibel untuk semua kolom)
-            plt.figure(figsize=(10, 6))
-            plt.bar(data[group], data[f'total_{column}'] if column != 'order_id' else data['order_count'])
-            plt.xlabel(x_label)
-            plt.ylabel(y_label)
-            plt.title(chart_title)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            plt.savefig(output_path)
-            plt.close()
-            logger.info(f"Visualization saved locally to {output_path}")
+            value_column = f'total_{column}' if column != 'order_id' else 'order_count'
+            figure_cache = get_figure_cache(get_registry().config(), kind="png")
+            fingerprint = result_fingerprint(data)
+            png = figure_cache.get(data_query, fingerprint)
+            if png is not None:
+                # Same SQL, same data: reuse the image rendered earlier
+                with open(output_path, "wb") as f:
+                    f.write(png)
+                logger.info(f"Visualization reused from cache: {output_path}")
+            else:
+                # Top groups + "Other", so a high-cardinality group (e.g. city) stays readable
+                max_categories = chart_settings(get_registry().config())["max_categories"]
+                data = top_n_other(data, group, value_column, max_categories)
+
+                import matplotlib.pyplot as plt  # slow to import, only this branch draws
+
+                # Generate visualisasi (default pake bar chart, fleksibel untuk semua kolom)
+                plt.figure(figsize=(10, 6))
+                plt.bar(data[group].astype(str), data[value_column])
+                plt.xlabel(x_label)
+                plt.ylabel(y_label)
+                plt.title(chart_title)
+                plt.xticks(rotation=45)
+                plt.tight_layout()
+                plt.savefig(output_path)
+                plt.close()
+                with open(output_path, "rb") as f:
+                    figure_cache.put(data_query, fingerprint, f.read())
+                logger.info(f"Visualization saved locally to {output_path}")
 
         # Upload ke Cloud Storage
-        storage_client = storage.Client()
-        blob = storage_client.bucket(bucket_name).blob(f"visualizations/{os.path.basename(output_path)}")
-        blob.upload_from_filename(output_path)
-        logger.info(f"Visualization uploaded to {bucket_name}/visualizations/{os.path.basename(output_path)}")
+        return upload_visualization_async(output_path, bucket_name)
 
     except Exception as e:
         logger.error(f"Error in visualization: {str(e)}")
         raise
 
 if __name__ == "__main__":
+    configure_logging()
     bq_dataset = "ask_data_dataset"
     bq_table = "superstore_data"
     bucket_name = "technical-test-datalabs"
     query = "Buat visualisasi distribusi profit per region"  # Contoh query general
     output_path = "visualization.png"
-    generate_visualization(bq_dataset, bq_table, query, bucket_name, output_path)
\ No newline at end of file
+    generate_visualization(bq_dataset, bq_table, query, bucket_name, output_path).result()
\ No newline at end of file
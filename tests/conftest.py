@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from src.askdata.components.query_backend import PROJECT_ROOT, DuckDBBackend
+
+BQ_DATASET = "superstore_dataset"
+BQ_TABLE = "superstore"
+
+
+@pytest.fixture(scope="session")
+def duckdb_backend(tmp_path_factory):
+    """Local engine over the Superstore CSV, with its snapshot and tables in a temporary directory."""
+    directory = tmp_path_factory.mktemp("duckdb")
+    return DuckDBBackend(
+        BQ_DATASET,
+        BQ_TABLE,
+        str(PROJECT_ROOT / "superstore_data.csv"),
+        str(directory / "superstore.parquet"),
+        str(directory / "tables"),
+    )
+
+
+def assert_same_rows(left: pd.DataFrame, right: pd.DataFrame, check_dtype: bool = False) -> None:
+    """Same rows in any order, numbers compared approximately and columns by position."""
+    assert left.shape == right.shape
+    left = left.sort_values(list(left.columns)).reset_index(drop=True)
+    right = right.sort_values(list(right.columns)).reset_index(drop=True)
+    right.columns = left.columns
+    pd.testing.assert_frame_equal(left, right, check_dtype=check_dtype, check_exact=False, rtol=1e-9)
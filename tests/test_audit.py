@@ -0,0 +1,16 @@
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from src.askdata.components.audit import results_match
+
+
+def test_numbers_match_across_types_and_row_order():
+    actual = pd.DataFrame({"category": ["Furniture", "Technology"], "gmv": [Decimal("10.004"), Decimal("20.5")]})
+    expected = pd.DataFrame({"c": ["Technology", "Furniture"], "total": [np.float64(20.5), 10.0]})
+    assert results_match(actual, expected)
+
+
+def test_different_values_or_shapes_do_not_match():
+    actual = pd.DataFrame({"total": [Decimal("10.2")]})
+    assert not results_match(actual, pd.DataFrame({"expected": [10.0]}))
+    assert not results_match(actual, pd.DataFrame({"expected": [10.2, 1.0]}))
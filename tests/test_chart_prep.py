@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from src.askdata.components.chart_prep import OTHER_LABEL, lttb, prepare_chart, top_n_other
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 25.0
+    y[812] = -25.0
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert {437, 812} <= set(keep.tolist())
+
+
+def test_lttb_returns_everything_below_threshold():
+    x = np.arange(10)
+    assert lttb(x, x * 2.0, 10).tolist() == list(range(10))
+    assert lttb(x, x * 2.0, 2).tolist() == list(range(10))
+
+
+def test_top_n_other_sums_the_tail():
+    data = pd.DataFrame({"country": list("ABCDEF"), "profit": [5.0, 60.0, 1.0, 30.0, 2.0, 2.0]})
+    reduced = top_n_other(data, "country", "profit", 3)
+    assert reduced["country"].tolist() == ["B", "D", OTHER_LABEL]
+    assert reduced["profit"].tolist() == [60.0, 30.0, 10.0]
+    assert reduced["profit"].sum() == data["profit"].sum()
+    assert top_n_other(data, "country", "profit", 6) is data
+
+
+def test_prepare_chart_reduces_categories_and_time_series():
+    categories = pd.DataFrame({"sub_category": [f"s{i}" for i in range(30)], "profit": np.arange(30.0)})
+    spec = prepare_chart(categories, max_categories=10)
+    assert spec.kind == "bar" and len(spec.data) == 10
+    assert spec.data[spec.x].iloc[-1] == OTHER_LABEL
+    assert "top 9 of 30" in spec.note
+
+    months = pd.DataFrame({"month": pd.date_range("2011-01-01", periods=48, freq="MS").strftime("%b %Y"),
+                           "gmv": np.arange(48.0)})
+    spec = prepare_chart(months.iloc[::-1], max_points=12)
+    assert spec.kind == "line" and len(spec.data) == 12
+    assert spec.data["month"].iloc[0] == "Jan 2011" and spec.data["month"].iloc[-1] == "Dec 2014"
@@ -0,0 +1,41 @@
+import numpy as np
+from src.askdata.components.embedding_store import KEY_BYTES, EmbeddingStore
+
+
+def _vectors(n, dimension=4, start=0):
+    return np.arange(start, start + n * dimension, dtype=np.float32).reshape(n, dimension)
+
+
+def test_reload_after_partial_write_truncates_and_stays_aligned(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    store.put_many(["a", "b"], _vectors(2))
+    # Crash mid-append: the vector of "c" made it to disk, its checksum and key did not
+    with open(store.vectors_path, "ab") as f:
+        _vectors(1, start=100).tofile(f)
+
+    store = EmbeddingStore(tmp_path)
+    assert store.vectors_path.stat().st_size == 2 * 4 * 4
+    assert store.keys_path.stat().st_size == 2 * KEY_BYTES
+    assert store.checksums_path.stat().st_size == 2 * 4
+    store.put_many(["c"], _vectors(1, start=200))
+
+    store = EmbeddingStore(tmp_path)
+    a, b, c = store.get_many(["a", "b", "c"])
+    np.testing.assert_array_equal(a, _vectors(1)[0])
+    np.testing.assert_array_equal(b, _vectors(1, start=4)[0])
+    np.testing.assert_array_equal(c, _vectors(1, start=200)[0])
+
+
+def test_checksum_mismatch_is_a_miss(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    store.put_many(["a", "b"], _vectors(2))
+    # Flip the first float of "b" on disk
+    with open(store.vectors_path, "r+b") as f:
+        f.seek(4 * 4)
+        np.array([-1.0], dtype=np.float32).tofile(f)
+
+    store = EmbeddingStore(tmp_path)
+    a, b = store.get_many(["a", "b"])
+    np.testing.assert_array_equal(a, _vectors(1)[0])
+    assert b is None
+    assert store.verify() == [1]
@@ -0,0 +1,71 @@
+import pandas as pd
+from conftest import PROJECT_ROOT
+from src.askdata.components import incremental
+
+
+def lines():
+    return pd.DataFrame(
+        {
+            "order_id": ["A-1", "A-1", "A-1", "B-2", "C-3"],
+            "category": ["Tech", "Tech", "Office", "Tech", "Furniture"],
+            "sub_category": ["Phones", "Phones", "Paper", "Phones", "Chairs"],
+            "sales": [10.0, 12.0, 3.0, 7.0, 99.0],
+        }
+    )
+
+
+def with_ids(data, chunk_rows):
+    seen = {}
+    chunks = [data.iloc[i : i + chunk_rows] for i in range(0, len(data), chunk_rows)]
+    return pd.concat([incremental.assign_row_ids(chunk, seen) for chunk in chunks])
+
+
+def test_row_ids_do_not_depend_on_chunking():
+    data = lines()
+    whole = with_ids(data, len(data))["row_id"].tolist()
+    for chunk_rows in (1, 2, 3):
+        assert with_ids(data, chunk_rows)["row_id"].tolist() == whole
+
+
+def test_repeated_identity_gets_distinct_ids():
+    row_ids = with_ids(lines(), 1)["row_id"]
+    assert row_ids.is_unique
+    assert all(row_id.startswith(f"{order_id}-") for row_id, order_id in zip(row_ids, lines()["order_id"]))
+
+
+def test_row_ids_ignore_non_identity_columns():
+    edited = lines().assign(sales=0.0)
+    assert with_ids(edited, 2)["row_id"].tolist() == with_ids(lines(), 2)["row_id"].tolist()
+
+
+def test_row_ids_are_unique_for_the_source_csv():
+    data = pd.read_csv(PROJECT_ROOT / "superstore_data.csv", dtype=str)
+    assert with_ids(data, 1000)["row_id"].is_unique
+
+
+def test_changed_rows_returns_new_and_edited_rows(tmp_path):
+    before = with_ids(lines(), 5)
+    manifest_path = tmp_path / "manifest.parquet"
+    incremental.save_manifest(manifest_path, [incremental.content_hashes(before)])
+    manifest = incremental.load_manifest(manifest_path)
+
+    after = pd.concat([lines(), pd.DataFrame([{"order_id": "D-4", "category": "Tech", "sub_category": "Copiers", "sales": 1.0}])])
+    after.loc[after["order_id"] == "B-2", "sales"] = 8.0
+    seen = {}
+    changed = []
+    for start in (0, 3):
+        chunk = incremental.assign_row_ids(after.iloc[start : start + 3], seen)
+        changed.append(incremental.changed_rows(chunk, incremental.content_hashes(chunk), manifest))
+    changed = pd.concat(changed)
+
+    assert changed["order_id"].tolist() == ["B-2", "D-4"]
+    assert changed.loc[changed["order_id"] == "B-2", "row_id"].item() in manifest.index
+
+
+def test_manifest_round_trip_and_missing_file(tmp_path):
+    assert incremental.load_manifest(tmp_path / "missing.parquet") is None
+    hashes = incremental.content_hashes(with_ids(lines(), 2))
+    incremental.save_manifest(tmp_path / "manifest.parquet", [hashes.iloc[:2], hashes.iloc[2:]])
+    pd.testing.assert_series_equal(
+        incremental.load_manifest(tmp_path / "manifest.parquet"), hashes, check_names=False, check_index_type=False
+    )
@@ -0,0 +1,45 @@
+import pytest
+from conftest import BQ_DATASET, BQ_TABLE, assert_same_rows
+from src.askdata.components.partitioning import prune_date_filters
+
+TABLE = f"`{BQ_DATASET}.{BQ_TABLE}`"
+
+REWRITTEN_QUERIES = [
+    f"SELECT SUM(gmv) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) = 2014",
+    f"SELECT SUM(gmv) FROM {TABLE} WHERE 2013 = EXTRACT(YEAR FROM order_date)",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) > 2012",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) >= 2013 AND country = 'Spain'",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) < 2013",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) <= 2012",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) BETWEEN 2012 AND 2013",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) IN (2011, 2014)",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE FORMAT_DATE('%Y', order_date) = '2012'",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE FORMAT_DATE('%Y-%m', order_date) = '2014-12'",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE FORMAT_DATE('%Y-%m', order_date) IN ('2013-02', '2014-01')",
+    f"SELECT country, SUM(total_profit) FROM {TABLE} "
+    f"WHERE EXTRACT(YEAR FROM order_date) = 2014 AND EXTRACT(MONTH FROM order_date) = 3 GROUP BY country",
+    f"SELECT EXTRACT(MONTH FROM order_date) AS month, SUM(gmv) FROM {TABLE} "
+    f"WHERE EXTRACT(YEAR FROM order_date) = 2013 GROUP BY month",
+    f"SELECT customer_name FROM {TABLE} WHERE order_id IN "
+    f"(SELECT order_id FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) = 2012) AND category = 'Technology'",
+]
+
+UNCHANGED_QUERIES = [
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(MONTH FROM order_date) = 3",
+    f"SELECT COUNT(*) FROM {TABLE} WHERE EXTRACT(YEAR FROM ship_date) = 2014",
+    f"SELECT EXTRACT(YEAR FROM order_date) AS year, COUNT(*) FROM {TABLE} GROUP BY year",
+    "SELEC broken",
+]
+
+
+@pytest.mark.parametrize("sql", REWRITTEN_QUERIES)
+def test_rewrite_returns_the_same_rows(sql, duckdb_backend):
+    pruned = prune_date_filters(sql)
+    assert pruned != sql
+    assert "EXTRACT(YEAR" not in pruned.split("WHERE", 1)[1]
+    assert_same_rows(duckdb_backend.execute(sql), duckdb_backend.execute(pruned))
+
+
+@pytest.mark.parametrize("sql", UNCHANGED_QUERIES)
+def test_other_filters_are_left_alone(sql):
+    assert prune_date_filters(sql) == sql
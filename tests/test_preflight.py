@@ -0,0 +1,88 @@
+import pytest
+from conftest import BQ_DATASET, BQ_TABLE, assert_same_rows
+from src.askdata.components.preflight import PreflightError, normalize_dialect, preflight, repair_prompt
+
+TABLE = f"`{BQ_DATASET}.{BQ_TABLE}`"
+
+# Generated SQL -> the BigQuery query it must be equivalent to
+FIXED_QUERIES = [
+    (
+        f"SELECT STRFTIME('%Y', order_date) AS year, SUM(gmv) AS gmv FROM {TABLE} GROUP BY 1",
+        f"SELECT FORMAT_DATE('%Y', order_date) AS year, SUM(gmv) AS gmv FROM {TABLE} GROUP BY 1",
+    ),
+    (
+        f"SELECT TO_CHAR(order_date, 'YYYY-MM') AS month, COUNT(*) AS orders FROM {TABLE} GROUP BY 1",
+        f"SELECT FORMAT_DATE('%Y-%m', order_date) AS month, COUNT(*) AS orders FROM {TABLE} GROUP BY 1",
+    ),
+    (
+        f"SELECT DATE_PART('year', order_date) AS year, SUM(total_profit) AS profit FROM {TABLE} GROUP BY 1",
+        f"SELECT EXTRACT(YEAR FROM order_date) AS year, SUM(total_profit) AS profit FROM {TABLE} GROUP BY 1",
+    ),
+    (
+        f'SELECT "country", SUM(gmv) AS gmv FROM {TABLE} GROUP BY "country"',
+        f"SELECT country, SUM(gmv) AS gmv FROM {TABLE} GROUP BY country",
+    ),
+    (
+        f"SELECT SUM(quantity)::int AS quantity FROM {TABLE}",
+        f"SELECT CAST(SUM(quantity) AS INT64) AS quantity FROM {TABLE}",
+    ),
+    (
+        # Postgres only, backticks do not parse there
+        f"SELECT COUNT(*) AS orders FROM {BQ_DATASET}.{BQ_TABLE} WHERE country ~ '^Sp'",
+        f"SELECT COUNT(*) AS orders FROM {TABLE} WHERE REGEXP_CONTAINS(country, '^Sp')",
+    ),
+]
+
+REJECTED_QUERIES = [
+    (f"DELETE FROM {TABLE} WHERE country = 'Spain'", "Only SELECT"),
+    (f"DROP TABLE {TABLE}", "Only SELECT"),
+    (f"SELECT country FROM {TABLE}; SELECT gmv FROM {TABLE}", "exactly one"),
+    (f"SELECT revenue FROM {TABLE}", "Unknown column(s) revenue"),
+    ("SELECT gmv FROM `superstore_dataset.orders`", "Unknown table(s) orders"),
+    (f"SELECT country FROM {TABLE} WHERE country = 'Spain", "does not parse"),
+    (f"SELECT country FROM {TABLE} WHERE", "does not parse"),
+]
+
+
+@pytest.fixture(scope="module")
+def columns(duckdb_backend):
+    return list(duckdb_backend.execute(f"SELECT * FROM {TABLE} LIMIT 0").columns)
+
+
+@pytest.mark.parametrize("sql, expected", FIXED_QUERIES)
+def test_fixed_sql_runs_like_the_bigquery_query(sql, expected, columns, duckdb_backend):
+    result = preflight(sql, columns, BQ_TABLE, backend=duckdb_backend)
+    # Backticks or not, the same BigQuery query
+    assert result.sql.replace("`", "") == preflight(expected, columns, BQ_TABLE).sql.replace("`", "")
+    assert_same_rows(duckdb_backend.execute(expected), duckdb_backend.execute(result.sql))
+
+
+@pytest.mark.parametrize("sql, expected", FIXED_QUERIES)
+def test_dialect_is_normalized_without_preflight(sql, expected, columns, duckdb_backend):
+    normalized = normalize_dialect(sql, columns)
+    assert normalized.replace("`", "") == preflight(expected, columns, BQ_TABLE).sql.replace("`", "")
+    assert_same_rows(duckdb_backend.execute(expected), duckdb_backend.execute(normalized))
+
+
+def test_normalize_dialect_leaves_unparseable_sql_alone(columns):
+    sql = f"SELECT country FROM {TABLE} WHERE country = 'Spain"
+    assert normalize_dialect(sql, columns) == sql
+
+
+@pytest.mark.parametrize("sql, message", REJECTED_QUERIES)
+def test_rejected_sql(sql, message, columns):
+    with pytest.raises(PreflightError, match=message.replace("(", r"\(").replace(")", r"\)")) as error:
+        preflight(sql, columns, BQ_TABLE)
+    prompt = repair_prompt("Write a query.", sql, error.value)
+    assert sql in prompt
+    assert "\x1b" not in prompt
+
+
+class _ExpensiveBackend:
+    def dry_run(self, sql):
+        return 20 * 1024 ** 3
+
+
+def test_scan_over_the_byte_limit_is_rejected(columns):
+    with pytest.raises(PreflightError, match="more than the"):
+        preflight(f"SELECT * FROM {TABLE}", columns, BQ_TABLE, backend=_ExpensiveBackend(), max_bytes=10 * 1024 ** 3)
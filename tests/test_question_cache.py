@@ -0,0 +1,70 @@
+import pytest
+from src.askdata.components import question_cache
+from src.askdata.components.question_cache import QuestionCache, normalize_question
+
+SCOPE = "schema-and-model"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(question_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_exact_match_after_normalization(tmp_path):
+    cache = QuestionCache(tmp_path / "cache.sqlite")
+    cache.put("What's the total profit in Spain?", SCOPE, "SELECT 1")
+    assert cache.get("  what is the total   profit in spain ", SCOPE) == "SELECT 1"
+    assert cache.get("What's the total profit in Spain?", "other-scope") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = QuestionCache(tmp_path / "cache.sqlite", max_entries=2)
+    cache.put("profit in spain", SCOPE, "SELECT 'spain'")
+    clock[0] += 1
+    cache.put("profit in france", SCOPE, "SELECT 'france'")
+    clock[0] += 1
+    assert cache.get("profit in spain", SCOPE)  # spain is now the most recently used
+    clock[0] += 1
+    cache.put("profit in italy", SCOPE, "SELECT 'italy'")
+    assert cache.get("profit in france", SCOPE) is None
+    assert cache.get("profit in spain", SCOPE) == "SELECT 'spain'"
+    assert cache.get("profit in italy", SCOPE) == "SELECT 'italy'"
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = QuestionCache(tmp_path / "cache.sqlite", ttl_seconds=60)
+    cache.put("profit in spain", SCOPE, "SELECT 1")
+    clock[0] += 59
+    assert cache.get("profit in spain", SCOPE) == "SELECT 1"
+    clock[0] += 2
+    assert cache.get("profit in spain", SCOPE) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_fuzzy_match_needs_the_same_content_words(tmp_path):
+    cache = QuestionCache(tmp_path / "cache.sqlite", fuzzy_threshold=0.8)
+    cache.put("What is the total profit for orders in Spain?", SCOPE, "SELECT 'spain'")
+    assert cache.get("Show me the total profit for all orders in Spain", SCOPE) == "SELECT 'spain'"
+    assert cache.get("What is the total profit for orders in France?", SCOPE) is None
+    assert cache.stats()["fuzzy_hits"] == 1
+
+
+def test_embedding_match_needs_the_same_numbers(tmp_path):
+    vectors = {
+        normalize_question("top 5 customers by profit"): [1.0, 0.0],
+        normalize_question("best 5 customers by profit"): [0.99, 0.05],
+        normalize_question("best 10 customers by profit"): [0.99, 0.05],
+        normalize_question("orders per ship mode"): [0.0, 1.0],
+    }
+    cache = QuestionCache(
+        tmp_path / "cache.sqlite", embed_fn=lambda texts: [vectors[t] for t in texts], embedding_threshold=0.95
+    )
+    cache.put("top 5 customers by profit", SCOPE, "SELECT 'top5'")
+    assert cache.get("best 5 customers by profit", SCOPE) == "SELECT 'top5'"
+    assert cache.get("best 10 customers by profit", SCOPE) is None
+    assert cache.get("orders per ship mode", SCOPE) is None
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+from src.askdata.components import result_cache
+from src.askdata.components.result_cache import ResultCache, execute_cached
+
+SQL = "SELECT region, SUM(profit) AS profit FROM `ds.t` GROUP BY region"
+
+
+class CountingBackend:
+    def __init__(self, version="v1"):
+        self.version = version
+        self.calls = 0
+
+    def table_version(self):
+        return self.version
+
+    def execute(self, sql, max_rows=None):
+        self.calls += 1
+        return pd.DataFrame({"region": ["East", "West"], "profit": [1.5, 2.5]})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    return now
+
+
+def frame(n):
+    return pd.DataFrame({"value": range(n)})
+
+
+def test_hit_ignores_sql_formatting(tmp_path):
+    cache = ResultCache(tmp_path)
+    backend = CountingBackend()
+    first = execute_cached(backend, SQL, cache)
+    second = execute_cached(backend, SQL.replace("SELECT", "select\n ").replace("GROUP BY", "group  by") + ";", cache)
+    assert backend.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_table_version_and_fetch_cap_are_part_of_the_key(tmp_path):
+    cache = ResultCache(tmp_path)
+    backend = CountingBackend()
+    execute_cached(backend, SQL, cache)
+    execute_cached(backend, SQL, cache, max_rows=1)
+    backend.version = "v2"
+    execute_cached(backend, SQL, cache)
+    assert backend.calls == 3
+
+
+def test_invalidate_bumps_generation_and_drops_files(tmp_path):
+    cache = ResultCache(tmp_path)
+    backend = CountingBackend()
+    execute_cached(backend, SQL, cache)
+    assert list(tmp_path.glob("*.parquet"))
+    cache.invalidate()
+    assert cache.generation() == 1
+    assert not list(tmp_path.glob("*.parquet"))
+    assert cache.stats()["entries"] == 0
+    execute_cached(backend, SQL, cache)
+    assert backend.calls == 2
+
+
+def test_invalidate_is_seen_by_other_instances(tmp_path):
+    writer, reader = ResultCache(tmp_path), ResultCache(tmp_path)
+    writer.put(SQL, "v1", frame(3))
+    assert reader.get(SQL, "v1") is not None
+    writer.invalidate()
+    assert reader.get(SQL, "v1") is None
+
+
+def test_least_recently_used_results_are_evicted_over_budget(tmp_path, clock):
+    probe = ResultCache(tmp_path / "probe")
+    probe.put("SELECT 0", "v1", frame(100))
+    entry_bytes = probe.stats()["bytes"]
+
+    cache = ResultCache(tmp_path / "cache", max_bytes=int(entry_bytes * 2.5))
+    for i in range(2):
+        clock[0] += 1
+        cache.put(f"SELECT {i}", "v1", frame(100))
+    clock[0] += 1
+    assert cache.get("SELECT 0", "v1") is not None
+    clock[0] += 1
+    cache.put("SELECT 2", "v1", frame(100))
+
+    assert cache.get("SELECT 1", "v1") is None
+    assert cache.get("SELECT 0", "v1") is not None
+    assert cache.get("SELECT 2", "v1") is not None
+    assert cache.stats()["entries"] == 2
+    assert len(list((tmp_path / "cache").glob("*.parquet"))) == 2
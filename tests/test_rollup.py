@@ -0,0 +1,45 @@
+import pytest
+from conftest import BQ_DATASET, BQ_TABLE, assert_same_rows
+from src.askdata.components.rollup import build_rollups, route_query
+
+TABLE = f"`{BQ_DATASET}.{BQ_TABLE}`"
+
+ROUTED_QUERIES = [
+    f"SELECT country, SUM(gmv) AS total_gmv FROM {TABLE} GROUP BY country",
+    f"SELECT category, sub_category, SUM(profit) AS profit, COUNT(*) AS orders FROM {TABLE} GROUP BY 1, 2",
+    f"SELECT EXTRACT(YEAR FROM order_date) AS year, SUM(total_profit) AS total_profit FROM {TABLE} "
+    f"WHERE country = 'Spain' GROUP BY year ORDER BY year",
+    f"SELECT region, AVG(gmv) AS avg_gmv FROM {TABLE} WHERE EXTRACT(YEAR FROM order_date) = 2014 GROUP BY region",
+    f"SELECT segment, COUNT(DISTINCT customer_name) AS customers FROM {TABLE} GROUP BY segment",
+    f"SELECT SUM(quantity) AS quantity FROM {TABLE} WHERE category = 'Technology'",
+]
+
+BASE_TABLE_QUERIES = [
+    f"SELECT customer_name, SUM(profit) AS profit FROM {TABLE} GROUP BY customer_name",
+    f"SELECT country, MAX(gmv) AS max_gmv FROM {TABLE} GROUP BY country",
+    f"SELECT country, COUNT(DISTINCT order_id) AS orders FROM {TABLE} WHERE category = 'Furniture' GROUP BY country",
+]
+
+
+@pytest.fixture(scope="module")
+def rollup_config(duckdb_backend, tmp_path_factory):
+    config = {
+        "gcp": {"bq_dataset": BQ_DATASET, "bq_table": BQ_TABLE},
+        "rollups": {"manifest_path": str(tmp_path_factory.mktemp("rollups") / "rollups.json")},
+    }
+    build_rollups(config, duckdb_backend)
+    return config
+
+
+@pytest.mark.parametrize("sql", ROUTED_QUERIES)
+def test_routed_query_matches_base_table(sql, rollup_config, duckdb_backend):
+    decision = route_query(sql, rollup_config, duckdb_backend.name)
+    assert decision.rollup is not None, decision.reason
+    assert_same_rows(duckdb_backend.execute(sql), duckdb_backend.execute(decision.sql), check_dtype=True)
+
+
+@pytest.mark.parametrize("sql", BASE_TABLE_QUERIES)
+def test_unsupported_query_stays_on_base_table(sql, rollup_config, duckdb_backend):
+    decision = route_query(sql, rollup_config, duckdb_backend.name)
+    assert decision.rollup is None
+    assert decision.sql == sql
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import pandas as pd
+import pytest
+from src.askdata.components import service
+from src.askdata.components.service import AskService, Overloaded, QuestionTimeout
+
+
+class FakePipeline:
+    """Counting stand-ins for the pipeline stages; `release` unblocks the SQL execution."""
+
+    def __init__(self, monkeypatch):
+        self.calls = {"generate_sql": 0, "run_sql": 0, "answer_result": 0}
+        self.release = threading.Event()
+        self.events = []
+        monkeypatch.setattr(service, "preprocess_data", lambda: {"summary": "superstore"})
+        monkeypatch.setattr(service, "generate_sql", self.generate_sql)
+        monkeypatch.setattr(service, "run_sql", self.run_sql)
+        monkeypatch.setattr(service, "quick_answer", lambda result_df: None)
+        monkeypatch.setattr(service, "answer_result", self.answer_result)
+
+    def generate_sql(self, data_info, question):
+        self.calls["generate_sql"] += 1
+        return f"SELECT '{question}'", False
+
+    def run_sql(self, data_info, question, sql, from_cache):
+        self.calls["run_sql"] += 1
+        self.release.wait(5)
+        self.events.append("result")
+        return pd.DataFrame({"value": [42]})
+
+    def answer_result(self, data_info, question, result_df):
+        self.calls["answer_result"] += 1
+        return f"The answer is {result_df.iloc[0, 0]}."
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    pipeline = FakePipeline(monkeypatch)
+    yield pipeline
+    pipeline.release.set()
+
+
+async def _released_after(pipeline, seconds, coroutine):
+    asyncio.get_running_loop().call_later(seconds, pipeline.release.set)
+    return await coroutine
+
+
+def test_identical_questions_share_one_run(pipeline):
+    ask_service = AskService()
+    questions = ["Total profit in Spain?", "total profit in spain", "Total profit in Spain?"]
+
+    async def burst():
+        return await asyncio.gather(*(ask_service.ask(q) for q in questions))
+
+    answers = asyncio.run(_released_after(pipeline, 0.1, burst()))
+    assert pipeline.calls == {"generate_sql": 1, "run_sql": 1, "answer_result": 1}
+    assert [a.coalesced for a in answers] == [False, True, True]
+    assert {a.answer for a in answers} == {"The answer is 42."}
+    assert ask_service.stats()["runs"] == 1 and ask_service.stats()["pending"] == 0
+
+
+def test_query_and_ask_share_the_sql_stages(pipeline):
+    ask_service = AskService()
+
+    async def both():
+        return await asyncio.gather(ask_service.query("Profit by region"), ask_service.ask("profit by region?"))
+
+    query, answer = asyncio.run(_released_after(pipeline, 0.1, both()))
+    assert pipeline.calls == {"generate_sql": 1, "run_sql": 1, "answer_result": 1}
+    assert query.sql == answer.sql and answer.coalesced
+    assert ask_service.stats()["runs"] == 1
+
+
+def test_on_sql_is_called_before_the_sql_runs(pipeline):
+    ask_service = AskService()
+    on_sql = lambda sql: pipeline.events.append(f"sql: {sql}")
+    query = asyncio.run(_released_after(pipeline, 0.1, ask_service.query("Profit by region", on_sql=on_sql)))
+    assert pipeline.events == ["sql: SELECT 'Profit by region'", "result"]
+    assert query.result.iloc[0, 0] == 42
+
+
+def test_query_blocking_calls_on_sql_in_the_calling_thread(pipeline):
+    ask_service = AskService()
+    threads = []
+    on_sql = lambda sql: threads.append(threading.current_thread())
+    threading.Timer(0.1, pipeline.release.set).start()
+    query = ask_service.query_blocking("Profit by region", on_sql=on_sql)
+    assert threads == [threading.current_thread()]
+    assert query.sql == "SELECT 'Profit by region'"
+
+
+def test_timeout_raises_and_cancels_the_abandoned_run(pipeline):
+    ask_service = AskService()
+
+    async def ask():
+        with pytest.raises(QuestionTimeout):
+            await ask_service.ask("Profit by region", timeout=0.05)
+        # Stopped before the answer stage once nobody waits for it
+        pipeline.release.set()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(ask())
+    assert ask_service.stats()["timeouts"] == 1 and ask_service.stats()["pending"] == 0
+    assert pipeline.calls["answer_result"] == 0
+
+
+def test_distinct_questions_over_max_pending_are_rejected(pipeline):
+    ask_service = AskService(max_pending=2)
+
+    async def burst():
+        first = asyncio.create_task(ask_service.ask("Profit by region"))
+        second = asyncio.create_task(ask_service.query("Orders per year"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded):
+            await ask_service.ask("GMV by country")
+        # A question already in flight, in any stage, is still accepted
+        shared = asyncio.create_task(ask_service.query("profit by region"))
+        await asyncio.sleep(0.05)
+        pipeline.release.set()
+        return await asyncio.gather(first, second, shared)
+
+    asyncio.run(burst())
+    assert ask_service.stats()["rejected"] == 1
+    assert pipeline.calls["run_sql"] == 2